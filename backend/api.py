@@ -42,8 +42,15 @@ from app import (
     OLLAMA_AVAILABLE,
     GEMINI_AVAILABLE,
     genai as gemini_client,
-    configure_gemini
+    configure_gemini,
+    get_scraping_session
 )
+from services.llm_usage import SESSION_USAGE
+from services.metrics import REGISTRY as METRICS_REGISTRY, Gauge, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from services.concurrency import concurrency_snapshot
+from services.circuit_breaker import circuit_snapshot
+from services.hedging import hedging_snapshot
+from services.tracing import start_span, propagate_span, traceparent_environment, SPAN_KIND_SERVER
 
 # Custom middleware to handle CloudFront/ALB proxy headers
 class ProxyHeadersMiddleware(BaseHTTPMiddleware):
@@ -88,6 +95,23 @@ class ProxyHeadersMiddleware(BaseHTTPMiddleware):
         return response
 
 
+# Paths polled too often to be worth a span each
+UNTRACED_PATHS = ("/api/metrics", "/api/health")
+
+
+class TracingMiddleware(BaseHTTPMiddleware):
+    """Run every API request in a tracing span (no-op while tracing is disabled)."""
+    async def dispatch(self, request: Request, call_next):
+        path = request.url.path
+        if not path.startswith("/api/") or path in UNTRACED_PATHS or path.startswith("/api/job-status/"):
+            return await call_next(request)
+        with start_span(f"{request.method} {path}", {"http.method": request.method, "http.target": path},
+                        kind=SPAN_KIND_SERVER) as span:
+            response = await call_next(request)
+            span.set_attribute("http.status_code", response.status_code)
+            return response
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="MyAccessibilityBuddy API",
@@ -100,6 +124,7 @@ app = FastAPI(
 # Add proxy headers middleware FIRST (before CORS)
 # This must be added before CORS to ensure proper origin handling
 app.add_middleware(ProxyHeadersMiddleware)
+app.add_middleware(TracingMiddleware)
 
 # Configure CORS to allow frontend access
 # When allow_credentials=True, must specify exact origins (not "*")
@@ -757,6 +782,59 @@ async def health_check():
     )
 
 
+# Gauges read at scrape time from the API process state
+JOBS_IN_FLIGHT = Gauge('mab_jobs_in_flight', 'Async jobs that are starting or running')
+JOB_STATUS_ENTRIES = Gauge('mab_job_status_entries', 'Entries kept in JOB_STATUS by status', ('status',))
+ACTIVE_SESSIONS = Gauge('mab_sessions', 'Active user sessions by type', ('type',))
+LLM_WINDOW = Gauge('mab_llm_concurrency_window', 'AIMD concurrency window per LLM endpoint', ('endpoint',))
+LLM_IN_FLIGHT = Gauge('mab_llm_in_flight', 'LLM requests in flight per endpoint', ('endpoint',))
+LLM_QUEUE_DEPTH = Gauge('mab_llm_queue_depth', 'LLM requests waiting for a concurrency slot per endpoint', ('endpoint',))
+CIRCUIT_STATE = Gauge('mab_circuit_breaker_state', '1 for the current state of each endpoint circuit breaker',
+                      ('endpoint', 'state'))
+HEDGING = Gauge('mab_hedging', 'Hedged request counters per step (calls, hedges, hedge_wins)', ('step', 'counter'))
+
+JOBS_IN_FLIGHT.set_function(
+    lambda: sum(1 for job in list(JOB_STATUS.values()) if job.get("status") in ("starting", "running")))
+
+
+def _job_status_counts():
+    counts = {}
+    for job in list(JOB_STATUS.values()):
+        key = (job.get("status") or "unknown",)
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+
+JOB_STATUS_ENTRIES.set_function(_job_status_counts)
+ACTIVE_SESSIONS.set_function(lambda: {(kind,): count for kind, count in count_sessions_by_type().items()
+                                      if kind != 'total'})
+LLM_WINDOW.set_function(lambda: {(key,): window['window'] for key, window in concurrency_snapshot().items()})
+LLM_IN_FLIGHT.set_function(lambda: {(key,): window['in_flight'] for key, window in concurrency_snapshot().items()})
+LLM_QUEUE_DEPTH.set_function(lambda: {(key,): window['waiting'] for key, window in concurrency_snapshot().items()})
+CIRCUIT_STATE.set_function(lambda: {(key, state): int(breaker['state'] == state)
+                                    for key, breaker in circuit_snapshot().items()
+                                    for state in ('closed', 'half_open', 'open')})
+HEDGING.set_function(lambda: {(step, counter): stats[counter] for step, stats in hedging_snapshot().items()
+                              for counter in ('calls', 'hedges', 'hedge_wins')})
+
+
+@app.get("/api/metrics")
+async def metrics():
+    """
+    Prometheus metrics endpoint.
+
+    Exposes pipeline latency histograms (page fetch, image download, context
+    extraction and LLM calls by step, provider and model), token, cost, error
+    and cache counters, and gauges for jobs, sessions, LLM concurrency windows,
+    circuit breakers and hedging. Counters of async jobs are added when each
+    job finishes.
+
+    Returns:
+        Response: Metrics in the Prometheus text exposition format
+    """
+    return Response(content=METRICS_REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
 @app.get("/api/available-providers")
 async def get_available_providers():
     """
@@ -795,6 +873,10 @@ async def get_available_providers():
     if GEMINI_AVAILABLE and CONFIG.get('gemini', {}).get('enabled', False):
         available_providers['gemini'] = CONFIG.get('gemini', {}).get('available_models', {})
 
+    # Offline stub for load tests and benchmarks - only include if enabled
+    if CONFIG.get('stub', {}).get('enabled', False):
+        available_providers['stub'] = CONFIG.get('stub', {}).get('available_models', {})
+
     # Get current config defaults from steps
     current_config = CONFIG.get('steps', {
         'vision': {'provider': 'OpenAI', 'model': 'gpt-4o'},
@@ -1104,7 +1186,8 @@ async def generate_alt_text(
             'claude': 'Claude',
             'ecb-llm': 'ECB-LLM',
             'ollama': 'Ollama',
-            'gemini': 'Gemini'
+            'gemini': 'Gemini',
+            'stub': 'Stub'
         }
         return provider_map.get(provider_name.lower(), provider_name)
 
@@ -1705,7 +1788,6 @@ async def check_url(request: Request):
     }
     """
     try:
-        import requests
         from requests.exceptions import RequestException, Timeout, ConnectionError
 
         data = await request.json()
@@ -1728,7 +1810,8 @@ async def check_url(request: Request):
 
         # Try to reach the URL with a HEAD request first (faster)
         try:
-            response = requests.head(url, timeout=10, allow_redirects=True)
+            session = get_scraping_session()
+            response = session.head(url, timeout=10, allow_redirects=True)
             if response.status_code < 400:
                 log_message(f"URL reachable: {url} (status: {response.status_code})", "INFORMATION")
                 return {
@@ -1737,7 +1820,7 @@ async def check_url(request: Request):
                 }
             else:
                 # If HEAD fails, try GET (some servers don't support HEAD)
-                response = requests.get(url, timeout=10, allow_redirects=True, stream=True)
+                response = session.get(url, timeout=10, allow_redirects=True, stream=True)
                 response.close()  # Close immediately, we just want to check reachability
 
                 if response.status_code < 400:
@@ -2044,7 +2127,9 @@ async def analyze_page(request: Request):
         "translation_provider": "openai",  # optional
         "translation_model": "gpt-4",  # optional
         "advanced_translation": true,  # optional, defaults to false
-        "geo_boost": true  # optional, defaults to false
+        "geo_boost": true,  # optional, defaults to false
+        "bypass_cache": true,  # optional, skip the on-disk HTTP cache, defaults to false
+        "profile": true  # optional, profile the run per phase ("sampling" or "cprofile"; true = "sampling")
     }
 
     Returns:
@@ -2078,6 +2163,8 @@ async def analyze_page(request: Request):
         translation_model = data.get('translation_model')
         advanced_translation = data.get('advanced_translation', False)
         geo_boost = data.get('geo_boost', False)
+        bypass_cache = data.get('bypass_cache', False)
+        profile = data.get('profile')
 
         if not url:
             raise HTTPException(status_code=400, detail="URL is required")
@@ -2130,26 +2217,48 @@ async def analyze_page(request: Request):
             cmd_args.append('--advanced-translation')
         if geo_boost:
             cmd_args.append('--geo-boost')
+        if bypass_cache:
+            cmd_args.append('--no-cache')
+        if profile:
+            cmd_args.extend(['--profile', profile if isinstance(profile, str) else 'sampling'])
 
         # Execute the CLI command
         import subprocess
         import sys
+        import json
         from pathlib import Path
 
         # Get the app.py path
         app_py_path = Path(__file__).parent / 'app.py'
 
+        # The subprocess writes its run statistics (metrics, LLM usage) here
+        progress_file = Path(tempfile.gettempdir()) / f"analyze-page-{uuid.uuid4()}-progress.json"
+        cmd_args.extend(['--progress-file', str(progress_file)])
+
         # Run the command
         cmd = [sys.executable, str(app_py_path)] + cmd_args
 
         log_message(f"Executing: {' '.join(cmd)}", "INFORMATION")
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=300  # 5 minute timeout
-        )
+        try:
+            result = subprocess.run(
+                cmd,
+                capture_output=True,
+                text=True,
+                timeout=300  # 5 minute timeout
+            )
+        finally:
+            run_stats = {}
+            try:
+                if progress_file.exists():
+                    with open(progress_file, 'r') as f:
+                        run_stats = json.load(f).get('stats') or {}
+                    progress_file.unlink()
+            except (ValueError, OSError):
+                pass
+            # Same accounting as async jobs: add the subprocess counters and token usage
+            METRICS_REGISTRY.merge(run_stats.pop("metrics", None))
+            SESSION_USAGE.merge(run_stats.get("llm_usage"))
 
         error_msg = None
         if result.returncode != 0:
@@ -2165,7 +2274,6 @@ async def analyze_page(request: Request):
         alt_text_folder = None
 
         import re
-        import json
 
         # Look for report path, session ID, and output folder hints in CLI output
         for line in output.split('\n'):
@@ -2402,15 +2510,20 @@ async def analyze_page_async(request: Request):
 
         # Start background thread to run analysis
         def run_analysis():
-            try:
-                _run_analysis_with_progress(job_id, data)
-            except Exception as e:
-                JOB_STATUS[job_id]["status"] = "error"
-                JOB_STATUS[job_id]["error"] = str(e)
-                JOB_STATUS[job_id]["message"] = f"Error: {str(e)}"
-                log_message(f"Background analysis error for job {job_id}: {e}", "ERROR")
-
-        thread = threading.Thread(target=run_analysis, daemon=True)
+            with start_span("job.analyze_page", {"job.id": job_id, "url": url}) as span:
+                if span.trace_id:
+                    JOB_STATUS[job_id]["trace_id"] = span.trace_id
+                try:
+                    _run_analysis_with_progress(job_id, data)
+                except Exception as e:
+                    span.record_exception(e)
+                    JOB_STATUS[job_id]["status"] = "error"
+                    JOB_STATUS[job_id]["error"] = str(e)
+                    JOB_STATUS[job_id]["message"] = f"Error: {str(e)}"
+                    log_message(f"Background analysis error for job {job_id}: {e}", "ERROR")
+                span.set_attribute("job.status", JOB_STATUS[job_id]["status"])
+
+        thread = threading.Thread(target=propagate_span(run_analysis), daemon=True)
         thread.start()
 
         return {
@@ -2453,6 +2566,8 @@ def _run_analysis_with_progress(job_id: str, data: dict):
     translation_model = data.get('translation_model')
     advanced_translation = data.get('advanced_translation', False)
     geo_boost = data.get('geo_boost', False)
+    bypass_cache = data.get('bypass_cache', False)
+    profile = data.get('profile')
 
     # Update status
     JOB_STATUS[job_id]["status"] = "running"
@@ -2514,6 +2629,11 @@ def _run_analysis_with_progress(job_id: str, data: dict):
         cmd_args.append('--advanced-translation')
     if geo_boost:
         cmd_args.append('--geo-boost')
+    if bypass_cache:
+        cmd_args.append('--no-cache')
+    if profile:
+        # true for the default sampling profiler, or a mode name ('sampling', 'cprofile')
+        cmd_args.extend(['--profile', profile if isinstance(profile, str) else 'sampling'])
 
     # Get the app.py path
     app_py_path = Path(__file__).parent / 'app.py'
@@ -2524,12 +2644,13 @@ def _run_analysis_with_progress(job_id: str, data: dict):
     JOB_STATUS[job_id]["percent"] = 10
     JOB_STATUS[job_id]["message"] = "Fetching web page..."
 
-    # Start subprocess with pipes
+    # Start subprocess with pipes; TRACEPARENT makes its spans children of the job span
     process = subprocess.Popen(
         cmd,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True
+        text=True,
+        env=traceparent_environment()
     )
 
     # Use threads to consume stdout/stderr to prevent buffer deadlock
@@ -2571,6 +2692,8 @@ def _run_analysis_with_progress(job_id: str, data: dict):
                     JOB_STATUS[job_id]["total_images"] = progress_data['total_images']
                 if 'phase' in progress_data:
                     JOB_STATUS[job_id]["phase"] = progress_data['phase']
+                if 'stats' in progress_data:
+                    JOB_STATUS[job_id]["stats"] = progress_data['stats']
 
             except (json.JSONDecodeError, IOError):
                 pass  # Progress file might be being written
@@ -2579,6 +2702,16 @@ def _run_analysis_with_progress(job_id: str, data: dict):
     stdout_thread.join(timeout=5)
     stderr_thread.join(timeout=5)
 
+    # Pick up run statistics written after the last poll
+    if progress_file.exists():
+        try:
+            with open(progress_file, 'r') as f:
+                progress_data = json.load(f)
+            if 'stats' in progress_data:
+                JOB_STATUS[job_id]["stats"] = progress_data['stats']
+        except (json.JSONDecodeError, IOError):
+            pass
+
     # Get collected output
     output = ''.join(stdout_lines)
     if stderr_lines:
@@ -2666,6 +2799,9 @@ def _run_analysis_with_progress(job_id: str, data: dict):
         except Exception:
             pass
 
+    # The job ran in a subprocess: add its counters and histograms to /api/metrics
+    METRICS_REGISTRY.merge((JOB_STATUS[job_id].get("stats") or {}).pop("metrics", None))
+
     # Update final status
     if report_path or total_images > 0:
         JOB_STATUS[job_id]["status"] = "complete"
@@ -2681,6 +2817,16 @@ def _run_analysis_with_progress(job_id: str, data: dict):
                 "has_alt": has_alt
             }
         }
+        job_stats = JOB_STATUS[job_id].get("stats") or {}
+        for stats_key in ("http_cache", "llm_concurrency", "circuit_breakers", "hedging", "vision_batching", "llm_usage",
+                          "profile", "cassettes"):
+            if job_stats.get(stats_key):
+                JOB_STATUS[job_id]["result"]["summary"][stats_key] = job_stats[stats_key]
+        # The job ran in a subprocess: add its LLM usage to this server's session totals
+        SESSION_USAGE.merge(job_stats.get("llm_usage"))
+        session_usage = SESSION_USAGE.summary()
+        if session_usage:
+            JOB_STATUS[job_id]["result"]["summary"]["llm_usage_session"] = session_usage
     else:
         JOB_STATUS[job_id]["status"] = "error"
         JOB_STATUS[job_id]["error"] = "No report generated"
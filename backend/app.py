@@ -2,16 +2,21 @@ import requests
 import os
 import sys
 import argparse
+import functools
 import json
 import logging
 import re
 from datetime import datetime
 from zoneinfo import ZoneInfo
 from pathlib import Path
-from bs4 import BeautifulSoup
 from urllib.parse import urljoin, urlparse
 import time
 import base64
+import threading
+import contextlib
+import atexit
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from mimetypes import guess_type
 from openai import OpenAI
 
@@ -103,6 +108,31 @@ except ImportError:
 
 # Import configuration management
 from config import settings as config_settings
+from services.html_stream import stream_image_candidates
+from services.html_backends import resolve_backend as resolve_html_backend, parse_for_extraction, parse_tree
+from services.context_index import ContextIndex
+from services.http_session import get_http_session
+from services.http_cache import get_http_cache
+from services.image_download import stream_image_to_file, ImageDownloadError, IMAGE_TYPE_EXTENSIONS
+from services.llm_usage import (estimate_text_tokens, extract_token_usage, IMAGE_TOKEN_ESTIMATE, usage_scope,
+                                propagate_usage, record_llm_usage, estimate_cost, current_usage_ledger,
+                                UsageLedger, SESSION_USAGE)
+from services.tokenizers import count_tokens
+from services.context_budget import budget_context
+from services.rate_limiter import get_rate_limiter, run_with_rate_limit, classify_llm_error
+from services.concurrency import get_concurrency_controller, concurrency_snapshot, DEFAULT_CONCURRENCY_SETTINGS
+from services.circuit_breaker import get_circuit_breaker, circuit_snapshot
+from services.deadlines import (LLMTimeoutError, DeadlineExceededError, image_deadline, current_image_deadline,
+                                effective_timeout, call_with_timeout, propagate_deadline, mark_timeout_retryable)
+from services.hedging import get_hedger, hedging_snapshot, hedge_cancelled, HedgeCancelledError
+from services.image_complexity import compute_image_features, classify_complexity, NUMPY_AVAILABLE
+from services.metrics import (REGISTRY as METRICS_REGISTRY, HTTP_REQUEST_SECONDS, HTTP_BYTES, CONTEXT_SECONDS,
+                              LLM_REQUEST_SECONDS, LLM_TOKENS, LLM_COST, ERRORS, IMAGES_PROCESSED)
+from services.tracing import (configure_tracing, start_span, current_span, traced, propagate_span,
+                              SPAN_KIND_CLIENT)
+from services.profiling import RunProfiler, format_summary as format_profile, PROFILE_MODES, DEFAULT_TOP_N
+from services.stub_llm import ensure_stub_server
+from services.cassettes import configure_cassettes, get_cassettes, cassette_snapshot, CASSETTE_MODES
 
 # Global configuration (for backward compatibility)
 CONFIG = {}
@@ -110,11 +140,39 @@ DEBUG_MODE = True
 CURRENT_LOG_FILE = None  # Track current log file for this session
 LOG_START_TIME = None  # Track when the log session started
 CURRENT_SESSION_LOGS = None  # Track session-specific logs folder when available
+_HTML_BACKEND_WARNINGS = set()  # Configured parser backends already reported as unavailable
+HTTP_CACHE_BYPASS = False  # Set by --no-cache to skip the on-disk HTTP cache for this run
+ACTIVE_PROFILER = None  # RunProfiler of this run when --profile is given
+
+# Metric children with fixed labels, bound once so hot-path updates build no labels
+PAGE_FETCH_SECONDS = HTTP_REQUEST_SECONDS.labels('page')
+IMAGE_DOWNLOAD_SECONDS = HTTP_REQUEST_SECONDS.labels('image')
+PAGE_BYTES = HTTP_BYTES.labels('page')
+IMAGE_BYTES = HTTP_BYTES.labels('image')
+PARSE_FAILURES = ERRORS.labels('llm_response', 'parse_failure')
+IMAGES_SUCCEEDED = IMAGES_PROCESSED.labels('success')
+IMAGES_FAILED = IMAGES_PROCESSED.labels('failed')
 
 def get_cet_time():
     """Get current time in CET (Central European Time) timezone."""
     return datetime.now(ZoneInfo("Europe/Paris"))
 
+@contextlib.contextmanager
+def workflow_phase(name, attributes=None):
+    """
+    Run a workflow phase (download, context, generation, report) in a tracing span
+    and, with --profile, as a phase of the run profile. Also usable as a decorator.
+
+    Yields:
+        Span: The phase span
+    """
+    with start_span(f"phase.{name}", attributes) as span:
+        if ACTIVE_PROFILER is None:
+            yield span
+        else:
+            with ACTIVE_PROFILER.phase(name):
+                yield span
+
 def load_config(config_file=None):
     """Load configuration from JSON file with error handling."""
     global CONFIG, DEBUG_MODE, STARTUP_MESSAGES
@@ -129,6 +187,8 @@ def load_config(config_file=None):
 
         DEBUG_MODE = CONFIG.get('debug_mode', True)
         debug_log(f"Configuration loaded from {config_settings.CONFIG_FILE}")
+        configure_tracing(CONFIG.get('tracing'), get_absolute_folder_path('logs'))
+        configure_cassettes(CONFIG.get('cassettes'), get_absolute_folder_path('cassettes'))
 
         # Add provider warnings if enabled but not available
         ecb_llm_enabled = CONFIG.get('ecb_llm', {}).get('enabled', True)  # Default True for backward compatibility
@@ -285,9 +345,11 @@ def debug_log(message, level="DEBUG"):
 
 # Global variable to store progress file path (set from CLI args)
 PROGRESS_FILE_PATH = None
+_PROGRESS_STATS = {}  # Run statistics accumulated across progress updates
+_PROGRESS_LOCK = threading.Lock()  # Images may be processed by several worker threads
 
 
-def write_progress(percent, message, phase=None, current_image=None, total_images=None):
+def write_progress(percent, message, phase=None, current_image=None, total_images=None, stats=None):
     """
     Write progress update to a JSON file for async API polling.
     Also prints to stdout for subprocess streaming.
@@ -298,6 +360,8 @@ def write_progress(percent, message, phase=None, current_image=None, total_image
         phase (str): Current phase (e.g., 'downloading', 'processing', 'generating')
         current_image (int): Current image number being processed
         total_images (int): Total number of images to process
+        stats (dict): Run statistics to pass to the job status (e.g. {'http_cache': {...}});
+            merged into the statistics of earlier updates, every update carries all of them
     """
     global PROGRESS_FILE_PATH
 
@@ -323,14 +387,20 @@ def write_progress(percent, message, phase=None, current_image=None, total_image
         if total_images is not None:
             progress_data["total_images"] = total_images
 
-        # Write atomically by writing to temp file first
-        temp_file = PROGRESS_FILE_PATH + ".tmp"
-        with open(temp_file, 'w', encoding='utf-8') as f:
-            json.dump(progress_data, f)
+        with _PROGRESS_LOCK:
+            if stats:
+                _PROGRESS_STATS.update(stats)
+            if _PROGRESS_STATS:
+                progress_data["stats"] = dict(_PROGRESS_STATS)
 
-        # Rename to final file (atomic on most systems)
-        import shutil
-        shutil.move(temp_file, PROGRESS_FILE_PATH)
+            # Write atomically by writing to temp file first
+            temp_file = PROGRESS_FILE_PATH + ".tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(progress_data, f)
+
+            # Rename to final file (atomic on most systems)
+            import shutil
+            shutil.move(temp_file, PROGRESS_FILE_PATH)
 
     except Exception as e:
         # Don't let progress reporting errors break the main process
@@ -391,60 +461,49 @@ def handle_exception(func_name, exception, context=""):
     
     return error_msg
 
-def get_step_config(step_name):
+def get_provider_credentials(provider):
     """
-    Get provider and model configuration for a specific step (vision, processing, or translation).
+    Get the credentials needed to call a provider.
 
     Args:
-        step_name (str): Step name ('vision', 'processing', or 'translation')
+        provider (str): 'OpenAI', 'Claude', 'ECB-LLM', 'Ollama', 'Gemini' or 'Stub'
 
     Returns:
-        tuple: (provider, model, credentials_dict)
+        dict: Credentials (api_key, base_url or auth_mode), or None if unavailable
     """
-    func_name = "get_step_config"
-
-    # Get step configuration
-    steps_config = CONFIG.get('steps', {})
-    step_config = steps_config.get(step_name, {})
-    provider = step_config.get('provider', 'OpenAI')
-    model = step_config.get('model', 'gpt-4o')
-
-    debug_log(f"Step '{step_name}' configured: provider={provider}, model={model}")
-
-    # Get credentials for the provider
     credentials = {}
 
     if provider == 'OpenAI':
         api_key = os.environ.get('OPENAI_API_KEY')
         if not api_key:
             debug_log("OPENAI_API_KEY not found in environment variables", "ERROR")
-            return None, None, None
+            return None
         credentials = {'api_key': api_key}
 
     elif provider == 'Claude':
         api_key = os.environ.get('ANTHROPIC_API_KEY') or os.environ.get('CLAUDE_API_KEY')
         if not api_key:
             debug_log("ANTHROPIC_API_KEY or CLAUDE_API_KEY not found in environment variables", "ERROR")
-            return None, None, None
+            return None
         credentials = {'api_key': api_key}
 
     elif provider == 'ECB-LLM':
         if not ECB_LLM_AVAILABLE:
             debug_log("ECB-LLM client not installed. Install with: pip install ecb_llm_client", "ERROR")
-            return None, None, None
+            return None
 
         client_id = os.environ.get('CLIENT_ID_U2A')
         client_secret = os.environ.get('CLIENT_SECRET_U2A')
 
         if not client_id or not client_secret:
             debug_log("CLIENT_ID_U2A or CLIENT_SECRET_U2A not found in environment variables", "ERROR")
-            return None, None, None
+            return None
         credentials = {'auth_mode': 'U2A'}
 
     elif provider == 'Ollama':
         if not OLLAMA_AVAILABLE:
             debug_log("Ollama client not installed. Install with: pip install ollama", "ERROR")
-            return None, None, None
+            return None
 
         ollama_config = CONFIG.get('ollama', {})
         base_url = ollama_config.get('base_url', 'http://localhost:11434')
@@ -453,17 +512,53 @@ def get_step_config(step_name):
     elif provider == 'Gemini':
         if not GEMINI_AVAILABLE:
             debug_log("Google Generative AI not installed. Install with: pip install google-generativeai", "ERROR")
-            return None, None, None
+            return None
 
         api_key = os.environ.get('GEMINI_API_KEY')
         if not api_key:
             debug_log("GEMINI_API_KEY not found in environment variables", "ERROR")
-            return None, None, None
+            return None
         # Defer configuration to helper for compatibility
         credentials = {'api_key': api_key}
 
+    elif provider == 'Stub':
+        # Offline OpenAI-compatible stub (services/stub_llm.py): an external server
+        # (tools/stub_llm_server.py) at STUB_LLM_BASE_URL or stub.base_url, or one started in this process
+        base_url = os.environ.get('STUB_LLM_BASE_URL') or CONFIG.get('stub', {}).get('base_url')
+        if not base_url:
+            base_url = ensure_stub_server(CONFIG.get('stub_server')).openai_base_url
+            debug_log(f"Started in-process stub LLM server at {base_url}")
+        credentials = {'api_key': 'stub', 'base_url': base_url}
+
     else:
         debug_log(f"Unknown provider: {provider}", "ERROR")
+        return None
+
+    return credentials
+
+def get_step_config(step_name):
+    """
+    Get provider and model configuration for a specific step (vision, processing, or translation).
+
+    Args:
+        step_name (str): Step name ('vision', 'processing', or 'translation')
+
+    Returns:
+        tuple: (provider, model, credentials_dict)
+    """
+    func_name = "get_step_config"
+
+    # Get step configuration
+    steps_config = CONFIG.get('steps', {})
+    step_config = steps_config.get(step_name, {})
+    provider = step_config.get('provider', 'OpenAI')
+    model = step_config.get('model', 'gpt-4o')
+
+    debug_log(f"Step '{step_name}' configured: provider={provider}, model={model}")
+
+    # Get credentials for the provider
+    credentials = get_provider_credentials(provider)
+    if credentials is None:
         return None, None, None
 
     return provider, model, credentials
@@ -891,6 +986,353 @@ def get_enabled_image_attributes():
 
     return enabled_attrs
 
+def get_html_parser_backend(tree_required=False):
+    """
+    Get the HTML parser backend to use, based on html_parsing.backend in config.
+
+    Args:
+        tree_required (bool): True when the caller needs a full navigable tree (context extraction)
+
+    Returns:
+        str: Installed backend name ('selectolax', 'lxml', 'html5lib' or 'html.parser')
+    """
+    configured = CONFIG.get('html_parsing', {}).get('backend', 'auto')
+    backend = resolve_html_backend(configured, tree_required=tree_required)
+    if configured not in ('auto', backend) and not (configured == 'selectolax' and tree_required) \
+            and configured not in _HTML_BACKEND_WARNINGS:
+        _HTML_BACKEND_WARNINGS.add(configured)
+        debug_log(f"HTML parser backend '{configured}' not installed, using '{backend}'", "WARNING")
+    return backend
+
+def get_scraping_session():
+    """
+    Get the shared HTTP session used for page and image scraping.
+
+    The session pools connections per host, retries connection errors and 5xx
+    responses with backoff, and sends the configured user agent and timeout.
+
+    Returns:
+        ScrapingSession: requests.Session subclass with per-host latency stats
+    """
+    download_config = CONFIG.get('download', {})
+    return get_http_session(
+        user_agent=download_config.get('user_agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'),
+        timeout=download_config.get('timeout', 30),
+        http_settings=CONFIG.get('http', {})
+    )
+
+def get_scraping_cache():
+    """
+    Get the on-disk HTTP cache for scraped pages and images.
+
+    Returns:
+        HTTPCache: Shared cache, or None when disabled in config or bypassed with --no-cache
+    """
+    cache_config = CONFIG.get('http_cache', {})
+    if HTTP_CACHE_BYPASS or not cache_config.get('enabled', True):
+        return None
+    return get_http_cache(get_absolute_folder_path('http_cache'), cache_config.get('max_size_mb', 500))
+
+def fetch_url(url, stream=False, **kwargs):
+    """
+    GET a URL through the shared scraping session and the HTTP cache.
+
+    Args:
+        url (str): URL to fetch
+        stream (bool): Stream the body (streamed bodies are served from, but not stored in, the cache)
+        **kwargs: Extra arguments for requests (headers, timeout, ...)
+
+    Returns:
+        requests.Response: Network or cached response
+    """
+    session = get_scraping_session()
+    cache = get_scraping_cache()
+    if cache is None:
+        return session.get(url, stream=stream, **kwargs)
+    return cache.get(session, url, stream=stream, **kwargs)
+
+def get_http_cache_stats():
+    """Return HTTP cache hit/miss counters for this run (empty dict when the cache is off)."""
+    cache = get_scraping_cache()
+    return cache.stats() if cache is not None else {}
+
+def log_http_host_stats():
+    """Write per-host latency statistics of the scraping session to the debug log."""
+    for host, stats in get_scraping_session().host_stats().items():
+        debug_log(f"HTTP {host}: {stats['requests']} requests, {stats['errors']} errors, "
+                  f"avg {stats['avg_seconds']:.3f}s (min {stats['min_seconds']:.3f}s, max {stats['max_seconds']:.3f}s)")
+
+def get_llm_rate_limits(provider, model):
+    """
+    Look up the configured RPM/TPM limits for a provider/model.
+
+    'Provider/model' entries in rate_limits.limits override 'Provider' entries.
+
+    Returns:
+        dict: {'rpm': int, 'tpm': int}; 0 means unlimited
+    """
+    limits_config = CONFIG.get('rate_limits', {}).get('limits', {})
+    return limits_config.get(f"{provider}/{model}") or limits_config.get(provider) or {}
+
+def get_image_workers():
+    """
+    Number of images processed in parallel.
+
+    Defaults to llm_concurrency.max_window so the worker pool never caps the
+    AIMD window below its own limit (the window could not grow otherwise);
+    an explicit image_workers is a hard cap on concurrent LLM calls.
+
+    Returns:
+        int: Worker count (1 when llm_concurrency is disabled)
+    """
+    concurrency_config = CONFIG.get('llm_concurrency', {})
+    if not concurrency_config.get('enabled', True):
+        return 1
+    workers = concurrency_config.get('image_workers') or concurrency_config.get(
+        'max_window', DEFAULT_CONCURRENCY_SETTINGS['max_window'])
+    return max(int(workers), 1)
+
+def get_llm_step_timeout(step):
+    """
+    Get the configured timeout in seconds for one LLM step (0 means no timeout).
+
+    Args:
+        step (str): 'vision', 'processing' or 'translation'
+    """
+    return CONFIG.get('llm_timeouts', {}).get(step, 0) or 0
+
+def llm_client_options(step, sdk_retries=True):
+    """
+    Extra keyword arguments for provider SDK clients and requests.
+
+    The timeout is the step timeout, shortened to the time left on the current
+    image deadline. When the rate limiter is enabled it owns retries, so the
+    OpenAI/Anthropic SDK retry loops are switched off to avoid multiplying
+    attempts on 429 responses.
+
+    Args:
+        step (str): 'vision', 'processing' or 'translation'
+        sdk_retries (bool): Include max_retries (OpenAI/Anthropic clients only)
+
+    Returns:
+        dict: e.g. {'timeout': 60.0, 'max_retries': 0}
+    """
+    options = {}
+    timeout, _ = effective_timeout(get_llm_step_timeout(step))
+    if timeout:
+        options['timeout'] = timeout
+    if sdk_retries and CONFIG.get('rate_limits', {}).get('enabled', True):
+        options['max_retries'] = 0
+    return options
+
+def error_class(exc):
+    """
+    Map an exception to the error class reported in mab_errors_total.
+
+    Returns:
+        str: 'rate_limit', 'auth', 'timeout', 'server', 'connection', 'client' or 'other'
+    """
+    if isinstance(exc, (LLMTimeoutError, DeadlineExceededError, requests.exceptions.Timeout)):
+        return 'timeout'
+    info = classify_llm_error(exc)
+    status = info['status']
+    name = type(exc).__name__
+    if info['rate_limited']:
+        return 'rate_limit'
+    if status in (401, 403) or 'Authentication' in name or 'PermissionDenied' in name:
+        return 'auth'
+    if 'Timeout' in name:
+        return 'timeout'
+    if status is not None and status >= 500:
+        return 'server'
+    if isinstance(exc, requests.exceptions.ConnectionError) or 'Connection' in name:
+        return 'connection'
+    if status is not None and status >= 400:
+        return 'client'
+    return 'other'
+
+def call_llm(step, provider, model, request_fn, prompt_text="", max_output_tokens=1000, image_count=0, images=None):
+    """
+    Run a provider API call under the adaptive concurrency window and the shared rate limiter.
+
+    Each attempt holds a slot in the endpoint's AIMD concurrency window, which grows
+    while calls succeed with healthy latency and shrinks on 429, 5xx and timeouts.
+    Every attempt is bounded by the step timeout and the current image deadline.
+    The call waits for room in the provider's RPM/TPM buckets (shared with other
+    analysis processes through a state file in the logs folder), and rate-limit,
+    overload and timeout errors are retried with jittered exponential backoff that
+    honours Retry-After and the provider rate-limit reset headers.
+
+    Args:
+        step (str): Step name for logging ('vision', 'processing', 'translation')
+        provider (str): Provider name
+        model (str): Model name
+        request_fn (callable): Performs the API call and returns the raw response
+        prompt_text (str): Prompt text, used to estimate the token cost
+        max_output_tokens (int): Output token budget of the call
+        image_count (int): Number of images sent with the call
+        images (list): Paths of the image files sent with the call (sets image_count)
+
+    Each call runs in a tracing span with the provider, model, prompt size and
+    reported token counts as attributes. With cassettes in 'record' or 'replay'
+    mode (services/cassettes.py) the response is stored or served back.
+
+    Returns:
+        Raw provider response returned by request_fn
+    """
+    image_count = image_count or len(images or ())
+    with start_span(f"llm.{step}", {'llm.step': step, 'llm.provider': provider, 'llm.model': model,
+                                     'llm.prompt_chars': len(prompt_text), 'llm.image_count': image_count},
+                    kind=SPAN_KIND_CLIENT) as span:
+        response = _call_llm(step, provider, model, request_fn, prompt_text, max_output_tokens, image_count, images)
+        usage = extract_token_usage(response)
+        if usage:
+            span.set_attributes({'llm.input_tokens': usage['input_tokens'], 'llm.output_tokens': usage['output_tokens'],
+                                 'llm.cached_input_tokens': usage['cached_input_tokens']})
+        return response
+
+def _call_llm(step, provider, model, request_fn, prompt_text, max_output_tokens, image_count, images=None):
+    key = f"{provider}/{model}"
+    cassettes = get_cassettes()
+    if cassettes is not None:
+        # Innermost wrapper: records the provider's own latency, replays it per attempt
+        request_fn = cassettes.wrap(step, provider, model, request_fn, prompt_text, max_output_tokens, images)
+    step_timeout = get_llm_step_timeout(step)
+    estimated_input_tokens = count_tokens(prompt_text, provider, model) + image_count * IMAGE_TOKEN_ESTIMATE
+    call_start = time.perf_counter()
+
+    controller = None
+    concurrency_config = CONFIG.get('llm_concurrency', {})
+    if concurrency_config.get('enabled', True):
+        controller = get_concurrency_controller(key, concurrency_config)
+
+    def congestion_reason(exc):
+        info = classify_llm_error(exc)
+        if info['rate_limited']:
+            return "rate limited"
+        if info['retryable']:
+            return f"HTTP {info['status']}" if info['status'] else type(exc).__name__
+        return None
+
+    def timed_request(send=request_fn):
+        if hedge_cancelled():
+            raise HedgeCancelledError(f"{step} call to {key} lost a hedged race")
+        # The timeout is recomputed per attempt so retries never outlive the image deadline
+        timeout, reason = effective_timeout(step_timeout)
+        deadline = current_image_deadline()
+        if reason == 'image_deadline' and timeout <= 0:
+            deadline.record_timeout(step, 0.0, reason)
+            ERRORS.labels(step, 'timeout').inc()
+            raise DeadlineExceededError(step, deadline.budget)
+        if controller is not None:
+            # Each attempt (including retries) holds a slot in the endpoint's AIMD window;
+            # queueing for it counts against the same timeout as the call itself
+            slot_timeout = timeout
+            queued_at = time.monotonic()
+            acquired = controller.acquire(slot_timeout)
+            if acquired and slot_timeout is not None:
+                timeout = slot_timeout - (time.monotonic() - queued_at)
+                if timeout <= 0:
+                    controller.release()  # Nothing left to spend on the call itself
+                    acquired = False
+            if not acquired:
+                debug_log(f"{step} call to {key} found no concurrency slot within {slot_timeout:.1f}s ({reason})", "WARNING")
+                if deadline is not None:
+                    deadline.record_timeout(step, slot_timeout, reason)
+                ERRORS.labels(step, 'timeout').inc()
+                if reason == 'image_deadline':
+                    raise DeadlineExceededError(step, deadline.budget)
+                raise mark_timeout_retryable(LLMTimeoutError(
+                    step, slot_timeout, f"{step} call to {key} waited {slot_timeout:.1f}s for a concurrency slot"),
+                    step_timeout)
+            # Released by the worker when the provider call really returns, even after a timeout
+            send = functools.partial(controller.run, send, congestion_reason)
+        try:
+            return call_with_timeout(send, timeout, step)
+        except LLMTimeoutError as exc:
+            # Retried only if the image deadline still has room for a full step timeout
+            mark_timeout_retryable(exc, step_timeout)
+            debug_log(f"{step} call to {key} timed out after {timeout:.1f}s ({reason})", "WARNING")
+            if deadline is not None:
+                deadline.record_timeout(step, timeout, reason)
+            ERRORS.labels(step, 'timeout').inc()
+            if controller is not None:
+                controller.record_congestion("timeout")
+            raise
+        except HedgeCancelledError:
+            raise
+        except Exception as exc:
+            ERRORS.labels(step, error_class(exc)).inc()
+            raise
+    request_fn = timed_request
+
+    rate_config = CONFIG.get('rate_limits', {})
+    if not rate_config.get('enabled', True):
+        response = request_fn()
+        record_call_usage(step, provider, model, response, estimated_input_tokens, time.perf_counter() - call_start)
+        return response
+
+    state_path = None
+    if rate_config.get('shared_state', True):
+        state_path = os.path.join(get_absolute_folder_path('logs'), 'rate-limits.json')
+
+    def on_retry(attempt, delay, info, exc):
+        reason = "rate limited" if info['rate_limited'] else "transient error"
+        debug_log(f"{step} call to {provider}/{model} {reason} ({exc}); retry {attempt} in {delay:.1f}s", "WARNING")
+
+    # Never back off for longer than the image deadline has left
+    max_delay = rate_config.get('max_delay_seconds', 60.0)
+    remaining, _ = effective_timeout(None)
+    if remaining is not None:
+        max_delay = max(min(max_delay, remaining), 0.0)
+
+    response = run_with_rate_limit(
+        get_rate_limiter(state_path),
+        key,
+        get_llm_rate_limits(provider, model),
+        request_fn,
+        estimated_tokens=estimated_input_tokens + max_output_tokens,
+        usage_fn=lambda response: (extract_token_usage(response) or {}).get('total_tokens'),
+        max_retries=rate_config.get('max_retries', 5),
+        base_delay=rate_config.get('base_delay_seconds', 1.0),
+        max_delay=max_delay,
+        on_retry=on_retry,
+        deadline=current_image_deadline(),
+        step=step
+    )
+    record_call_usage(step, provider, model, response, estimated_input_tokens, time.perf_counter() - call_start)
+    return response
+
+def get_llm_price(provider, model):
+    """
+    Get the price entry of a model from llm_costs.prices.
+
+    Entries are keyed 'Provider/model', by model name alone, or by provider
+    name for a price that covers all of its models (e.g. local Ollama).
+
+    Returns:
+        dict: {'input', 'cached_input', 'output'} per million tokens, or None if not priced
+    """
+    prices = CONFIG.get('llm_costs', {}).get('prices', {})
+    return prices.get(f"{provider}/{model}") or prices.get(model) or prices.get(provider)
+
+def record_call_usage(step, provider, model, response, estimated_input_tokens=0, seconds=0.0):
+    """Log a call's tokens, wall time and estimated cost and add them to the current usage ledger."""
+    usage = extract_token_usage(response)
+    cost = estimate_cost(usage, get_llm_price(provider, model))
+    LLM_REQUEST_SECONDS.labels(step, provider, model).observe(seconds)
+    if usage:
+        LLM_TOKENS.labels(step, provider, model, 'input').inc(usage['input_tokens'])
+        LLM_TOKENS.labels(step, provider, model, 'cached_input').inc(usage['cached_input_tokens'])
+        LLM_TOKENS.labels(step, provider, model, 'output').inc(usage['output_tokens'])
+    if cost:
+        LLM_COST.labels(provider, model).inc(cost)
+    if usage:
+        debug_log(f"{step} call to {provider}/{model}: {usage['input_tokens']} input tokens (estimated {estimated_input_tokens}, "
+                  f"{usage['cached_input_tokens']} cached), {usage['output_tokens']} output tokens, {seconds:.2f}s"
+                  + (f", ~{cost:.5f} {CONFIG.get('llm_costs', {}).get('currency', 'USD')}" if cost is not None else ""))
+    record_llm_usage(step, usage, estimated_input_tokens, f"{provider}/{model}", seconds, cost)
+
 def get_image_url_from_element(element, attributes):
     """
     Extract image URL from an element using the specified attributes.
@@ -925,6 +1367,27 @@ def get_image_url_and_attribute(element, attributes):
             return (value, attr)
     return (None, None)
 
+def format_llm_usage(totals):
+    """
+    Format LLM usage totals for reports and the console.
+
+    Args:
+        totals (dict): 'total' entry of a UsageLedger summary (or a sum of them)
+
+    Returns:
+        str: e.g. "12 calls, 20,480 input tokens (8,192 cached), 1,024 output tokens, 41.2 s, ~0.0612 USD"
+    """
+    text = (f"{totals.get('calls', 0)} calls, {totals.get('input_tokens', 0):,} input tokens "
+            f"({totals.get('cached_input_tokens', 0):,} cached), {totals.get('output_tokens', 0):,} output tokens, "
+            f"{totals.get('seconds', 0.0):.1f} s")
+    currency = CONFIG.get('llm_costs', {}).get('currency', 'USD')
+    if totals.get('calls', 0) > totals.get('unpriced_calls', 0):
+        text += f", ~{totals.get('cost', 0.0):.4f} {currency}"
+        if totals.get('unpriced_calls'):
+            text += f" ({totals['unpriced_calls']} calls without a price)"
+    return text
+
+@workflow_phase('report')
 def generate_html_report(alt_text_folder=None, images_folder=None, output_filename="alt-text-report.html", page_title=None):
     """
     Generate an accessible HTML report summarizing all alt-text JSON files.
@@ -967,6 +1430,7 @@ def generate_html_report(alt_text_folder=None, images_folder=None, output_filena
         ai_translation_model = ""
         translation_method = ""
         total_processing_time = 0.0
+        report_usage = {}
         for json_file in sorted(json_files):
             json_path = os.path.join(alt_text_folder, json_file)
             try:
@@ -1007,6 +1471,9 @@ def generate_html_report(alt_text_folder=None, images_folder=None, output_filena
                         translation_method = data.get('translation_mode', data.get('translation_method', 'none'))
                     # Sum up processing times
                     total_processing_time += data.get('processing_time_seconds', 0.0)
+                    # Sum up LLM calls, tokens and cost
+                    for field, value in data.get('llm_usage', {}).get('total', {}).items():
+                        report_usage[field] = report_usage.get(field, 0) + value
             except Exception as e:
                 debug_log(f"Error reading {json_file}: {str(e)}", "WARNING")
                 continue
@@ -1500,6 +1967,10 @@ def generate_html_report(alt_text_folder=None, images_folder=None, output_filena
         html_content = html_content.replace('{GEO_BOOST_HTML}', geo_boost_html)
         html_content = html_content.replace('{TOTAL_IMAGES}', str(len(image_data)))
         html_content = html_content.replace('{TOTAL_PROCESSING_TIME}', f"{total_processing_time:.2f}")
+        llm_usage_html = ""
+        if report_usage:
+            llm_usage_html = f"<p><strong>LLM Usage:</strong> {format_llm_usage(report_usage)}</p>"
+        html_content = html_content.replace('{LLM_USAGE_HTML}', llm_usage_html)
         html_content = html_content.replace('{GENERATION_TIMESTAMP}', get_cet_time().strftime('%Y-%m-%d %H:%M:%S CET'))
         html_content = html_content.replace('{IMAGE_ANALYSIS_OVERVIEW_HTML}', image_analysis_overview_html)
         html_content = html_content.replace('{IMAGE_CARDS_HTML}', image_cards_html)
@@ -1874,6 +2345,7 @@ def load_translation_system_prompt(translation_prompt_folder):
     max_chars = CONFIG.get('alt_text_max_chars', 125)
     return f"You are a professional translator specializing in WCAG-compliant alternative text. Translate to {{TARGET_LANGUAGE}} while ensuring the output is exactly {max_chars} characters or less."
 
+@traced('translate_alt_text')
 def translate_alt_text(alt_text, source_language, target_language, return_prompt: bool = False):
     """
     Translate alt-text from source language to target language while maintaining configured character limit.
@@ -1897,17 +2369,17 @@ def translate_alt_text(alt_text, source_language, target_language, return_prompt
             return None
 
         # Initialize client based on provider
-        if provider == 'OpenAI':
-            client = OpenAI(api_key=credentials['api_key'])
+        if provider in ('OpenAI', 'Stub'):
+            client = OpenAI(api_key=credentials['api_key'], base_url=credentials.get('base_url'), **llm_client_options('translation'))
         elif provider == 'Claude':
             from anthropic import Anthropic
-            client = Anthropic(api_key=credentials['api_key'])
+            client = Anthropic(api_key=credentials['api_key'], **llm_client_options('translation'))
         elif provider == 'ECB-LLM':
             client = ECBAzureOpenAI()
         elif provider == 'Ollama':
             import ollama
             base_url = credentials.get('base_url', 'http://localhost:11434')
-            client = ollama.Client(host=base_url)
+            client = ollama.Client(host=base_url, **llm_client_options('translation', sdk_retries=False))
         elif provider == 'Gemini':
             if not configure_gemini(credentials['api_key']):
                 return None
@@ -1970,7 +2442,7 @@ def translate_alt_text(alt_text, source_language, target_language, return_prompt
         # Make API request based on provider
         if provider == 'Claude':
             # Claude uses a different API structure
-            response = client.messages.create(
+            response = call_llm('translation', provider, model, lambda: client.messages.create(
                 model=model,
                 max_tokens=200,
                 messages=[
@@ -1981,11 +2453,11 @@ def translate_alt_text(alt_text, source_language, target_language, return_prompt
                 ],
                 system=translation_system_prompt,  # Claude uses system parameter separately
                 temperature=0.3
-            )
+            ), prompt_text=translation_system_prompt + translation_prompt, max_output_tokens=200)
             translated_text = response.content[0].text
         elif provider == 'Ollama':
             # Ollama uses a simpler API structure
-            response = client.chat(
+            response = call_llm('translation', provider, model, lambda: client.chat(
                 model=model,
                 messages=[
                     {
@@ -1997,12 +2469,12 @@ def translate_alt_text(alt_text, source_language, target_language, return_prompt
                         "content": translation_prompt
                     }
                 ]
-            )
+            ), prompt_text=translation_system_prompt + translation_prompt, max_output_tokens=200)
             translated_text = response['message']['content']
         elif provider == 'Gemini':
             # Gemini API structure
             combined_prompt = f"{translation_system_prompt}\n\n{translation_prompt}"
-            response = client.generate_content(combined_prompt)
+            response = call_llm('translation', provider, model, lambda: client.generate_content(combined_prompt, request_options=llm_client_options('translation', sdk_retries=False)), prompt_text=combined_prompt, max_output_tokens=200)
             translated_text = response.text
         else:
             # OpenAI and ECB-LLM use the standard OpenAI API
@@ -2010,7 +2482,7 @@ def translate_alt_text(alt_text, source_language, target_language, return_prompt
             if not model.startswith('gpt-5'):
                 api_params["temperature"] = 0.3  # Lower temperature for more consistent translations
 
-            response = client.chat.completions.create(**api_params)
+            response = call_llm('translation', provider, model, lambda: client.chat.completions.create(**api_params), prompt_text=translation_system_prompt + translation_prompt, max_output_tokens=200)
             translated_text = response.choices[0].message.content
 
         # Check if response is None or empty
@@ -2056,6 +2528,7 @@ def translate_alt_text(alt_text, source_language, target_language, return_prompt
         return None
 
 
+@traced('translate_text')
 def translate_text(text, source_language, target_language, text_type="reasoning"):
     """
     Translate any text from source language to target language.
@@ -2080,17 +2553,17 @@ def translate_text(text, source_language, target_language, text_type="reasoning"
             return None
 
         # Initialize client based on provider
-        if provider == 'OpenAI':
-            client = OpenAI(api_key=credentials['api_key'])
+        if provider in ('OpenAI', 'Stub'):
+            client = OpenAI(api_key=credentials['api_key'], base_url=credentials.get('base_url'), **llm_client_options('translation'))
         elif provider == 'Claude':
             from anthropic import Anthropic
-            client = Anthropic(api_key=credentials['api_key'])
+            client = Anthropic(api_key=credentials['api_key'], **llm_client_options('translation'))
         elif provider == 'ECB-LLM':
             client = ECBAzureOpenAI()
         elif provider == 'Ollama':
             import ollama
             base_url = credentials.get('base_url', 'http://localhost:11434')
-            client = ollama.Client(host=base_url)
+            client = ollama.Client(host=base_url, **llm_client_options('translation', sdk_retries=False))
         elif provider == 'Gemini':
             if not GEMINI_AVAILABLE or genai is None:
                 debug_log("Google GenAI client not installed. Install google-genai (or google-generativeai for fallback).", "ERROR")
@@ -2146,22 +2619,22 @@ Provide ONLY the translated text in {target_lang_name}, nothing else. Do not inc
         # Make API request based on provider
         if provider == 'Claude':
             # Claude uses a different API structure
-            response = client.messages.create(
+            response = call_llm('translation', provider, model, lambda: client.messages.create(
                 model=model,
                 max_tokens=500,
                 messages=[{"role": "user", "content": translation_prompt}]
-            )
+            ), prompt_text=translation_prompt, max_output_tokens=500)
             translated_text = response.content[0].text.strip()
         elif provider == 'Ollama':
             # Ollama uses a different API structure
-            response = client.chat(
+            response = call_llm('translation', provider, model, lambda: client.chat(
                 model=model,
                 messages=[{"role": "user", "content": translation_prompt}]
-            )
+            ), prompt_text=translation_prompt, max_output_tokens=500)
             translated_text = response['message']['content'].strip()
         elif provider == 'Gemini':
             # Gemini API structure
-            response = client.generate_content(translation_prompt)
+            response = call_llm('translation', provider, model, lambda: client.generate_content(translation_prompt, request_options=llm_client_options('translation', sdk_retries=False)), prompt_text=translation_prompt, max_output_tokens=500)
             translated_text = response.text.strip()
         else:
             # OpenAI and ECB-LLM use OpenAI-compatible API
@@ -2175,7 +2648,7 @@ Provide ONLY the translated text in {target_lang_name}, nothing else. Do not inc
             if not model.startswith('gpt-5'):
                 api_params["temperature"] = 0.3
 
-            response = client.chat.completions.create(**api_params)
+            response = call_llm('translation', provider, model, lambda: client.chat.completions.create(**api_params), prompt_text=translation_prompt, max_output_tokens=500)
             translated_text = response.choices[0].message.content.strip()
 
         # Remove quotes if present
@@ -2192,323 +2665,1161 @@ Provide ONLY the translated text in {target_lang_name}, nothing else. Do not inc
         return None
 
 
-def analyze_image_with_ai(image_path, combined_prompt, credentials, language=None, vision_prompt=None):
+def route_image(image_path):
     """
-    Analyze an image using two-step processing with support for all AI providers.
-
-    This is the main image analysis function that supports:
-    - OpenAI (GPT-4o, GPT-5.x)
-    - Claude (Sonnet, Opus, Haiku)
-    - ECB-LLM (internal ECB service)
-    - Ollama (local models)
+    Pick the 'simple' or 'complex' model pair for an image from cheap local features.
 
-    Supports mixed providers (e.g., Claude for vision, OpenAI for processing).
+    Edge density, colour count, text-likeness and aspect ratio are computed on a
+    thumbnail (see services/image_complexity.py) and compared against
+    complexity_routing.thresholds. The route selects steps.<step>.routes.<route>
+    as the head of the vision and processing chains.
 
     Args:
         image_path (str): Path to the image file
-        combined_prompt (str): The combined prompt with context for analysis
-        credentials (dict): DEPRECATED - kept for backward compatibility
-        language (str): ISO language code for alt-text generation
-        vision_prompt (str): Optional vision prompt for step 1. If None, loads from vision folder.
 
     Returns:
-        dict: Parsed response with image_type, image_description, reasoning, and alt_text
+        dict: {'route', 'reasons', 'features', 'seconds'}, or None when routing is
+              disabled or the features could not be computed (default models are used)
     """
-    func_name = "analyze_image_with_ai"
-
-    debug_log(f"Starting two-step analysis for: {image_path} with multi-provider support")
+    routing_config = CONFIG.get('complexity_routing', {})
+    if not routing_config.get('enabled', False):
+        return None
+    if not NUMPY_AVAILABLE:
+        debug_log("Complexity routing enabled but numpy is not installed, using default models", "WARNING")
+        return None
 
+    start = time.perf_counter()
     try:
-        # Get provider and model configuration for each step
-        vision_provider, vision_model, vision_creds = get_step_config('vision')
-        processing_provider, processing_model, processing_creds = get_step_config('processing')
-        translation_provider, translation_model, _ = get_step_config('translation')
+        image_source = image_path
+        if guess_type(image_path)[0] == "image/svg+xml":
+            if not SVG_SUPPORT:
+                raise ValueError("SVG conversion not supported. Install cairosvg: pip install cairosvg")
+            with open(image_path, "rb") as svg_file:
+                image_source = io.BytesIO(cairosvg.svg2png(bytestring=svg_file.read()))
+        features = compute_image_features(image_source)
+    except Exception as e:
+        debug_log(f"Complexity routing skipped for {os.path.basename(image_path)}: {e}", "WARNING")
+        return None
 
-        if not vision_provider or not processing_provider:
-            debug_log("Failed to retrieve step configurations", "ERROR")
-            return None
+    route, reasons = classify_complexity(features, routing_config.get('thresholds'))
+    elapsed = round(time.perf_counter() - start, 4)
+    log_message(f"Routing {os.path.basename(image_path)} -> {route} ({'; '.join(reasons)})", "INFORMATION")
+    debug_log(f"Complexity features for {os.path.basename(image_path)}: {features} ({elapsed}s)")
+    return {'route': route, 'reasons': reasons, 'features': features, 'seconds': elapsed}
 
-        debug_log(f"Vision step: {vision_provider} / {vision_model}")
-        debug_log(f"Processing step: {processing_provider} / {processing_model}")
-        debug_log(f"Translation step: {translation_provider} / {translation_model}")
+def get_step_chain(step_name, route=None):
+    """
+    Get the ordered providers to try for a step.
 
-        # Load vision prompt if not provided
-        if vision_prompt is None:
-            vision_prompt_folder = get_absolute_folder_path('prompt_vision')
-            vision_prompt = load_vision_prompt(vision_prompt_folder)
+    The provider/model configured in 'steps' comes first, followed by the
+    entries of failover.chains.<step> (when failover is enabled). With a
+    complexity route, steps.<step>.routes.<route> replaces the head of the
+    chain when it is configured.
 
-        debug_log(f"Using vision prompt: {vision_prompt[:100]}...")
+    Args:
+        step_name (str): 'vision' or 'processing'
+        route (str): 'simple' or 'complex' from route_image(), None for the default models
+
+    Returns:
+        list: [(provider, model), ...]
+    """
+    step_config = CONFIG.get('steps', {}).get(step_name, {})
+    route_config = (step_config.get('routes', {}).get(route) or {}) if route else {}
+    chain = [(route_config.get('provider') or step_config.get('provider', 'OpenAI'),
+              route_config.get('model') or step_config.get('model', 'gpt-4o'))]
+
+    failover_config = CONFIG.get('failover', {})
+    if failover_config.get('enabled', True):
+        for entry in failover_config.get('chains', {}).get(step_name, []):
+            candidate = (entry.get('provider'), entry.get('model'))
+            if candidate[0] and candidate[1] and candidate not in chain:
+                chain.append(candidate)
+    return chain
+
+def call_with_hedging(step_name, target, call_fn, secondary_fn):
+    """
+    Call one provider, hedging with a duplicate request when it is slow.
 
-        # STEP 1: Vision model generates image description
-        debug_log(f"Step 1: Generating image description with {vision_provider} / {vision_model}")
+    When hedging is enabled for the step and the call has not answered within
+    the configured percentile of recent latencies, the same request is sent to
+    the same provider or, with target 'secondary', to the next healthy provider
+    of the failover chain. The first successful answer wins.
+
+    Args:
+        step_name (str): 'vision' or 'processing'
+        target (tuple): (provider, model, credentials) of the primary request
+        call_fn (callable): call_fn(provider, model, credentials) -> step output
+        secondary_fn (callable): Returns (provider, model, credentials) of the secondary provider, or None
 
-        if vision_provider == 'Ollama':
-            # Ollama-specific initialization
-            base_url = vision_creds.get('base_url', 'http://localhost:11434')
-            vision_client = ollama.Client(host=base_url)
-            debug_log(f"Ollama client initialized with host: {base_url}")
+    Returns:
+        tuple: (output, (provider, model, hedged)) naming the provider that answered
+    """
+    provider, model, credentials = target
+    hedging_config = CONFIG.get('hedging', {})
+    if not hedging_config.get('enabled', False) or step_name not in hedging_config.get('steps', ['vision', 'processing']):
+        return call_fn(provider, model, credentials), (provider, model, False)
+
+    hedge_target = target
+    if hedging_config.get('target', 'same') == 'secondary':
+        hedge_target = secondary_fn() or target
+
+    output, hedged = get_hedger(step_name, hedging_config).run(
+        lambda: call_fn(provider, model, credentials),
+        lambda: call_fn(*hedge_target),
+        wrap=lambda fn: propagate_span(propagate_usage(propagate_deadline(fn)))
+    )
+    if hedged:
+        debug_log(f"{step_name}: hedged request to {hedge_target[0]}/{hedge_target[1]} answered first", "INFORMATION")
+        return output, (hedge_target[0], hedge_target[1], True)
+    return output, (provider, model, False)
 
-            # Ollama expects base64-encoded image data, not file paths
-            # Handle SVG conversion to PNG for vision model compatibility
-            import base64
-            from mimetypes import guess_type
+def run_step_with_failover(step_name, call_fn, route=None):
+    """
+    Run one analysis step on the first healthy provider of its failover chain.
 
-            mime_type, _ = guess_type(image_path)
-            if mime_type == "image/svg+xml":
-                if not SVG_SUPPORT:
-                    debug_log("SVG file detected but cairosvg not installed. Cannot convert to PNG.", "ERROR")
-                    raise ValueError("SVG conversion not supported. Install cairosvg: pip install cairosvg")
+    Providers without credentials or with an open circuit breaker are skipped.
+    A call that fails for provider-health reasons (rate limit, 5xx, timeout,
+    connection error) counts against the provider's breaker and the next provider
+    is tried; after failure_threshold consecutive failures the breaker opens and
+    the provider is skipped until a half-open probe succeeds. Errors caused by the
+    request itself (e.g. an invalid image) are raised at once: another provider
+    would fail the same way, and they say nothing about the provider's health.
 
-                debug_log(f"SVG file detected: {image_path}. Converting to PNG for Ollama vision model...")
-                try:
-                    with open(image_path, "rb") as svg_file:
-                        svg_data = svg_file.read()
-                    # Convert SVG to PNG
-                    png_data = cairosvg.svg2png(bytestring=svg_data)
-                    image_data = base64.b64encode(png_data).decode('utf-8')
-                    debug_log(f"Successfully converted SVG to PNG (size: {len(png_data)} bytes)")
-                except Exception as e:
-                    debug_log(f"Failed to convert SVG to PNG: {str(e)}", "ERROR")
-                    raise
-            else:
-                # Regular image file
-                with open(image_path, 'rb') as img_file:
-                    image_data = base64.b64encode(img_file.read()).decode('utf-8')
+    Args:
+        step_name (str): 'vision' or 'processing'
+        call_fn (callable): call_fn(provider, model, credentials) -> step output
+        route (str): Complexity route selecting the head of the chain (see get_step_chain())
 
-            vision_response = vision_client.chat(
-                model=vision_model,
-                messages=[{
-                    'role': 'user',
-                    'content': vision_prompt,
-                    'images': [image_data]
-                }]
-            )
-            image_description = vision_response['message']['content']
+    Returns:
+        tuple: (output, served) where served is
+               {'provider', 'model', 'failed_over_from': [{'provider', 'model', 'error'}, ...],
+                'hedged': True if a hedged duplicate request won}
 
-        elif vision_provider == 'Claude':
-            # Claude (Anthropic) initialization
-            from anthropic import Anthropic
-            import base64
-            from mimetypes import guess_type
+    Raises:
+        DeadlineExceededError: The image deadline ran out (no further providers are tried)
+        Exception: A request error, the last provider error, or RuntimeError if no provider could be tried
+    """
+    breaker_settings = CONFIG.get('failover', {}).get('circuit_breaker', {})
+    chain = get_step_chain(step_name, route)
+    failed_over_from = []
+    last_error = None
+
+    def secondary_after(index):
+        # Next provider in the chain that is healthy and has credentials (hedge target)
+        for candidate_provider, candidate_model in chain[index + 1:]:
+            breaker = get_circuit_breaker(f"{candidate_provider}/{candidate_model}", breaker_settings)
+            if breaker.snapshot()['state'] != 'closed':
+                continue
+            candidate_credentials = get_provider_credentials(candidate_provider)
+            if candidate_credentials is not None:
+                return candidate_provider, candidate_model, candidate_credentials
+        return None
+
+    for index, (provider, model) in enumerate(chain):
+        credentials = get_provider_credentials(provider)
+        if credentials is None:
+            failed_over_from.append({'provider': provider, 'model': model, 'error': "credentials not available"})
+            continue
 
-            vision_client = Anthropic(api_key=vision_creds['api_key'])
-            debug_log("Claude client initialized")
+        breaker = get_circuit_breaker(f"{provider}/{model}", breaker_settings)
+        if not breaker.allow():
+            debug_log(f"{step_name}: circuit open for {provider}/{model}, skipping", "WARNING")
+            failed_over_from.append({'provider': provider, 'model': model, 'error': "circuit open"})
+            continue
+
+        try:
+            output, served_by = call_with_hedging(step_name, (provider, model, credentials), call_fn,
+                                                  lambda: secondary_after(index))
+        except DeadlineExceededError:
+            breaker.release()
+            raise
+        except Exception as e:
+            if not breaker.record_error(e):
+                debug_log(f"{step_name} request failed on {provider}/{model}: {e}", "WARNING")
+                raise
+            last_error = e
+            debug_log(f"{step_name} failed on {provider}/{model}: {e}", "WARNING")
+            failed_over_from.append({'provider': provider, 'model': model, 'error': str(e)})
+            continue
+
+        breaker.record_success()
+        if failed_over_from:
+            debug_log(f"{step_name} served by fallback {provider}/{model}", "WARNING")
+        return output, {'provider': served_by[0], 'model': served_by[1], 'failed_over_from': failed_over_from,
+                        'hedged': served_by[2]}
+
+    if last_error is not None:
+        raise last_error
+    raise RuntimeError(f"No provider available for {step_name} step: "
+                       + "; ".join(f"{f['provider']}/{f['model']} ({f['error']})" for f in failed_over_from))
+
+def run_vision_step(vision_provider, vision_model, vision_creds, image_path, vision_prompt):
+    """
+    Step 1 of the analysis: describe an image with one vision provider.
 
-            # Read and encode image to base64
-            mime_type, _ = guess_type(image_path)
-            if not mime_type or not mime_type.startswith('image/'):
-                mime_type = 'image/png'  # Default fallback
+    Args:
+        vision_provider (str): Provider name
+        vision_model (str): Model name
+        vision_creds (dict): Credentials from get_provider_credentials()
+        image_path (str): Path to the image file
+        vision_prompt (str): Vision prompt
 
-            # Handle SVG conversion if needed
-            if mime_type == "image/svg+xml":
-                if not SVG_SUPPORT:
-                    debug_log("SVG file detected but cairosvg not installed. Cannot convert to PNG.", "ERROR")
-                    raise ValueError("SVG conversion not supported. Install cairosvg: pip install cairosvg")
+    Returns:
+        str: Image description
 
-                debug_log(f"SVG file detected: {image_path}. Converting to PNG for Claude vision...")
+    Raises:
+        Exception: Any provider error (callers may fail over to another provider)
+    """
+    debug_log(f"Step 1: Generating image description with {vision_provider} / {vision_model}")
+
+    if vision_provider == 'Ollama':
+        # Ollama-specific initialization
+        base_url = vision_creds.get('base_url', 'http://localhost:11434')
+        vision_client = ollama.Client(host=base_url, **llm_client_options('vision', sdk_retries=False))
+        debug_log(f"Ollama client initialized with host: {base_url}")
+
+        # Ollama expects base64-encoded image data, not file paths
+        # Handle SVG conversion to PNG for vision model compatibility
+        import base64
+        from mimetypes import guess_type
+
+        mime_type, _ = guess_type(image_path)
+        if mime_type == "image/svg+xml":
+            if not SVG_SUPPORT:
+                debug_log("SVG file detected but cairosvg not installed. Cannot convert to PNG.", "ERROR")
+                raise ValueError("SVG conversion not supported. Install cairosvg: pip install cairosvg")
+
+            debug_log(f"SVG file detected: {image_path}. Converting to PNG for Ollama vision model...")
+            try:
                 with open(image_path, "rb") as svg_file:
                     svg_data = svg_file.read()
+                # Convert SVG to PNG
                 png_data = cairosvg.svg2png(bytestring=svg_data)
-                image_data = base64.standard_b64encode(png_data).decode('utf-8')
-                media_type = "image/png"
-            else:
-                with open(image_path, 'rb') as img_file:
-                    image_data = base64.standard_b64encode(img_file.read()).decode('utf-8')
-                # Map MIME types to Claude's expected format
-                media_type = mime_type if mime_type in ['image/jpeg', 'image/png', 'image/gif', 'image/webp'] else 'image/png'
-
-            try:
-                vision_response = vision_client.messages.create(
-                    model=vision_model,
-                    max_tokens=1024,
-                    messages=[{
-                        'role': 'user',
-                        'content': [
-                            {
-                                'type': 'image',
-                                'source': {
-                                    'type': 'base64',
-                                    'media_type': media_type,
-                                    'data': image_data
-                                }
-                            },
-                            {
-                                'type': 'text',
-                                'text': vision_prompt
-                            }
-                        ]
-                    }]
-                )
-                image_description = vision_response.content[0].text
-            except Exception as claude_error:
-                debug_log(f"Claude API error: {str(claude_error)}", "ERROR")
-                # Check for common errors
-                error_msg = str(claude_error).lower()
-                if 'api_key' in error_msg or 'authentication' in error_msg:
-                    raise ValueError("Claude API authentication failed. Check ANTHROPIC_API_KEY environment variable.")
-                elif 'model' in error_msg:
-                    raise ValueError(f"Claude model '{vision_model}' not found or not accessible.")
-                elif 'rate_limit' in error_msg:
-                    raise ValueError("Claude API rate limit exceeded. Please try again later.")
-                else:
-                    raise ValueError(f"Claude API error: {str(claude_error)}")
-
-        elif vision_provider in ['OpenAI', 'ECB-LLM']:
-            # OpenAI/ECB-LLM initialization
-            if vision_provider == 'OpenAI':
-                from openai import OpenAI
-                vision_client = OpenAI(api_key=vision_creds['api_key'])
-            else:  # ECB-LLM
-                vision_client = ECBAzureOpenAI()
-
-            # Convert image to data URL
-            image_data_url = local_image_to_data_url(image_path)
+                image_data = base64.b64encode(png_data).decode('utf-8')
+                debug_log(f"Successfully converted SVG to PNG (size: {len(png_data)} bytes)")
+            except Exception as e:
+                debug_log(f"Failed to convert SVG to PNG: {str(e)}", "ERROR")
+                raise
+        else:
+            # Regular image file
+            with open(image_path, 'rb') as img_file:
+                image_data = base64.b64encode(img_file.read()).decode('utf-8')
+
+        vision_response = call_llm('vision', vision_provider, vision_model, lambda: vision_client.chat(
+            model=vision_model,
+            messages=[{
+                'role': 'user',
+                'content': vision_prompt,
+                'images': [image_data]
+            }]
+        ), prompt_text=vision_prompt, images=[image_path])
+        image_description = vision_response['message']['content']
+
+    elif vision_provider == 'Claude':
+        # Claude (Anthropic) initialization
+        from anthropic import Anthropic
+        import base64
+        from mimetypes import guess_type
+
+        vision_client = Anthropic(api_key=vision_creds['api_key'], **llm_client_options('vision'))
+        debug_log("Claude client initialized")
+
+        # Read and encode image to base64
+        mime_type, _ = guess_type(image_path)
+        if not mime_type or not mime_type.startswith('image/'):
+            mime_type = 'image/png'  # Default fallback
+
+        # Handle SVG conversion if needed
+        if mime_type == "image/svg+xml":
+            if not SVG_SUPPORT:
+                debug_log("SVG file detected but cairosvg not installed. Cannot convert to PNG.", "ERROR")
+                raise ValueError("SVG conversion not supported. Install cairosvg: pip install cairosvg")
+
+            debug_log(f"SVG file detected: {image_path}. Converting to PNG for Claude vision...")
+            with open(image_path, "rb") as svg_file:
+                svg_data = svg_file.read()
+            png_data = cairosvg.svg2png(bytestring=svg_data)
+            image_data = base64.standard_b64encode(png_data).decode('utf-8')
+            media_type = "image/png"
+        else:
+            with open(image_path, 'rb') as img_file:
+                image_data = base64.standard_b64encode(img_file.read()).decode('utf-8')
+            # Map MIME types to Claude's expected format
+            media_type = mime_type if mime_type in ['image/jpeg', 'image/png', 'image/gif', 'image/webp'] else 'image/png'
 
-            vision_response = vision_client.chat.completions.create(
+        try:
+            vision_response = call_llm('vision', vision_provider, vision_model, lambda: vision_client.messages.create(
                 model=vision_model,
+                max_tokens=1024,
                 messages=[{
                     'role': 'user',
                     'content': [
-                        {'type': 'text', 'text': vision_prompt},
-                        {'type': 'image_url', 'image_url': {'url': image_data_url}}
+                        {
+                            'type': 'image',
+                            'source': {
+                                'type': 'base64',
+                                'media_type': media_type,
+                                'data': image_data
+                            }
+                        },
+                        {
+                            'type': 'text',
+                            'text': vision_prompt
+                        }
                     ]
-                }],
-                max_completion_tokens=1000
-            )
-            image_description = vision_response.choices[0].message.content
+                }]
+            ), prompt_text=vision_prompt, max_output_tokens=1024, images=[image_path])
+            image_description = vision_response.content[0].text
+        except (DeadlineExceededError, LLMTimeoutError, HedgeCancelledError):
+            raise  # Keep the type: failover and circuit breakers treat these differently
+        except Exception as claude_error:
+            debug_log(f"Claude API error: {str(claude_error)}", "ERROR")
+            # Check for common errors
+            error_msg = str(claude_error).lower()
+            if 'api_key' in error_msg or 'authentication' in error_msg:
+                raise ValueError("Claude API authentication failed. Check ANTHROPIC_API_KEY environment variable.") from claude_error
+            elif 'model' in error_msg:
+                raise ValueError(f"Claude model '{vision_model}' not found or not accessible.") from claude_error
+            elif 'rate_limit' in error_msg:
+                raise ValueError("Claude API rate limit exceeded. Please try again later.") from claude_error
+            else:
+                raise ValueError(f"Claude API error: {str(claude_error)}") from claude_error
+
+    elif vision_provider in ['OpenAI', 'Stub', 'ECB-LLM']:
+        # OpenAI/ECB-LLM initialization
+        if vision_provider in ('OpenAI', 'Stub'):
+            from openai import OpenAI
+            vision_client = OpenAI(api_key=vision_creds['api_key'], base_url=vision_creds.get('base_url'), **llm_client_options('vision'))
+        else:  # ECB-LLM
+            vision_client = ECBAzureOpenAI()
+
+        # Convert image to data URL
+        image_data_url = local_image_to_data_url(image_path)
+
+        vision_response = call_llm('vision', vision_provider, vision_model, lambda: vision_client.chat.completions.create(
+            model=vision_model,
+            messages=[{
+                'role': 'user',
+                'content': [
+                    {'type': 'text', 'text': vision_prompt},
+                    {'type': 'image_url', 'image_url': {'url': image_data_url}}
+                ]
+            }],
+            max_completion_tokens=1000
+        ), prompt_text=vision_prompt, images=[image_path])
+        image_description = vision_response.choices[0].message.content
+
+    elif vision_provider == 'Gemini':
+        # Gemini initialization
+        if not configure_gemini(vision_creds['api_key']):
+            raise ValueError("Gemini client could not be configured")
+        vision_client = genai.GenerativeModel(vision_model)
+        debug_log("Gemini client initialized")
+
+        # Read image file
+        import PIL.Image
+        try:
+            image = PIL.Image.open(image_path)
+
+            # Generate description using Gemini's vision capabilities
+            response = call_llm('vision', vision_provider, vision_model, lambda: vision_client.generate_content([vision_prompt, image], request_options=llm_client_options('vision', sdk_retries=False)), prompt_text=vision_prompt, images=[image_path])
+            image_description = response.text
+            debug_log(f"Gemini vision analysis complete")
+        except (DeadlineExceededError, LLMTimeoutError, HedgeCancelledError):
+            raise  # Keep the type: failover and circuit breakers treat these differently
+        except Exception as gemini_error:
+            debug_log(f"Gemini API error: {str(gemini_error)}", "ERROR")
+            error_msg = str(gemini_error).lower()
+            if 'api_key' in error_msg or 'authentication' in error_msg or 'invalid' in error_msg:
+                raise ValueError("Gemini API authentication failed. Check GEMINI_API_KEY environment variable.") from gemini_error
+            elif 'quota' in error_msg or 'resource_exhausted' in error_msg:
+                raise ValueError("Gemini API quota exceeded. Please check your billing and usage limits.") from gemini_error
+            elif 'rate_limit' in error_msg or 'too many requests' in error_msg:
+                raise ValueError("Gemini API rate limit exceeded. Please try again later.") from gemini_error
+            else:
+                raise ValueError(f"Gemini API error: {str(gemini_error)}") from gemini_error
 
-        elif vision_provider == 'Gemini':
-            # Gemini initialization
-            if not configure_gemini(vision_creds['api_key']):
-                return None
-            vision_client = genai.GenerativeModel(vision_model)
-            debug_log("Gemini client initialized")
+    else:
+        raise ValueError(f"Unsupported provider for vision step: {vision_provider}")
+
+    return image_description
+
+# Batched vision returns one description per image, numbered in request order
+VISION_BATCH_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "descriptions": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "index": {"type": "integer"},
+                    "description": {"type": "string"}
+                },
+                "required": ["index", "description"],
+                "additionalProperties": False
+            }
+        }
+    },
+    "required": ["descriptions"],
+    "additionalProperties": False
+}
+
+def gemini_response_schema(schema):
+    """Return a JSON schema without additionalProperties (not in Gemini's schema subset)."""
+    if isinstance(schema, dict):
+        return {k: gemini_response_schema(v) for k, v in schema.items() if k != 'additionalProperties'}
+    if isinstance(schema, list):
+        return [gemini_response_schema(item) for item in schema]
+    return schema
+
+def build_vision_batch_prompt(vision_prompt, image_count):
+    """
+    Wrap the vision prompt for a request carrying several images.
 
-            # Read image file
-            import PIL.Image
-            try:
-                image = PIL.Image.open(image_path)
-
-                # Generate description using Gemini's vision capabilities
-                response = vision_client.generate_content([vision_prompt, image])
-                image_description = response.text
-                debug_log(f"Gemini vision analysis complete")
-            except Exception as gemini_error:
-                debug_log(f"Gemini API error: {str(gemini_error)}", "ERROR")
-                error_msg = str(gemini_error).lower()
-                if 'api_key' in error_msg or 'authentication' in error_msg or 'invalid' in error_msg:
-                    raise ValueError("Gemini API authentication failed. Check GEMINI_API_KEY environment variable.")
-                elif 'quota' in error_msg or 'resource_exhausted' in error_msg:
-                    raise ValueError("Gemini API quota exceeded. Please check your billing and usage limits.")
-                elif 'rate_limit' in error_msg or 'too many requests' in error_msg:
-                    raise ValueError("Gemini API rate limit exceeded. Please try again later.")
-                else:
-                    raise ValueError(f"Gemini API error: {str(gemini_error)}")
+    Args:
+        vision_prompt (str): The normal single-image vision prompt
+        image_count (int): Number of images in the request
 
-        else:
-            debug_log(f"Unsupported provider for vision step: {vision_provider}", "ERROR")
-            return None
+    Returns:
+        str: Prompt asking for one description per image as a JSON array
+    """
+    return f"""{vision_prompt}
 
-        debug_log(f"Image description generated: {image_description[:200]}...")
+You are given {image_count} separate images, labelled "Image 1" to "Image {image_count}". They are unrelated: describe each one on its own, following the instructions above, without referring to the other images.
+Return only a JSON object of the form {{"descriptions": [{{"index": 1, "description": "..."}}, ...]}} with exactly one entry per image, in order."""
 
-        # STEP 2: Processing model generates structured JSON with WCAG alt-text
-        debug_log(f"Step 2: Processing with {processing_provider} / {processing_model} to generate alt-text")
+def parse_vision_batch_response(response_text, image_count):
+    """
+    Extract the per-image descriptions of a batched vision response.
 
-        processing_prompt = f"""{combined_prompt}
+    Args:
+        response_text (str): Raw response text
+        image_count (int): Number of images sent
 
-Based on this image description, generate the required JSON output:
-{image_description}"""
-
-        # Initialize client for processing step (may be different provider than vision)
-        if processing_provider == 'Ollama':
-            base_url = processing_creds.get('base_url', 'http://localhost:11434')
-            processing_client = ollama.Client(host=base_url)
-            processing_response = processing_client.chat(
-                model=processing_model,
-                messages=[{
-                    'role': 'user',
-                    'content': processing_prompt
-                }]
-            )
-            response_text = processing_response['message']['content']
+    Returns:
+        list: Descriptions in image order
 
-        elif processing_provider == 'Claude':
-            from anthropic import Anthropic
-            processing_client = Anthropic(api_key=processing_creds['api_key'])
-            processing_response = processing_client.messages.create(
-                model=processing_model,
-                max_tokens=1024,
-                messages=[{
-                    'role': 'user',
-                    'content': processing_prompt
-                }]
-            )
-            response_text = processing_response.content[0].text
+    Raises:
+        ValueError: If the response does not describe every image exactly once
+    """
+    parsed = parse_processing_response(response_text)
+    entries = parsed.get('descriptions') if parsed else None
+    if not isinstance(entries, list):
+        raise ValueError("batched vision response has no 'descriptions' array")
+
+    descriptions = {}
+    for position, entry in enumerate(entries, 1):
+        if not isinstance(entry, dict) or not isinstance(entry.get('description'), str):
+            continue
+        index = entry.get('index') if isinstance(entry.get('index'), int) else position
+        if 1 <= index <= image_count and entry['description'].strip():
+            descriptions.setdefault(index, entry['description'].strip())
+    missing = [index for index in range(1, image_count + 1) if index not in descriptions]
+    if missing:
+        raise ValueError(f"batched vision response is missing images {missing}")
+    return [descriptions[index] for index in range(1, image_count + 1)]
+
+def run_vision_batch_step(vision_provider, vision_model, vision_creds, image_paths, vision_prompt):
+    """
+    Describe several small images with a single multimodal vision request.
 
-        elif processing_provider in ['OpenAI', 'ECB-LLM']:
-            if processing_provider == 'OpenAI':
-                from openai import OpenAI
-                processing_client = OpenAI(api_key=processing_creds['api_key'])
-            else:  # ECB-LLM
-                processing_client = ECBAzureOpenAI()
+    The images are labelled "Image 1".."Image N" in the request and the model
+    returns a JSON array with one description each, constrained to
+    VISION_BATCH_SCHEMA where the provider supports structured output.
 
-            processing_response = processing_client.chat.completions.create(
-                model=processing_model,
-                messages=[{
-                    'role': 'user',
-                    'content': processing_prompt
+    Args:
+        vision_provider (str): Provider name
+        vision_model (str): Model name
+        vision_creds (dict): Credentials from get_provider_credentials()
+        image_paths (list): Paths of the image files
+        vision_prompt (str): Single-image vision prompt
+
+    Returns:
+        list: Descriptions in the order of image_paths
+
+    Raises:
+        ValueError: If the response does not describe every image
+        Exception: Any provider error (callers may fail over to another provider)
+    """
+    image_count = len(image_paths)
+    batch_prompt = build_vision_batch_prompt(vision_prompt, image_count)
+    per_image_tokens = CONFIG.get('vision_batching', {}).get('output_tokens_per_image', 400)
+    max_output_tokens = per_image_tokens * image_count + 100
+    debug_log(f"Batched vision: {image_count} images with {vision_provider} / {vision_model}")
+
+    # data:{mime_type};base64,{data} with SVGs already converted to PNG
+    data_urls = [local_image_to_data_url(path) for path in image_paths]
+    encoded = [(url[5:].split(';', 1)[0], url.split(',', 1)[1]) for url in data_urls]
+
+    if vision_provider == 'Ollama':
+        base_url = vision_creds.get('base_url', 'http://localhost:11434')
+        vision_client = ollama.Client(host=base_url, **llm_client_options('vision', sdk_retries=False))
+        vision_response = call_llm('vision', vision_provider, vision_model, lambda: vision_client.chat(
+            model=vision_model,
+            messages=[{
+                'role': 'user',
+                'content': batch_prompt + "\nThe images are attached in order, Image 1 first.",
+                'images': [data for _, data in encoded]
+            }],
+            format='json',
+            options={'num_predict': max_output_tokens}
+        ), prompt_text=batch_prompt, max_output_tokens=max_output_tokens, images=image_paths)
+        response_text = vision_response['message']['content']
+
+    elif vision_provider == 'Claude':
+        from anthropic import Anthropic
+        vision_client = Anthropic(api_key=vision_creds['api_key'], **llm_client_options('vision'))
+        content = []
+        for index, (mime_type, data) in enumerate(encoded, 1):
+            media_type = mime_type if mime_type in ['image/jpeg', 'image/png', 'image/gif', 'image/webp'] else 'image/png'
+            content.append({'type': 'text', 'text': f"Image {index}:"})
+            content.append({'type': 'image', 'source': {'type': 'base64', 'media_type': media_type, 'data': data}})
+        content.append({'type': 'text', 'text': batch_prompt})
+        vision_response = call_llm('vision', vision_provider, vision_model, lambda: vision_client.messages.create(
+            model=vision_model,
+            max_tokens=max_output_tokens,
+            messages=[{'role': 'user', 'content': content}],
+            tools=[{
+                'name': 'record_descriptions',
+                'description': 'Record one description per image.',
+                'input_schema': VISION_BATCH_SCHEMA
+            }],
+            tool_choice={'type': 'tool', 'name': 'record_descriptions'}
+        ), prompt_text=batch_prompt, max_output_tokens=max_output_tokens, images=image_paths)
+        tool_inputs = [block.input for block in vision_response.content if getattr(block, 'type', None) == 'tool_use']
+        response_text = json.dumps(tool_inputs[0], ensure_ascii=False) if tool_inputs else vision_response.content[0].text
+
+    elif vision_provider in ['OpenAI', 'Stub', 'ECB-LLM']:
+        if vision_provider in ('OpenAI', 'Stub'):
+            from openai import OpenAI
+            vision_client = OpenAI(api_key=vision_creds['api_key'], base_url=vision_creds.get('base_url'), **llm_client_options('vision'))
+            response_format = {
+                'type': 'json_schema',
+                'json_schema': {'name': 'image_descriptions', 'schema': VISION_BATCH_SCHEMA, 'strict': True}
+            }
+        else:  # ECB-LLM
+            vision_client = ECBAzureOpenAI()
+            response_format = {'type': 'json_object'}
+        content = [{'type': 'text', 'text': batch_prompt}]
+        for index, url in enumerate(data_urls, 1):
+            content.append({'type': 'text', 'text': f"Image {index}:"})
+            content.append({'type': 'image_url', 'image_url': {'url': url}})
+        vision_response = call_llm('vision', vision_provider, vision_model, lambda: vision_client.chat.completions.create(
+            model=vision_model,
+            messages=[{'role': 'user', 'content': content}],
+            max_completion_tokens=max_output_tokens,
+            response_format=response_format
+        ), prompt_text=batch_prompt, max_output_tokens=max_output_tokens, images=image_paths)
+        response_text = vision_response.choices[0].message.content
+
+    elif vision_provider == 'Gemini':
+        if not configure_gemini(vision_creds['api_key']):
+            raise ValueError("Gemini client could not be configured")
+        import PIL.Image
+        vision_client = genai.GenerativeModel(vision_model)
+        parts = [batch_prompt]
+        for index, path in enumerate(image_paths, 1):
+            parts.append(f"Image {index}:")
+            parts.append(PIL.Image.open(path))
+        vision_response = call_llm('vision', vision_provider, vision_model, lambda: vision_client.generate_content(
+            parts,
+            generation_config={
+                'max_output_tokens': max_output_tokens,
+                'response_mime_type': 'application/json',
+                'response_schema': gemini_response_schema(VISION_BATCH_SCHEMA)
+            },
+            request_options=llm_client_options('vision', sdk_retries=False)
+        ), prompt_text=batch_prompt, max_output_tokens=max_output_tokens, images=image_paths)
+        response_text = vision_response.text
+
+    else:
+        raise ValueError(f"Unsupported provider for vision step: {vision_provider}")
+
+    return parse_vision_batch_response(response_text, image_count)
+
+# JSON shape the processing prompt asks for (see prompt/processing)
+ALT_TEXT_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "image_type": {"type": "string", "enum": ["decorative", "informative", "functional"]},
+        "image_description": {"type": "string"},
+        "reasoning": {"type": "string"},
+        "alt_text": {"type": "string"}
+    },
+    "required": ["image_type", "image_description", "reasoning", "alt_text"],
+    "additionalProperties": False
+}
+
+# Cascade mode also asks the cheap tier how sure it is, to decide on escalation
+ALT_TEXT_CASCADE_SCHEMA = {
+    **ALT_TEXT_RESULT_SCHEMA,
+    "properties": {
+        **ALT_TEXT_RESULT_SCHEMA["properties"],
+        "confidence": {"type": "number", "description": "Confidence in the classification and alt-text, from 0 to 1"}
+    },
+    "required": ALT_TEXT_RESULT_SCHEMA["required"] + ["confidence"]
+}
+
+# Where the per-image part of a processing prompt starts (see create_prompt_for_language()
+# in generate_alt_text_json()); everything before is identical for every image
+PROCESSING_PROMPT_IMAGE_MARKERS = ("\n\nContext about the image:\n", "\n\nImage filename: ")
+
+def split_processing_prompt(combined_prompt):
+    """
+    Split a combined processing prompt into its static prefix and per-image part.
+
+    The prefix (merged processing prompts for one language) is sent first, as a
+    system prompt, so provider prompt caches can reuse it across images.
+
+    Args:
+        combined_prompt (str): Prompt from create_prompt_for_language()
+
+    Returns:
+        tuple: (prefix, image_part); image_part is empty when no per-image section is found
+    """
+    positions = [combined_prompt.find(marker) for marker in PROCESSING_PROMPT_IMAGE_MARKERS]
+    positions = [position for position in positions if position > 0]
+    if not positions:
+        return combined_prompt, ""
+    split_at = min(positions)
+    return combined_prompt[:split_at], combined_prompt[split_at:].lstrip('\n')
+
+def get_processing_output_tokens(max_chars):
+    """
+    Output token budget for the processing step.
+
+    The JSON carries a description and reasoning (a fixed allowance from
+    structured_output.base_output_tokens) plus the alt-text, budgeted at two
+    tokens per four characters so non-Latin languages still fit.
+
+    Args:
+        max_chars (int): Alt-text character limit from get_max_chars()
+
+    Returns:
+        int: max_completion_tokens / max_tokens for the processing call
+    """
+    base_tokens = CONFIG.get('structured_output', {}).get('base_output_tokens', 700)
+    return base_tokens + 2 * estimate_text_tokens('x' * max_chars)
+
+# Request parameters and message fragments of a 400 that rejects structured output itself
+# (OpenAI/ECB-LLM response_format, Claude tool use, Gemini response_schema, Ollama format)
+STRUCTURED_OUTPUT_PARAMS = ('response_format', 'tools', 'tool_choice', 'response_schema', 'response_mime_type', 'format')
+STRUCTURED_OUTPUT_ERROR_MARKERS = ('response_format', 'json_schema', 'json_object', 'structured output',
+                                   'tool_choice', 'tool use', 'response_schema', 'response_mime_type')
+
+_STRUCTURED_OUTPUT_UNSUPPORTED = set()  # (provider, model) pairs that rejected structured output
+_STRUCTURED_OUTPUT_LOCK = threading.Lock()
+
+def is_structured_output_rejection(error):
+    """
+    Decide whether a provider error rejects the structured-output request itself.
+
+    Only an HTTP 400 naming the structured-output parameter (OpenAI's `param`)
+    or mentioning it in the message qualifies; other 400s (context length, an
+    invalid image) would fail the same way without structured output.
+
+    Args:
+        error (Exception): Provider error
+
+    Returns:
+        bool: True if the request should be repeated without structured output
+    """
+    if classify_llm_error(error)['status'] != 400:
+        return False
+    if getattr(error, 'param', None) in STRUCTURED_OUTPUT_PARAMS:
+        return True
+    message = str(error).lower()
+    return any(marker in message for marker in STRUCTURED_OUTPUT_ERROR_MARKERS)
+
+def run_processing_step(processing_provider, processing_model, processing_creds, processing_prompt, max_chars=None, schema=None, prompt_prefix=None):
+    """
+    Step 2 of the analysis: turn the image description into the alt-text JSON with one provider.
+
+    Where the provider supports it, the response is constrained to
+    ALT_TEXT_RESULT_SCHEMA: OpenAI json_schema response_format (json_object for
+    ECB-LLM), a forced Claude tool call, Gemini response_schema and Ollama JSON
+    format. A model that rejects the structured request (an HTTP 400 about
+    structured output, see is_structured_output_rejection()) is asked again
+    without it, and is remembered so later images skip the structured attempt.
+
+    A prompt_prefix is sent before the per-image prompt as a system prompt so
+    providers can cache it: Claude gets a cache_control breakpoint on it,
+    OpenAI a prompt_cache_key derived from it (its caching is automatic for
+    identical prefixes), and Gemini and Ollama reuse identical leading tokens.
+
+    Args:
+        processing_provider (str): Provider name
+        processing_model (str): Model name
+        processing_creds (dict): Credentials from get_provider_credentials()
+        processing_prompt (str): Processing prompt including the image description
+        max_chars (int): Alt-text character limit, used for the output token budget
+        schema (dict): JSON schema to request (ALT_TEXT_RESULT_SCHEMA if None)
+        prompt_prefix (str): Static part of the prompt, identical for every image (optional)
+
+    Returns:
+        str: Raw response text (JSON when structured output was used)
+
+    Raises:
+        Exception: Any provider error (callers may fail over to another provider)
+    """
+    max_output_tokens = get_processing_output_tokens(max_chars if max_chars is not None else get_max_chars())
+    structured = (CONFIG.get('structured_output', {}).get('enabled', True)
+                  and (processing_provider, processing_model) not in _STRUCTURED_OUTPUT_UNSUPPORTED)
+
+    while True:
+        try:
+            return _request_processing(processing_provider, processing_model, processing_creds, processing_prompt,
+                                       max_output_tokens, structured, schema or ALT_TEXT_RESULT_SCHEMA, prompt_prefix)
+        except Exception as e:
+            if not structured or not is_structured_output_rejection(e):
+                raise
+            debug_log(f"{processing_provider}/{processing_model} rejected structured output ({e}), "
+                      "retrying without it (and for later images)", "WARNING")
+            with _STRUCTURED_OUTPUT_LOCK:
+                _STRUCTURED_OUTPUT_UNSUPPORTED.add((processing_provider, processing_model))
+            structured = False
+
+def _request_processing(processing_provider, processing_model, processing_creds, processing_prompt, max_output_tokens, structured, schema, prompt_prefix=None):
+    """Send one processing request; see run_processing_step()."""
+    # Static prefix first, per-image part last: the order provider prompt caches match on
+    messages = [{'role': 'user', 'content': processing_prompt}]
+    if prompt_prefix:
+        messages.insert(0, {'role': 'system', 'content': prompt_prefix})
+    prompt_text = f"{prompt_prefix or ''}{processing_prompt}"
+
+    if processing_provider == 'Ollama':
+        base_url = processing_creds.get('base_url', 'http://localhost:11434')
+        processing_client = ollama.Client(host=base_url, **llm_client_options('processing', sdk_retries=False))
+        options = {'format': 'json'} if structured else {}
+        processing_response = call_llm('processing', processing_provider, processing_model, lambda: processing_client.chat(
+            model=processing_model,
+            messages=messages,
+            options={'num_predict': max_output_tokens},
+            **options
+        ), prompt_text=prompt_text, max_output_tokens=max_output_tokens)
+        response_text = processing_response['message']['content']
+
+    elif processing_provider == 'Claude':
+        from anthropic import Anthropic
+        processing_client = Anthropic(api_key=processing_creds['api_key'], **llm_client_options('processing'))
+        options = {}
+        if structured:
+            options = {
+                'tools': [{
+                    'name': 'record_alt_text',
+                    'description': 'Record the image classification and WCAG alt-text.',
+                    'input_schema': schema
                 }],
-                max_completion_tokens=1000
-            )
-            response_text = processing_response.choices[0].message.content
+                'tool_choice': {'type': 'tool', 'name': 'record_alt_text'}
+            }
+        if prompt_prefix:
+            # Cache breakpoint after the static prompt (tools and system are cached together)
+            options['system'] = [{'type': 'text', 'text': prompt_prefix, 'cache_control': {'type': 'ephemeral'}}]
+        processing_response = call_llm('processing', processing_provider, processing_model, lambda: processing_client.messages.create(
+            model=processing_model,
+            max_tokens=max_output_tokens,
+            messages=[{
+                'role': 'user',
+                'content': processing_prompt
+            }],
+            **options
+        ), prompt_text=prompt_text, max_output_tokens=max_output_tokens)
+        tool_inputs = [block.input for block in processing_response.content if getattr(block, 'type', None) == 'tool_use']
+        if tool_inputs:
+            response_text = json.dumps(tool_inputs[0], ensure_ascii=False)
+        else:
+            response_text = processing_response.content[0].text
 
-        elif processing_provider == 'Gemini':
-            if not configure_gemini(processing_creds['api_key']):
-                return None
+    elif processing_provider in ['OpenAI', 'Stub', 'ECB-LLM']:
+        if processing_provider in ('OpenAI', 'Stub'):
+            from openai import OpenAI
+            processing_client = OpenAI(api_key=processing_creds['api_key'], base_url=processing_creds.get('base_url'), **llm_client_options('processing'))
+            response_format = {
+                'type': 'json_schema',
+                'json_schema': {'name': 'alt_text_result', 'schema': schema, 'strict': True}
+            }
+        else:  # ECB-LLM
+            processing_client = ECBAzureOpenAI()
+            response_format = {'type': 'json_object'}
+
+        options = {'response_format': response_format} if structured else {}
+        if prompt_prefix and processing_provider in ('OpenAI', 'Stub'):
+            # Routes requests sharing the prefix to the same cache
+            options['prompt_cache_key'] = "alt-text-" + hashlib.sha256(prompt_prefix.encode('utf-8')).hexdigest()[:16]
+        processing_response = call_llm('processing', processing_provider, processing_model, lambda: processing_client.chat.completions.create(
+            model=processing_model,
+            messages=messages,
+            max_completion_tokens=max_output_tokens,
+            **options
+        ), prompt_text=prompt_text, max_output_tokens=max_output_tokens)
+        response_text = processing_response.choices[0].message.content
+
+    elif processing_provider == 'Gemini':
+        if not configure_gemini(processing_creds['api_key']):
+            raise ValueError("Gemini client could not be configured")
+        if prompt_prefix:
+            processing_client = genai.GenerativeModel(processing_model, system_instruction=prompt_prefix)
+        else:
             processing_client = genai.GenerativeModel(processing_model)
-            processing_response = processing_client.generate_content(processing_prompt)
-            response_text = processing_response.text
+        generation_config = {'max_output_tokens': max_output_tokens}
+        if structured:
+            generation_config['response_mime_type'] = 'application/json'
+            generation_config['response_schema'] = gemini_response_schema(schema)
+        processing_response = call_llm('processing', processing_provider, processing_model, lambda: processing_client.generate_content(
+            processing_prompt,
+            generation_config=generation_config,
+            request_options=llm_client_options('processing', sdk_retries=False)
+        ), prompt_text=prompt_text, max_output_tokens=max_output_tokens)
+        response_text = processing_response.text
 
-        else:
-            debug_log(f"Unsupported provider for processing step: {processing_provider}", "ERROR")
-            return None
+    else:
+        raise ValueError(f"Unsupported provider for processing step: {processing_provider}")
 
-        debug_log(f"Processing response (first 500 chars): {response_text[:500]}...")
+    return response_text
 
-        # Parse JSON from response
-        result = None
+def parse_processing_response(response_text):
+    """
+    Parse the JSON object returned by the processing step.
+
+    Args:
+        response_text (str): Raw response text
+
+    Returns:
+        dict: Parsed object, or None if no JSON object could be extracted
+    """
+    try:
+        # Try to parse entire response as JSON
+        parsed_response = json.loads(response_text)
+        if isinstance(parsed_response, dict):
+            debug_log("Successfully parsed response as JSON", "INFORMATION")
+            return parsed_response
+    except json.JSONDecodeError:
+        debug_log("Response contains additional text, extracting JSON block", "INFORMATION")
+
+    # Extract JSON from text
+    first_brace = response_text.find('{')
+    last_brace = response_text.rfind('}')
+
+    if first_brace != -1 and last_brace != -1:
+        json_str = response_text[first_brace:last_brace + 1]
         try:
-            # Try to parse entire response as JSON
-            parsed_response = json.loads(response_text)
+            parsed_response = json.loads(json_str)
             if isinstance(parsed_response, dict):
-                debug_log("Successfully parsed response as JSON", "INFORMATION")
-                result = parsed_response
+                debug_log("Successfully extracted JSON from response", "INFORMATION")
+                return parsed_response
         except json.JSONDecodeError:
-            debug_log("Response contains additional text, extracting JSON block", "INFORMATION")
+            pass
+    debug_log("Could not parse JSON from response", "WARNING")
+    PARSE_FAILURES.inc()
+    return None
+
+def validate_alt_text_result(result, max_chars, min_confidence=0.0):
+    """
+    Check whether a processing result is good enough to keep without escalation.
+
+    Args:
+        result (dict): Parsed processing result (or None)
+        max_chars (int): Alt-text character limit from get_max_chars()
+        min_confidence (float): Lowest acceptable self-reported confidence (0-1)
+
+    Returns:
+        str: Reason the result is not acceptable, or None if it is
+    """
+    if not isinstance(result, dict):
+        return "output is not valid JSON"
+    missing = [field for field in ALT_TEXT_RESULT_SCHEMA['required'] if not isinstance(result.get(field), str)]
+    if missing:
+        return f"output is missing {', '.join(missing)}"
+    if result['image_type'] not in ALT_TEXT_RESULT_SCHEMA['properties']['image_type']['enum']:
+        return f"invalid image_type '{result['image_type']}'"
+    if result['image_type'] != 'decorative' and not result['alt_text'].strip():
+        return "empty alt_text"
+    if len(result['alt_text']) > max_chars:
+        return f"alt_text exceeds {max_chars} characters"
+    confidence = result.get('confidence')
+    if isinstance(confidence, (int, float)) and confidence < min_confidence:
+        return f"low confidence ({confidence})"
+    return None
+
+def get_cascade_models():
+    """
+    Get the cheap-tier models of cascade mode.
+
+    Returns:
+        dict: {'vision': (provider, model), 'processing': (provider, model)} with only the
+              steps that have a cheap model, or None when cascade mode is off
+    """
+    cascade_config = CONFIG.get('cascade', {})
+    if not cascade_config.get('enabled', False):
+        return None
+    models = {}
+    for step in ('vision', 'processing'):
+        tier = cascade_config.get('steps', {}).get(step) or {}
+        if tier.get('provider') and tier.get('model'):
+            models[step] = (tier['provider'], tier['model'])
+    return models or None
+
+def run_cascade_model(step_name, tier_model, call_fn):
+    """
+    Run a step on a cascade tier model (no failover: escalation is the fallback).
+
+    Args:
+        step_name (str): 'vision' or 'processing'
+        tier_model (tuple): (provider, model)
+        call_fn (callable): call_fn(provider, model, credentials) -> step output
+
+    Returns:
+        tuple: (output, served) in the format of run_step_with_failover()
+    """
+    provider, model = tier_model
+    credentials = get_provider_credentials(provider)
+    if credentials is None:
+        raise ValueError(f"credentials not available for {provider}")
+    output = call_fn(provider, model, credentials)
+    return output, {'provider': provider, 'model': model, 'failed_over_from': [], 'hedged': False}
+
+# Descriptions from batched vision requests: {(absolute image path, vision prompt): entry}
+_VISION_BATCH_RESULTS = {}
+_VISION_BATCH_LOCK = threading.Lock()
+
+def prepare_vision_batches(image_paths, vision_prompt):
+    """
+    Describe small images ahead of processing, several per vision request.
+
+    Images whose longest side is at most vision_batching.max_dimension pixels are
+    grouped by vision_batching.batch_size and described with one request per
+    group (failover and breakers apply as for single images). The descriptions
+    are picked up by analyze_image_with_ai() instead of a per-image vision call.
+    Images of a failed batch are simply described one by one later.
+
+    Args:
+        image_paths (list): Paths of the images about to be processed
+        vision_prompt (str): Vision prompt the images will be analysed with
+
+    Returns:
+        dict: {'batches', 'batched_images', 'failed_batches', 'requests_saved', 'keys'},
+              or None when batching is disabled or no group was formed
+    """
+    batching_config = CONFIG.get('vision_batching', {})
+    if not batching_config.get('enabled', False) or not vision_prompt:
+        return None
+    max_dimension = batching_config.get('max_dimension', 128)
+    batch_size = max(int(batching_config.get('batch_size', 8)), 2)
+
+    import PIL.Image
+    small_images = []
+    for path in image_paths:
+        if guess_type(path)[0] == "image/svg+xml":
+            continue  # Rendered size unknown until conversion
+        try:
+            with PIL.Image.open(path) as image:
+                width, height = image.size
+        except Exception as e:
+            debug_log(f"Vision batching: cannot read size of {os.path.basename(path)}: {e}", "WARNING")
+            continue
+        if max(width, height) <= max_dimension:
+            small_images.append(path)
+
+    # A single leftover image gains nothing from batching
+    groups = [small_images[i:i + batch_size] for i in range(0, len(small_images), batch_size)]
+    groups = [group for group in groups if len(group) > 1]
+    if not groups:
+        return None
+
+    # Small images classify as 'simple' when complexity routing is on; any image that
+    # routes otherwise ignores its batched description
+    route = 'simple' if CONFIG.get('complexity_routing', {}).get('enabled', False) else None
+    deadline_seconds = CONFIG.get('llm_timeouts', {}).get('image_deadline_seconds', 0)
+
+    def describe_group(group):
+        with image_deadline(deadline_seconds):
+            try:
+                descriptions, served = run_step_with_failover(
+                    'vision',
+                    lambda provider, model, creds: run_vision_batch_step(provider, model, creds, group, vision_prompt),
+                    route
+                )
+            except Exception as e:
+                debug_log(f"Batched vision request for {len(group)} images failed, describing them one by one: {e}", "WARNING")
+                return []
+        served = dict(served, batch_size=len(group))
+        with _VISION_BATCH_LOCK:
+            for path, description in zip(group, descriptions):
+                _VISION_BATCH_RESULTS[(os.path.abspath(path), vision_prompt)] = {
+                    'description': description, 'served': served, 'route': route
+                }
+        return [(os.path.abspath(path), vision_prompt) for path in group]
+
+    with ThreadPoolExecutor(max_workers=min(get_image_workers(), len(groups))) as executor:
+        described = list(executor.map(propagate_span(propagate_usage(describe_group)), groups))
+
+    keys = [key for group_keys in described for key in group_keys]
+    batched_groups = sum(1 for group_keys in described if group_keys)
+    summary = {
+        'batches': batched_groups,
+        'batched_images': len(keys),
+        'failed_batches': len(groups) - batched_groups,
+        'requests_saved': len(keys) - batched_groups,
+        'keys': keys
+    }
+    log_message(f"Batched vision: {len(keys)} small images described in {batched_groups} requests"
+                + (f" ({summary['failed_batches']} batches failed)" if summary['failed_batches'] else ""), "INFORMATION")
+    return summary
+
+def get_batched_description(image_path, vision_prompt, route=None):
+    """
+    Look up the batched vision description of an image.
+
+    Returns:
+        tuple: (description, served) in the format of run_step_with_failover(),
+               or None if the image was not described by a batch for this prompt and route
+    """
+    with _VISION_BATCH_LOCK:
+        entry = _VISION_BATCH_RESULTS.get((os.path.abspath(image_path), vision_prompt))
+    if entry is None or entry['route'] != route:
+        return None
+    return entry['description'], entry['served']
+
+def clear_vision_batches(keys):
+    """Drop batched descriptions once their images are processed."""
+    with _VISION_BATCH_LOCK:
+        for key in keys:
+            _VISION_BATCH_RESULTS.pop(key, None)
+
+@traced('analyze_image')
+def analyze_image_with_ai(image_path, combined_prompt, credentials, language=None, vision_prompt=None, max_chars=None, route=None):
+    """
+    Analyze an image using two-step processing with support for all AI providers.
+
+    This is the main image analysis function that supports:
+    - OpenAI (GPT-4o, GPT-5.x)
+    - Claude (Sonnet, Opus, Haiku)
+    - ECB-LLM (internal ECB service)
+    - Ollama (local models)
+
+    Supports mixed providers (e.g., Claude for vision, OpenAI for processing).
+
+    Args:
+        image_path (str): Path to the image file
+        combined_prompt (str): The combined prompt with context for analysis
+        credentials (dict): DEPRECATED - kept for backward compatibility
+        language (str): ISO language code for alt-text generation
+        vision_prompt (str): Optional vision prompt for step 1. If None, loads from vision folder.
+        max_chars (int): Alt-text character limit (get_max_chars() if None), sizes the processing output budget
+        route (str): 'simple' or 'complex' from route_image(); None uses the default step models
+
+    Returns:
+        dict: Parsed response with image_type, image_description, reasoning, and alt_text
+    """
+    func_name = "analyze_image_with_ai"
+
+    debug_log(f"Starting two-step analysis for: {image_path} with multi-provider support")
+    current_span().set_attributes({'image.filename': os.path.basename(image_path), 'image.route': route,
+                                   'image.bytes': os.path.getsize(image_path) if os.path.exists(image_path) else None,
+                                   'language': language})
+
+    try:
+        # Get provider and model configuration for each step (first entry of each failover chain)
+        vision_provider, vision_model = get_step_chain('vision', route)[0]
+        processing_provider, processing_model = get_step_chain('processing', route)[0]
+        translation_provider, translation_model, _ = get_step_config('translation')
+
+        debug_log(f"Vision step: {vision_provider} / {vision_model}")
+        debug_log(f"Processing step: {processing_provider} / {processing_model}")
+        debug_log(f"Translation step: {translation_provider} / {translation_model}")
+
+        # Load vision prompt if not provided
+        if vision_prompt is None:
+            vision_prompt_folder = get_absolute_folder_path('prompt_vision')
+            vision_prompt = load_vision_prompt(vision_prompt_folder)
+
+        debug_log(f"Using vision prompt: {vision_prompt[:100]}...")
+
+        def run_vision(tier_model=None):
+            # tier_model pins a cascade tier model; otherwise a batched description is reused
+            # when there is one, else the step's failover chain is used
+            if not tier_model:
+                batched = get_batched_description(image_path, vision_prompt, route)
+                if batched:
+                    debug_log(f"Using batched vision description ({batched[1]['batch_size']} images per request)")
+                    return batched
+            call = lambda provider, model, creds: run_vision_step(provider, model, creds, image_path, vision_prompt)
+            if tier_model:
+                return run_cascade_model('vision', tier_model, call)
+            return run_step_with_failover('vision', call, route)
+
+        # The static prompt goes first as a cacheable prefix, the image-specific part last
+        prompt_prefix, image_prompt = None, combined_prompt
+        if CONFIG.get('prompt_caching', {}).get('enabled', True):
+            prompt_prefix, image_prompt = split_processing_prompt(combined_prompt)
+
+        def run_processing(description, tier_model=None, schema=None):
+            # STEP 2: Processing model generates structured JSON with WCAG alt-text
+            processing_prompt = f"""{image_prompt}
+
+Based on this image description, generate the required JSON output:
+{description}""".lstrip()
+            call = lambda provider, model, creds: run_processing_step(provider, model, creds, processing_prompt, max_chars, schema, prompt_prefix)
+            if tier_model:
+                return run_cascade_model('processing', tier_model, call)
+            return run_step_with_failover('processing', call, route)
+
+        result = None
+        image_description = None
+        vision_served = None
+        cascade = None
+
+        cascade_models = get_cascade_models()
+        if cascade_models:
+            # Cheap tier first; escalate to the configured steps when its answer is not usable
+            try:
+                image_description, vision_served = run_vision(cascade_models.get('vision'))
+                response_text, processing_served = run_processing(image_description, cascade_models.get('processing'),
+                                                                  ALT_TEXT_CASCADE_SCHEMA)
+                result = parse_processing_response(response_text)
+                reason = validate_alt_text_result(result, max_chars or get_max_chars(),
+                                                  CONFIG.get('cascade', {}).get('min_confidence', 0.6))
+            except DeadlineExceededError:
+                raise
+            except Exception as e:
+                reason = f"cheap tier failed: {e}"
+
+            if reason is None:
+                cascade = {'tier': 'cheap'}
+                debug_log(f"Cascade: cheap tier answered ({processing_served['provider']}/{processing_served['model']})")
+            else:
+                cascade = {'tier': 'escalated', 'reason': reason}
+                debug_log(f"Cascade: escalating to configured models ({reason})", "INFORMATION")
+                result = None
+                if cascade_models.get('vision'):
+                    # The description came from the cheap vision model: redo it with the strong one
+                    image_description = None
 
-        # Extract JSON from text if not yet parsed
         if result is None:
-            first_brace = response_text.find('{')
-            last_brace = response_text.rfind('}')
+            # STEP 1: Vision model generates image description
+            if image_description is None:
+                image_description, vision_served = run_vision()
+            debug_log(f"Image description generated: {image_description[:200]}...")
 
-            if first_brace != -1 and last_brace != -1:
-                json_str = response_text[first_brace:last_brace + 1]
-                try:
-                    parsed_response = json.loads(json_str)
-                    debug_log("Successfully extracted JSON from response", "INFORMATION")
-                    result = parsed_response
-                except json.JSONDecodeError:
-                    debug_log("Could not parse JSON from response", "WARNING")
+            debug_log(f"Step 2: Processing with {processing_provider} / {processing_model} to generate alt-text")
+            # Processing may use a different provider than vision
+            response_text, processing_served = run_processing(image_description)
+            debug_log(f"Processing response (first 500 chars): {response_text[:500]}...")
+            result = parse_processing_response(response_text)
+
+        vision_provider, vision_model = vision_served['provider'], vision_served['model']
+        processing_provider, processing_model = processing_served['provider'], processing_served['model']
 
         # Fallback: create basic response structure
         if result is None:
             debug_log("Creating fallback response structure", "WARNING")
-            max_chars = CONFIG.get('alt_text_max_chars', 125)
+            fallback_chars = max_chars or CONFIG.get('alt_text_max_chars', 125)
             result = {
                 "image_type": "informative",
                 "image_description": image_description,
                 "reasoning": f"Generated via {processing_provider} two-step processing",
-                "alt_text": image_description[:max_chars]  # Truncate to configured limit
+                "alt_text": image_description[:fallback_chars]  # Truncate to configured limit
             }
 
         # Add vision model output to the result (Step 1 output)
@@ -2523,6 +3834,19 @@ Based on this image description, generate the required JSON output:
             'translation_provider': translation_provider,
             'translation_model': translation_model
         }
+        failover = {step: served['failed_over_from']
+                    for step, served in (('vision', vision_served), ('processing', processing_served))
+                    if served['failed_over_from']}
+        if failover:
+            result['_models_used']['failover'] = failover
+        hedged_steps = [step for step, served in (('vision', vision_served), ('processing', processing_served))
+                        if served['hedged']]
+        if hedged_steps:
+            result['_models_used']['hedged_steps'] = hedged_steps
+        if cascade:
+            result['_models_used']['cascade'] = cascade
+        if vision_served.get('batch_size'):
+            result['_models_used']['vision_batch_size'] = vision_served['batch_size']
 
         return result
 
@@ -2605,6 +3929,166 @@ def _analyze_image_with_openai_legacy(image_path, combined_prompt, language=None
     raise DeprecationWarning("This legacy function should not be called. Use analyze_image_with_ai() instead.")
 
 
+def extract_image_sources_from_soup(soup, enabled_tags, enabled_attrs):
+    """
+    Collect image candidates from a parsed page in tag priority order.
+
+    Args:
+        soup: BeautifulSoup document
+        enabled_tags (list): Enabled tag names from config
+        enabled_attrs (list): Enabled attribute names from config
+
+    Returns:
+        list: [{url, tag, attribute}, ...] - img tags first, then picture, div, link and meta
+    """
+    # Collect all image sources from various tags and attributes
+    # Store as list of dicts: [{url, tag, attribute}, ...]
+    image_sources = []
+
+    # Get images from img tags (if enabled)
+    if 'img' in enabled_tags:
+        img_tags = soup.find_all('img')
+        for img in img_tags:
+            img_url, attr_used = get_image_url_and_attribute(img, enabled_attrs)
+            if img_url:
+                image_sources.append({'url': img_url, 'tag': 'img', 'attribute': attr_used})
+
+    # Get images from picture elements (if enabled)
+    if 'picture' in enabled_tags:
+        picture_tags = soup.find_all('picture')
+        for picture in picture_tags:
+            # Check source elements within picture
+            sources = picture.find_all('source')
+            for source in sources:
+                src, attr_used = get_image_url_and_attribute(source, enabled_attrs)
+                if src:
+                    # srcset can have multiple URLs, use the first one
+                    src_url = src.split(',')[0].split()[0]
+                    if not any(img['url'] == src_url for img in image_sources):
+                        image_sources.append({'url': src_url, 'tag': 'picture>source', 'attribute': attr_used})
+
+            # Also check img inside picture
+            img_in_picture = picture.find('img')
+            if img_in_picture:
+                img_url, attr_used = get_image_url_and_attribute(img_in_picture, enabled_attrs)
+                if img_url and not any(img['url'] == img_url for img in image_sources):
+                    image_sources.append({'url': img_url, 'tag': 'picture>img', 'attribute': attr_used})
+
+    # Get images from div elements with data-image attributes (if enabled)
+    if 'div' in enabled_tags:
+        div_tags = soup.find_all('div')
+        for div in div_tags:
+            div_url, attr_used = get_image_url_and_attribute(div, enabled_attrs)
+            if div_url and not any(img['url'] == div_url for img in image_sources):
+                image_sources.append({'url': div_url, 'tag': 'div', 'attribute': attr_used})
+
+    # Get images from link elements (favicons, touch icons) (if enabled)
+    if 'link' in enabled_tags:
+        link_tags = soup.find_all('link')
+        for link in link_tags:
+            # Check if this is an icon-related link
+            rel = link.get('rel', [])
+            if isinstance(rel, list):
+                rel_str = ' '.join(rel)
+            else:
+                rel_str = rel
+
+            # Look for icon-related rel attributes
+            if any(icon_type in rel_str.lower() for icon_type in ['icon', 'apple-touch-icon', 'shortcut']):
+                link_url, attr_used = get_image_url_and_attribute(link, enabled_attrs)
+                if link_url and not any(img['url'] == link_url for img in image_sources):
+                    image_sources.append({'url': link_url, 'tag': 'link', 'attribute': attr_used})
+                    debug_log(f"Found favicon/icon from link tag: {link_url}")
+
+    # Get images from meta tags (Open Graph, Twitter Cards) (if enabled)
+    if 'meta' in enabled_tags:
+        meta_tags = soup.find_all('meta')
+        for meta in meta_tags:
+            # Check for Open Graph images (og:image)
+            property_attr = meta.get('property', '')
+            name_attr = meta.get('name', '')
+
+            # Look for image-related meta tags (but exclude width/height properties)
+            if (any(img_type in property_attr.lower() for img_type in ['og:image', 'twitter:image']) or \
+                any(img_type in name_attr.lower() for img_type in ['og:image', 'twitter:image'])) and \
+               not any(exclude in property_attr.lower() for exclude in ['width', 'height', 'alt']):
+                meta_url, attr_used = get_image_url_and_attribute(meta, enabled_attrs)
+                # Validate that the URL looks like an image URL (contains image extension or http)
+                if meta_url and not any(img['url'] == meta_url for img in image_sources):
+                    # Skip if it looks like a dimension value (pure number)
+                    if not meta_url.isdigit():
+                        image_sources.append({'url': meta_url, 'tag': 'meta', 'attribute': attr_used})
+                        debug_log(f"Found Open Graph/Twitter image from meta tag: {meta_url}")
+
+    return image_sources
+
+
+def save_image_response(response, image_url, images_folder, default_stem):
+    """
+    Stream an image response to disk without buffering the whole body.
+
+    The body is written in chunks to a temporary file while its first bytes are
+    checked for a known image signature and a SHA-256 hash is computed. The file
+    is then moved to a free filename in images_folder and handed to the HTTP cache.
+
+    Args:
+        response (requests.Response): Image response (ideally opened with stream=True)
+        image_url (str): Absolute image URL, used for the filename and the cache
+        images_folder (str): Destination folder
+        default_stem (str): Filename stem used when the URL has no filename (e.g. 'image_3')
+
+    Returns:
+        tuple: (filename, {'bytes', 'sha256', 'image_type'})
+
+    Raises:
+        ImageDownloadError: If the body is not an image or exceeds download.max_image_size_mb
+    """
+    download_config = CONFIG.get('download', {})
+    max_bytes = int(download_config.get('max_image_size_mb', 20) * 1024 * 1024)
+    chunk_size = download_config.get('image_chunk_size', 65536)
+
+    temp_path = os.path.join(images_folder, f".download-{os.getpid()}-{default_stem}")
+    try:
+        image_info = stream_image_to_file(
+            response.iter_content(chunk_size=chunk_size),
+            temp_path,
+            max_bytes=max_bytes,
+            declared_length=response.headers.get('content-length')
+        )
+    finally:
+        response.close()
+
+    # Determine filename from URL, or from the sniffed image type
+    filename = os.path.basename(urlparse(image_url).path)
+    if not filename or '.' not in filename:
+        filename = f"{default_stem}{IMAGE_TYPE_EXTENSIONS[image_info['image_type']]}"
+        debug_log(f"No filename in URL, using sniffed image type: {filename}")
+
+    # Handle filename conflicts
+    filepath = os.path.join(images_folder, filename)
+    counter = 1
+    base_name, ext = os.path.splitext(filename)
+    original_filename = filename
+
+    while os.path.exists(filepath):
+        filename = f"{base_name}_{counter}{ext}"
+        filepath = os.path.join(images_folder, filename)
+        counter += 1
+
+    if filename != original_filename:
+        debug_log(f"Filename conflict resolved: {original_filename} -> {filename}")
+
+    os.replace(temp_path, filepath)
+
+    cache = get_scraping_cache()
+    if cache is not None:
+        try:
+            cache.store_file(image_url, response, filepath)
+        except OSError as e:
+            debug_log(f"Could not store {image_url} in HTTP cache: {e}", "WARNING")
+
+    return (filename, image_info)
+
 def download_images_from_url(url, images_folder=None, max_images=None):
     """
     Downloads images from a given URL to the specified folder.
@@ -2615,7 +4099,9 @@ def download_images_from_url(url, images_folder=None, max_images=None):
         max_images (int): Maximum number of images to download (None for all)
 
     Returns:
-        tuple: (list of filenames, dict of {filename: {tag, attribute, url}}, page_title)
+        tuple: (list of filenames, dict of {filename: {tag, attribute, url}}, page_title, page) where
+               page is {'url', 'markup'} with the markup read for this call (all of it, or up to where
+               a streaming parse stopped) for grab_context(), or None if the page was not parsed
     """
     func_name = "download_images_from_url"
     debug_log(f"Starting {func_name} for URL: {url}")
@@ -2645,9 +4131,23 @@ def download_images_from_url(url, images_folder=None, max_images=None):
         headers = {'User-Agent': user_agent}
         debug_log(f"Making request to: {url}")
 
-        response = requests.get(url, headers=headers, timeout=timeout)
-        response.raise_for_status()
-        debug_log(f"Successfully retrieved page content ({len(response.content)} bytes)")
+        # Stream and parse incrementally when only a few images are requested
+        html_parsing_config = CONFIG.get('html_parsing', {})
+        use_streaming = bool(max_images) and html_parsing_config.get('streaming_enabled', True)
+
+        fetch_start = time.perf_counter()
+        try:
+            response = fetch_url(url, headers=headers, timeout=timeout, stream=use_streaming)
+            response.raise_for_status()
+        except requests.exceptions.RequestException as e:
+            ERRORS.labels('page_fetch', error_class(e)).inc()
+            raise
+        if use_streaming:
+            debug_log("Streaming page content (incremental parse)")
+        else:
+            PAGE_BYTES.inc(len(response.content))
+            debug_log(f"Successfully retrieved page content ({len(response.content)} bytes)")
+        PAGE_FETCH_SECONDS.observe(time.perf_counter() - fetch_start)
 
         # Check if URL points directly to an image file
         content_type = response.headers.get('content-type', '').lower()
@@ -2657,43 +4157,8 @@ def download_images_from_url(url, images_folder=None, max_images=None):
         if content_type.startswith('image/'):
             debug_log("URL points directly to an image file, downloading directly")
 
-            # Determine filename from URL
-            parsed_url = urlparse(url)
-            filename = os.path.basename(parsed_url.path)
-
-            if not filename or '.' not in filename:
-                # Generate filename based on content type
-                ext_map = {
-                    'image/jpeg': '.jpg',
-                    'image/jpg': '.jpg',
-                    'image/png': '.png',
-                    'image/gif': '.gif',
-                    'image/svg+xml': '.svg',
-                    'image/webp': '.webp',
-                    'image/bmp': '.bmp',
-                    'image/tiff': '.tiff'
-                }
-                ext = ext_map.get(content_type, '.jpg')
-                filename = f"image_1{ext}"
-                debug_log(f"Generated filename from content-type: {filename}")
-
-            # Handle filename conflicts
+            filename, image_info = save_image_response(response, url, images_folder, "image_1")
             filepath = os.path.join(images_folder, filename)
-            counter = 1
-            base_name, ext = os.path.splitext(filename)
-            original_filename = filename
-
-            while os.path.exists(filepath):
-                filename = f"{base_name}_{counter}{ext}"
-                filepath = os.path.join(images_folder, filename)
-                counter += 1
-
-            if filename != original_filename:
-                debug_log(f"Filename conflict resolved: {original_filename} -> {filename}")
-
-            # Save file
-            with open(filepath, 'wb') as f:
-                f.write(response.content)
 
             downloaded_images.append(filename)
 
@@ -2701,7 +4166,9 @@ def download_images_from_url(url, images_folder=None, max_images=None):
             image_metadata[filename] = {
                 'tag': 'direct',
                 'attribute': 'url',
-                'url': url
+                'url': url,
+                'sha256': image_info['sha256'],
+                'bytes': image_info['bytes']
             }
 
             debug_log(f"Successfully saved direct image: {filepath}")
@@ -2709,17 +4176,7 @@ def download_images_from_url(url, images_folder=None, max_images=None):
                 log_message(f"Downloaded direct image: {filename}", "INFORMATION")
 
             # Return early - no HTML parsing needed
-            return (downloaded_images, image_metadata, "")
-
-        # Otherwise, parse as HTML page
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Extract page title
-        page_title = ""
-        title_tag = soup.find('title')
-        if title_tag:
-            page_title = title_tag.get_text().strip()
-            debug_log(f"Page title: {page_title}")
+            return (downloaded_images, image_metadata, "", None)
 
         # Get configuration for which tags and attributes to use
         enabled_tags = get_enabled_image_tags()
@@ -2728,84 +4185,47 @@ def download_images_from_url(url, images_folder=None, max_images=None):
         debug_log(f"Using configured tags: {', '.join(enabled_tags)}")
         debug_log(f"Using configured attributes: {', '.join(enabled_attrs)}")
 
-        # Collect all image sources from various tags and attributes
-        # Store as list of dicts: [{url, tag, attribute}, ...]
-        image_sources = []
-
-        # Get images from img tags (if enabled)
-        if 'img' in enabled_tags:
-            img_tags = soup.find_all('img')
-            for img in img_tags:
-                img_url, attr_used = get_image_url_and_attribute(img, enabled_attrs)
-                if img_url:
-                    image_sources.append({'url': img_url, 'tag': 'img', 'attribute': attr_used})
-
-        # Get images from picture elements (if enabled)
-        if 'picture' in enabled_tags:
-            picture_tags = soup.find_all('picture')
-            for picture in picture_tags:
-                # Check source elements within picture
-                sources = picture.find_all('source')
-                for source in sources:
-                    src, attr_used = get_image_url_and_attribute(source, enabled_attrs)
-                    if src:
-                        # srcset can have multiple URLs, use the first one
-                        src_url = src.split(',')[0].split()[0]
-                        if not any(img['url'] == src_url for img in image_sources):
-                            image_sources.append({'url': src_url, 'tag': 'picture>source', 'attribute': attr_used})
-
-                # Also check img inside picture
-                img_in_picture = picture.find('img')
-                if img_in_picture:
-                    img_url, attr_used = get_image_url_and_attribute(img_in_picture, enabled_attrs)
-                    if img_url and not any(img['url'] == img_url for img in image_sources):
-                        image_sources.append({'url': img_url, 'tag': 'picture>img', 'attribute': attr_used})
-
-        # Get images from div elements with data-image attributes (if enabled)
-        if 'div' in enabled_tags:
-            div_tags = soup.find_all('div')
-            for div in div_tags:
-                div_url, attr_used = get_image_url_and_attribute(div, enabled_attrs)
-                if div_url and not any(img['url'] == div_url for img in image_sources):
-                    image_sources.append({'url': div_url, 'tag': 'div', 'attribute': attr_used})
-
-        # Get images from link elements (favicons, touch icons) (if enabled)
-        if 'link' in enabled_tags:
-            link_tags = soup.find_all('link')
-            for link in link_tags:
-                # Check if this is an icon-related link
-                rel = link.get('rel', [])
-                if isinstance(rel, list):
-                    rel_str = ' '.join(rel)
-                else:
-                    rel_str = rel
-
-                # Look for icon-related rel attributes
-                if any(icon_type in rel_str.lower() for icon_type in ['icon', 'apple-touch-icon', 'shortcut']):
-                    link_url, attr_used = get_image_url_and_attribute(link, enabled_attrs)
-                    if link_url and not any(img['url'] == link_url for img in image_sources):
-                        image_sources.append({'url': link_url, 'tag': 'link', 'attribute': attr_used})
-                        debug_log(f"Found favicon/icon from link tag: {link_url}")
-
-        # Get images from meta tags (Open Graph, Twitter Cards) (if enabled)
-        if 'meta' in enabled_tags:
-            meta_tags = soup.find_all('meta')
-            for meta in meta_tags:
-                # Check for Open Graph images (og:image)
-                property_attr = meta.get('property', '')
-                name_attr = meta.get('name', '')
-
-                # Look for image-related meta tags (but exclude width/height properties)
-                if (any(img_type in property_attr.lower() for img_type in ['og:image', 'twitter:image']) or \
-                    any(img_type in name_attr.lower() for img_type in ['og:image', 'twitter:image'])) and \
-                   not any(exclude in property_attr.lower() for exclude in ['width', 'height', 'alt']):
-                    meta_url, attr_used = get_image_url_and_attribute(meta, enabled_attrs)
-                    # Validate that the URL looks like an image URL (contains image extension or http)
-                    if meta_url and not any(img['url'] == meta_url for img in image_sources):
-                        # Skip if it looks like a dimension value (pure number)
-                        if not meta_url.isdigit():
-                            image_sources.append({'url': meta_url, 'tag': 'meta', 'attribute': attr_used})
-                            debug_log(f"Found Open Graph/Twitter image from meta tag: {meta_url}")
+        if use_streaming:
+            # Incremental parse: stop reading once the leading candidates are settled
+            spare_candidates = html_parsing_config.get('stream_spare_candidates', 3)
+            streamed = stream_image_candidates(
+                response,
+                max_images + spare_candidates,
+                enabled_tags,
+                enabled_attrs,
+                chunk_size=html_parsing_config.get('stream_chunk_size', 16384),
+                context_bytes=html_parsing_config.get('stream_context_bytes', 65536)
+            )
+            image_sources = streamed['candidates']
+            page_title = streamed['page_title']
+            PAGE_BYTES.inc(streamed['bytes_read'])
+            # Hand the consumed markup to grab_context() so it does not fetch the page again
+            page = {'url': url, 'markup': streamed['markup']}
+            if streamed['truncated']:
+                debug_log(f"Stopped streaming after {streamed['bytes_read']} bytes (candidates and context window captured)")
+            else:
+                debug_log(f"Streamed entire page ({streamed['bytes_read']} bytes)")
+            if page_title:
+                debug_log(f"Page title: {page_title}")
+        else:
+            # Otherwise, parse the full page - materializing only image-bearing tags
+            parser_backend = get_html_parser_backend()
+            strain_tags = ['title'] + [tag for tag in ['img', 'picture', 'link', 'meta'] if tag in enabled_tags]
+            # Only divs carrying an enabled image attribute; all div subtrees would be most of the page
+            strain_attrs = {'div': enabled_attrs} if 'div' in enabled_tags else None
+            soup = parse_for_extraction(response.content, parser_backend, strain_tags, strain_attrs)
+            page = {'url': url, 'markup': response.content}
+            debug_log(f"Parsed page with '{parser_backend}' backend (tags: {', '.join(strain_tags + list(strain_attrs or []))})")
+
+            # Extract page title
+            page_title = ""
+            title_tag = soup.find('title')
+            if title_tag:
+                page_title = title_tag.get_text().strip()
+                debug_log(f"Page title: {page_title}")
+
+            # Collect all image sources from various tags and attributes
+            image_sources = extract_image_sources_from_soup(soup, enabled_tags, enabled_attrs)
 
         debug_log(f"Found {len(image_sources)} total image sources on the page")
 
@@ -2851,46 +4271,16 @@ def download_images_from_url(url, images_folder=None, max_images=None):
                 img_url_absolute = urljoin(url, img_url)
                 debug_log(f"Image URL: {img_url_absolute}")
                 
-                img_response = requests.get(img_url_absolute, headers=headers, timeout=timeout)
+                download_start = time.perf_counter()
+                img_response = fetch_url(img_url_absolute, headers=headers, timeout=timeout, stream=True)
                 img_response.raise_for_status()
-                debug_log(f"Downloaded image content ({len(img_response.content)} bytes)")
 
-                # Determine filename
-                parsed_url = urlparse(img_url_absolute)
-                filename = os.path.basename(parsed_url.path)
-                
-                if not filename or '.' not in filename:
-                    content_type = img_response.headers.get('content-type', '')
-                    debug_log(f"No filename in URL, using content-type: {content_type}")
-                    
-                    if 'jpeg' in content_type or 'jpg' in content_type:
-                        filename = f"image_{i+1}.jpg"
-                    elif 'png' in content_type:
-                        filename = f"image_{i+1}.png"
-                    elif 'gif' in content_type:
-                        filename = f"image_{i+1}.gif"
-                    elif 'webp' in content_type:
-                        filename = f"image_{i+1}.webp"
-                    else:
-                        filename = f"image_{i+1}.jpg"
-                
-                # Handle filename conflicts
+                # Stream to disk (size-capped, non-images rejected), then pick a free filename
+                filename, image_info = save_image_response(img_response, img_url_absolute, images_folder, f"image_{i+1}")
                 filepath = os.path.join(images_folder, filename)
-                counter = 1
-                base_name, ext = os.path.splitext(filename)
-                original_filename = filename
-                
-                while os.path.exists(filepath):
-                    filename = f"{base_name}_{counter}{ext}"
-                    filepath = os.path.join(images_folder, filename)
-                    counter += 1
-                
-                if filename != original_filename:
-                    debug_log(f"Filename conflict resolved: {original_filename} -> {filename}")
-                
-                # Save file
-                with open(filepath, 'wb') as f:
-                    f.write(img_response.content)
+                IMAGE_DOWNLOAD_SECONDS.observe(time.perf_counter() - download_start)
+                IMAGE_BYTES.inc(image_info['bytes'])
+                debug_log(f"Downloaded image content ({image_info['bytes']} bytes, {image_info['image_type']}, sha256 {image_info['sha256'][:12]})")
 
                 downloaded_images.append(filename)
 
@@ -2898,7 +4288,9 @@ def download_images_from_url(url, images_folder=None, max_images=None):
                 image_metadata[filename] = {
                     'tag': img_tag,
                     'attribute': img_attr,
-                    'url': img_url_absolute
+                    'url': img_url_absolute,
+                    'sha256': image_info['sha256'],
+                    'bytes': image_info['bytes']
                 }
 
                 debug_log(f"Successfully saved: {filepath}")
@@ -2909,7 +4301,14 @@ def download_images_from_url(url, images_folder=None, max_images=None):
                 if delay > 0:
                     time.sleep(delay)
                 
+            except ImageDownloadError as e:
+                ERRORS.labels('image_download', 'invalid_image').inc()
+                debug_log(f"Skipping image {i+1} ({img_url_absolute}): {e}", "WARNING")
+                if CONFIG.get('logging', {}).get('show_warnings', True):
+                    log_message(f"Skipped {img_url_absolute}: {e}", "WARNING")
+                continue
             except requests.exceptions.RequestException as e:
+                ERRORS.labels('image_download', error_class(e)).inc()
                 handle_exception(func_name, e, f"downloading image {i+1}: {img_url_absolute}")
                 continue
             except IOError as e:
@@ -2921,19 +4320,34 @@ def download_images_from_url(url, images_folder=None, max_images=None):
 
     except requests.exceptions.RequestException as e:
         handle_exception(func_name, e, f"accessing URL: {url}")
-        return ([], {}, "")
+        return ([], {}, "", None)
     except Exception as e:
         handle_exception(func_name, e, f"general error")
-        return ([], {}, "")
+        return ([], {}, "", None)
 
     debug_log(f"Download complete: {len(downloaded_images)} images successfully downloaded")
+    log_http_host_stats()
+    cache_stats = get_http_cache_stats()
+    if cache_stats:
+        debug_log(f"HTTP cache: {cache_stats['hits']} hits, {cache_stats['revalidated']} revalidated, "
+                  f"{cache_stats['misses']} misses, {cache_stats['stored']} stored, {cache_stats['evicted']} evicted")
     if CONFIG.get('logging', {}).get('show_information', True):
         log_message(f"Successfully downloaded {len(downloaded_images)} images", "INFORMATION")
 
-    return (downloaded_images, image_metadata, page_title)
+    return (downloaded_images, image_metadata, page_title, page)
 
 
-def grab_context(image_filename, url, context_folder=None):
+# Labels of the pieces collected by grab_context() and their context_budget kinds
+CONTEXT_PIECE_PREFIXES = (
+    ("Alt text: ", 'alt_text'),
+    ("Title: ", 'title'),
+    ("Heading: ", 'heading'),
+    ("Section text: ", 'section_text'),
+    ("Caption: ", 'caption'),
+    ("Nearby text: ", 'nearby_text')
+)
+
+def grab_context(image_filename, url, context_folder=None, page=None):
     """
     Crawls the URL to find a specific image and extracts surrounding text context.
 
@@ -2941,6 +4355,10 @@ def grab_context(image_filename, url, context_folder=None):
         image_filename (str): Name of the image file to search for
         url (str): The URL to crawl for the image
         context_folder (str): Folder to save context files (uses config default if None)
+        page (dict): Page returned by download_images_from_url() in the same run; its
+            markup is used instead of fetching the page again, and the ContextIndex built
+            from it is kept in page['index'] for the next image (None: fetch and index the
+            page for this call only)
 
     Returns:
         tuple: (context_file_path, image_url, current_alt_text) or (None, None, None) if image not found
@@ -2981,13 +4399,39 @@ def grab_context(image_filename, url, context_folder=None):
             debug_log(f"Created directory: {context_folder}")
         
         headers = {'User-Agent': user_agent}
-        debug_log(f"Making request to: {url}")
-        
-        response = requests.get(url, headers=headers, timeout=timeout)
-        response.raise_for_status()
-        debug_log(f"Successfully retrieved page content ({len(response.content)} bytes)")
-        
-        soup = BeautifulSoup(response.content, 'html.parser')
+
+        same_page = page is not None and page.get('url') == url
+        context_index = page.get('index') if same_page else None
+        if context_index is not None:
+            # Same page as the previous image: reuse its parsed tree and text index
+            debug_log("Reusing indexed page from a previous context extraction")
+            soup = context_index.soup
+        else:
+            page_markup = page.get('markup') if same_page else None
+            if page_markup is not None:
+                # Reuse the markup read by download_images_from_url() in this run
+                debug_log(f"Using page markup from the download step ({len(page_markup)} chars/bytes) instead of fetching again")
+                soup = parse_tree(page_markup, get_html_parser_backend(tree_required=True))
+            else:
+                debug_log(f"Making request to: {url}")
+
+                fetch_start = time.perf_counter()
+                try:
+                    response = fetch_url(url, headers=headers, timeout=timeout)
+                    response.raise_for_status()
+                except requests.exceptions.RequestException as e:
+                    ERRORS.labels('page_fetch', error_class(e)).inc()
+                    raise
+                PAGE_BYTES.inc(len(response.content))
+                PAGE_FETCH_SECONDS.observe(time.perf_counter() - fetch_start)
+                debug_log(f"Successfully retrieved page content ({len(response.content)} bytes)")
+
+                soup = parse_tree(response.content, get_html_parser_backend(tree_required=True))
+
+            # One pass over the document; every image's context is then read from slices
+            context_index = ContextIndex(soup)
+            if same_page:
+                page['index'] = context_index
 
         # Get configuration for which tags and attributes to use
         enabled_tags = get_enabled_image_tags()
@@ -3114,24 +4558,27 @@ def grab_context(image_filename, url, context_folder=None):
         # Look for headings in parent elements
         current_element = target_img
         heading_count = 0
+        collected_headings = set()
         debug_log(f"Searching up to {max_parent_levels} parent levels for context (max {max_headings} headings)")
 
         for level in range(max_parent_levels):
             if current_element.parent:
+                child_element = current_element
                 current_element = current_element.parent
                 debug_log(f"Checking parent level {level+1}: {current_element.name}")
 
-                # Find headings (h1-h6) in this level
-                headings = current_element.find_all(['h1', 'h2', 'h3', 'h4', 'h5', 'h6'])
+                # Find headings (h1-h6) in this level; those inside the previous level were already visited
+                headings = context_index.headings_in(current_element, exclude=child_element if level > 0 else None)
                 for heading in headings:
                     # Stop if we've reached the max_headings limit
                     if heading_count >= max_headings:
                         debug_log(f"Reached max_headings limit ({max_headings}), stopping heading collection")
                         break
 
-                    heading_text = heading.get_text().strip()
-                    if heading_text and heading_text not in [c.split(': ', 1)[1] for c in context_text if c.startswith('Heading: ')]:
+                    heading_text = context_index.text(heading)
+                    if heading_text and heading_text not in collected_headings:
                         context_text.append(f"Heading: {heading_text}")
+                        collected_headings.add(heading_text)
                         heading_count += 1
                         debug_log(f"Found heading: {heading_text}")
 
@@ -3141,8 +4588,7 @@ def grab_context(image_filename, url, context_folder=None):
                 
                 # Get text content from the section
                 if current_element.name in ['section', 'article', 'div', 'main']:
-                    section_text = current_element.get_text(separator=' ', strip=True)
-                    section_text = ' '.join(section_text.split())
+                    section_text = context_index.section_text(current_element, max_text_length)
                     
                     if len(section_text) > max_text_length:
                         section_text = section_text[:max_text_length] + "..."
@@ -3157,23 +4603,24 @@ def grab_context(image_filename, url, context_folder=None):
         figure_parent = target_img.find_parent(['figure', 'figcaption'])
         if figure_parent:
             debug_log("Found figure parent element")
-            caption = figure_parent.find('figcaption')
+            caption = context_index.first_figcaption(figure_parent)
             if caption:
-                caption_text = caption.get_text().strip()
+                caption_text = context_index.text(caption)
                 if caption_text:
                     context_text.append(f"Caption: {caption_text}")
                     debug_log(f"Found caption: {caption_text}")
         
         # Look for nearby text elements (siblings) - but avoid duplicates
         if target_img.parent:
-            siblings = target_img.parent.find_all(['p', 'span', 'div'], limit=3)
+            siblings = context_index.sibling_candidates(target_img.parent, limit=3)
             debug_log(f"Found {len(siblings)} sibling elements to check")
 
             # Get existing text normalized for comparison (remove extra whitespace)
             existing_text_normalized = " ".join("\n".join(context_text).split()).lower()
 
             for sibling in siblings:
-                sibling_text = sibling.get_text().strip()
+                # None when the text is too long to qualify (large containers are not materialized)
+                sibling_text = context_index.bounded_text(sibling, max_sibling_text_length) or ""
                 # Normalize sibling text for comparison
                 sibling_normalized = " ".join(sibling_text.split()).lower()
 
@@ -3198,32 +4645,36 @@ def grab_context(image_filename, url, context_folder=None):
         context_filepath = os.path.join(context_folder, context_filename)
         debug_log(f"Saving context to: {context_filepath}")
 
-        # Create structured context text with "Part N:" labels
-        structured_context_parts = []
-        for idx, item in enumerate(context_text, 1):
-            # Remove the prefix labels and add structured "Part N:" format
-            if item.startswith("Alt text: "):
-                content = item[10:]  # Remove "Alt text: " prefix
-            elif item.startswith("Heading: "):
-                content = item[9:]   # Remove "Heading: " prefix
-            elif item.startswith("Section text: "):
-                content = item[14:]  # Remove "Section text: " prefix
-            elif item.startswith("Caption: "):
-                content = item[9:]   # Remove "Caption: " prefix
-            elif item.startswith("Nearby text: "):
-                content = item[13:]  # Remove "Nearby text: " prefix
-            elif item.startswith("Title: "):
-                content = item[7:]   # Remove "Title: " prefix
-            else:
-                content = item
+        # Remove the prefix labels; the first heading found is the one nearest the image
+        pieces = []
+        for item in context_text:
+            kind, content = 'other', item
+            for prefix, prefix_kind in CONTEXT_PIECE_PREFIXES:
+                if item.startswith(prefix):
+                    kind, content = prefix_kind, item[len(prefix):]
+                    break
+            if kind == 'heading' and not any(piece['kind'] == 'nearest_heading' for piece in pieces):
+                kind = 'nearest_heading'
+            pieces.append({'kind': kind, 'text': content})
+
+        # Keep the pieces closest to the image within the token budget of the processing model
+        processing_provider, processing_model = get_step_chain('processing')[0]
+        pieces, budget_stats = budget_context(
+            pieces,
+            CONFIG.get('context', {}).get('token_budget', 0),
+            lambda text: count_tokens(f"Part 10: {text}.\n\n", processing_provider, processing_model)
+        )
+        debug_log(f"Context budget: {budget_stats['estimated_tokens']} tokens of {budget_stats['budget_tokens']}"
+                  + (f", truncated {budget_stats['truncated']}" if budget_stats['truncated'] else "")
+                  + (f", dropped {budget_stats['dropped']}" if budget_stats['dropped'] else ""))
 
-            # Add structured "Part N:" format
-            structured_context_parts.append(f"Part {idx}: {content}.")
+        # Create structured context text with "Part N:" labels
+        structured_context_parts = [f"Part {idx}: {piece['text']}." for idx, piece in enumerate(pieces, 1)]
 
         with open(context_filepath, 'w', encoding='utf-8') as f:
             f.write("\n\n".join(structured_context_parts))
 
-        debug_log(f"Context extraction complete: {len(context_text)} items saved")
+        debug_log(f"Context extraction complete: {len(pieces)} items saved")
         if CONFIG.get('logging', {}).get('show_information', True):
             log_message(f"Context saved for '{image_filename}' -> {context_filepath}")
 
@@ -3409,6 +4860,14 @@ def generate_alt_text_json(image_filename, images_folder=None, context_folder=No
     # Start timing
     start_time = time.time()
 
+    # All LLM calls for this image (vision, processing, translations) share one deadline
+    deadline_scope = contextlib.ExitStack()
+    deadline = deadline_scope.enter_context(
+        image_deadline(CONFIG.get('llm_timeouts', {}).get('image_deadline_seconds', 0))
+    )
+    # Tokens, time and cost of those calls, per step and provider (rolls up into the job and session)
+    usage_ledger = deadline_scope.enter_context(usage_scope())
+
     try:
         # Determine which languages to generate alt-text for
         target_languages = []
@@ -3598,6 +5057,10 @@ When GEO boost is enabled, apply these additional constraints to alt-text genera
         # Calculate max characters based on GEO boost setting (used for validation)
         max_chars_limit = get_max_chars(use_geo_boost)
 
+        # Simple/complex model pair, decided once per image for every language
+        routing = route_image(image_path)
+        image_route = routing['route'] if routing else None
+
         if is_multilingual:
             # Generate alt-text for multiple languages
             debug_log(f"Generating alt-text for {len(target_languages)} languages: {target_languages}")
@@ -3619,7 +5082,7 @@ When GEO boost is enabled, apply these additional constraints to alt-text genera
                     # Create language-specific prompt
                     lang_prompt = create_prompt_for_language(lang)
                     debug_log(f"Created prompt for {lang} ({language_map.get(lang, lang)})")
-                    llm_result = analyze_image_with_ai(image_path, lang_prompt, None, lang, vision_prompt=vision_prompt_used)
+                    llm_result = analyze_image_with_ai(image_path, lang_prompt, None, lang, vision_prompt=vision_prompt_used, max_chars=max_chars_limit, route=image_route)
                     processing_prompts_used.append({"language": lang.upper(), "prompt": lang_prompt})
 
                     if llm_result:
@@ -3675,7 +5138,7 @@ When GEO boost is enabled, apply these additional constraints to alt-text genera
                 # Create language-specific prompt for first language
                 first_lang_prompt = create_prompt_for_language(first_lang)
                 debug_log(f"Created prompt for {first_lang} ({language_map.get(first_lang, first_lang)})")
-                llm_result = analyze_image_with_ai(image_path, first_lang_prompt, None, first_lang, vision_prompt=vision_prompt_used)
+                llm_result = analyze_image_with_ai(image_path, first_lang_prompt, None, first_lang, vision_prompt=vision_prompt_used, max_chars=max_chars_limit, route=image_route)
                 processing_prompts_used.append({"language": first_lang.upper(), "prompt": first_lang_prompt})
 
                 if llm_result:
@@ -3756,7 +5219,7 @@ When GEO boost is enabled, apply these additional constraints to alt-text genera
             # Create language-specific prompt
             lang_prompt = create_prompt_for_language(lang)
             debug_log(f"Created prompt for {lang} ({language_map.get(lang, lang)})")
-            llm_result = analyze_image_with_ai(image_path, lang_prompt, None, lang, vision_prompt=vision_prompt_used)
+            llm_result = analyze_image_with_ai(image_path, lang_prompt, None, lang, vision_prompt=vision_prompt_used, max_chars=max_chars_limit, route=image_route)
             processing_prompts_used.append({"language": lang.upper(), "prompt": lang_prompt})
 
             if llm_result:
@@ -3831,6 +5294,14 @@ When GEO boost is enabled, apply these additional constraints to alt-text genera
         # Calculate processing time
         processing_time = round(time.time() - start_time, 2)
 
+        # Timeouts are a distinct outcome from other generation errors
+        if deadline.timeouts and (image_type == "generation_error" or "Translation error" in str(alt_text)):
+            outcome = "timeout"
+        elif image_type == "generation_error":
+            outcome = "generation_error"
+        else:
+            outcome = "success"
+
         json_data = {
             "generated_timestamp": datetime.now().isoformat(),
             "web_site_url": url if url else "",
@@ -3860,9 +5331,37 @@ When GEO boost is enabled, apply these additional constraints to alt-text genera
                 "translation_provider": models_used.get('translation_provider') if (models_used and models_used.get('translation_provider')) else CONFIG.get('steps', {}).get('translation', {}).get('provider', 'Unknown'),
                 "translation_model": models_used.get('translation_model') if (models_used and models_used.get('translation_model')) else CONFIG.get('steps', {}).get('translation', {}).get('model', 'Unknown')
             },
-            "processing_time_seconds": processing_time
+            "processing_time_seconds": processing_time,
+            "outcome": outcome
         }
 
+        # Steps served by a fallback provider (ai_model above names the providers that served)
+        if models_used and models_used.get('failover'):
+            json_data["provider_failover"] = models_used['failover']
+        if models_used and models_used.get('hedged_steps'):
+            json_data["hedged_steps"] = models_used['hedged_steps']
+        # Cascade tier that answered ('cheap' or 'escalated' with the reason)
+        if models_used and models_used.get('cascade'):
+            json_data["cascade"] = models_used['cascade']
+        # Complexity route with the features that decided it
+        if routing:
+            json_data["routing"] = routing
+        # Description shared a vision request with other small images
+        if models_used and models_used.get('vision_batch_size'):
+            json_data["vision_batch_size"] = models_used['vision_batch_size']
+
+        # Per step and provider: calls, estimated and reported tokens, wall time and estimated cost
+        llm_usage = usage_ledger.summary()
+        if llm_usage:
+            json_data["llm_usage"] = llm_usage
+        if context_text:
+            context_provider, context_model = get_step_chain('processing', image_route)[0]
+            json_data["context_tokens_estimated"] = count_tokens(context_text, context_provider, context_model)
+
+        if deadline.timeouts:
+            json_data["timeouts"] = list(deadline.timeouts)
+            json_data["deadline_seconds"] = deadline.budget
+
         # Add translation_mode only for multilingual scenarios (fast or accurate)
         if translation_method in ["fast", "accurate"]:
             json_data["translation_mode"] = translation_method
@@ -3902,6 +5401,8 @@ When GEO boost is enabled, apply these additional constraints to alt-text genera
     except Exception as e:
         handle_exception(func_name, e, f"generating JSON for {image_filename}")
         return (None, False)
+    finally:
+        deadline_scope.close()
 
 
 def process_all_images(images_folder=None, context_folder=None, prompt_folder=None, alt_text_folder=None, language=None, url=None, image_metadata=None, page_title=None, languages=None, max_images=None, use_geo_boost=False, image_files_list=None):
@@ -3991,20 +5492,49 @@ def process_all_images(images_folder=None, context_folder=None, prompt_folder=No
         if CONFIG.get('logging', {}).get('show_information', True):
             log_message(f"Processing {len(image_files)} images...", "INFORMATION")
         
-        for i, image_filename in enumerate(image_files, 1):
+        # Images are processed by a small worker pool; the number of LLM calls
+        # actually in flight is bounded per provider endpoint by call_llm()'s AIMD window
+        image_workers = min(get_image_workers(), len(image_files))
+        progress_lock = threading.Lock()
+        completed = [0]
+
+        # LLM accounting for this job; every image's ledger rolls up into it
+        job_usage = UsageLedger(parent=current_usage_ledger() or SESSION_USAGE)
+
+        # Small images (icons, logos) get their descriptions from batched vision requests
+        vision_batching = None
+        try:
+            vision_batching = propagate_usage(prepare_vision_batches, job_usage)(
+                [os.path.join(images_folder, image_filename) for image_filename in image_files],
+                load_vision_prompt(get_absolute_folder_path('prompt_vision'))
+            )
+        except Exception as e:
+            debug_log(f"Vision batching skipped: {e}", "WARNING")
+        if vision_batching:
+            results["vision_batching"] = {k: v for k, v in vision_batching.items() if k != 'keys'}
+            write_progress(30, f"Described {vision_batching['batched_images']} small images in "
+                           f"{vision_batching['batches']} batched requests", phase="processing",
+                           stats={"vision_batching": results["vision_batching"]})
+
+        @traced('image')
+        def process_image(i, image_filename):
             debug_log(f"Processing image {i}/{len(image_files)}: {image_filename}")
+            current_span().set_attributes({'image.index': i, 'image.filename': image_filename})
 
             if CONFIG.get('logging', {}).get('show_information', True):
                 log_message(f"[{i}/{len(image_files)}] Processing: {image_filename}", "INFORMATION")
 
             # Report processing progress (30-90% range for processing phase)
-            process_percent = 30 + int(((i - 1) / len(image_files)) * 60)
+            with progress_lock:
+                process_percent = 30 + int((completed[0] / len(image_files)) * 60)
             write_progress(
                 process_percent,
                 f"Processing image {i} of {len(image_files)}: {image_filename}",
                 phase="processing",
                 current_image=i,
-                total_images=len(image_files)
+                total_images=len(image_files),
+                stats={"llm_concurrency": concurrency_snapshot(), "circuit_breakers": circuit_snapshot(),
+                       "hedging": hedging_snapshot()}
             )
 
             try:
@@ -4047,35 +5577,61 @@ def process_all_images(images_folder=None, context_folder=None, prompt_folder=No
 
                 if json_path and success:
                     # True success: JSON created AND no generation error
-                    results["successful"] += 1
-                    results["details"].append({
+                    debug_log(f"Successfully processed: {image_filename}")
+                    IMAGES_SUCCEEDED.inc()
+                    return {
                         "image": image_filename,
                         "status": "success",
                         "json_file": json_path
-                    })
-                    debug_log(f"Successfully processed: {image_filename}")
-                else:
-                    # Failed: either no JSON created OR generation_error occurred
-                    results["failed"] += 1
-                    error_reason = "Generation error occurred" if json_path and not success else "JSON generation returned None"
-                    results["details"].append({
-                        "image": image_filename,
-                        "status": "failed",
-                        "error": error_reason,
-                        "json_file": json_path if json_path else None
-                    })
-                    debug_log(f"Failed to process: {image_filename} - {error_reason}", "WARNING")
-                
-            except Exception as e:
-                results["failed"] += 1
-                error_msg = str(e)
-                results["details"].append({
+                    }
+
+                # Failed: either no JSON created OR generation_error occurred
+                error_reason = "Generation error occurred" if json_path and not success else "JSON generation returned None"
+                debug_log(f"Failed to process: {image_filename} - {error_reason}", "WARNING")
+                IMAGES_FAILED.inc()
+                return {
                     "image": image_filename,
-                    "status": "failed", 
-                    "error": error_msg
-                })
+                    "status": "failed",
+                    "error": error_reason,
+                    "json_file": json_path if json_path else None
+                }
+
+            except Exception as e:
                 handle_exception(func_name, e, f"processing image {image_filename}")
-        
+                IMAGES_FAILED.inc()
+                return {
+                    "image": image_filename,
+                    "status": "failed",
+                    "error": str(e)
+                }
+            finally:
+                with progress_lock:
+                    completed[0] += 1
+
+        if image_workers > 1:
+            debug_log(f"Processing images with {image_workers} workers")
+            with ThreadPoolExecutor(max_workers=image_workers) as executor:
+                details = list(executor.map(propagate_span(propagate_usage(process_image, job_usage)),
+                                            range(1, len(image_files) + 1), image_files))
+        else:
+            details = [propagate_usage(process_image, job_usage)(i, image_filename)
+                       for i, image_filename in enumerate(image_files, 1)]
+        if vision_batching:
+            clear_vision_batches(vision_batching['keys'])
+
+        for detail in details:
+            results["details"].append(detail)
+            if detail["status"] == "success":
+                results["successful"] += 1
+            else:
+                results["failed"] += 1
+
+        results["llm_concurrency"] = concurrency_snapshot()
+        llm_usage = job_usage.summary()
+        if llm_usage:
+            results["llm_usage"] = llm_usage
+            write_progress(90, "Images processed", phase="processing", stats={"llm_usage": llm_usage})
+
         # Summary
         debug_log(f"Batch processing complete: {results['successful']} successful, {results['failed']} failed")
         
@@ -4098,6 +5654,7 @@ def process_all_images(images_folder=None, context_folder=None, prompt_folder=No
         return {"processed": 0, "successful": 0, "failed": 0, "error": str(e)}
 
 
+@traced('workflow')
 def MyAccessibilityBuddy(url, images_folder=None, context_folder=None, prompt_folder=None, alt_text_folder=None, clear_all=False, max_images=None, languages=None, use_geo_boost=False):
     """
     Complete MyAccessibilityBuddy workflow: downloads images, extracts context, and generates JSON files.
@@ -4117,6 +5674,8 @@ def MyAccessibilityBuddy(url, images_folder=None, context_folder=None, prompt_fo
         dict: Complete workflow results with all operation summaries
     """
     func_name = "AutoAltText"
+    current_span().set_attributes({'url': url, 'max_images': max_images,
+                                   'languages': ','.join(languages) if languages else None})
 
     try:
         # Use config values - resolve to absolute paths
@@ -4208,7 +5767,9 @@ def MyAccessibilityBuddy(url, images_folder=None, context_folder=None, prompt_fo
         debug_log("Starting image download step")
         if max_images:
             debug_log(f"Maximum images to download: {max_images}")
-        download_results, image_metadata, page_title = download_images_from_url(url, images_folder, max_images)
+        with workflow_phase('download', {'url': url}) as phase_span:
+            download_results, image_metadata, page_title, page = download_images_from_url(url, images_folder, max_images)
+            phase_span.set_attribute('images', len(download_results))
 
         workflow_results["steps"]["download"] = {
             "status": "completed" if download_results else "failed",
@@ -4240,65 +5801,71 @@ def MyAccessibilityBuddy(url, images_folder=None, context_folder=None, prompt_fo
         debug_log("Starting context extraction step")
         context_results = {"successful": 0, "failed": 0, "details": []}
 
-        for i, image_filename in enumerate(download_results, 1):
-            debug_log(f"Extracting context for image {i}/{len(download_results)}: {image_filename}")
+        with workflow_phase('context', {'images': len(download_results)}) as phase_span:
+            for i, image_filename in enumerate(download_results, 1):
+                debug_log(f"Extracting context for image {i}/{len(download_results)}: {image_filename}")
 
-            if CONFIG.get('logging', {}).get('show_information', True):
-                print(f"[{i}/{len(download_results)}] Extracting context: {image_filename}")
+                if CONFIG.get('logging', {}).get('show_information', True):
+                    print(f"[{i}/{len(download_results)}] Extracting context: {image_filename}")
 
-            try:
-                context_result = grab_context(image_filename, url, context_folder)
-
-                # Handle tuple return: (context_path, image_url, current_alt_text)
-                if isinstance(context_result, tuple):
-                    if len(context_result) == 3:
-                        context_path, image_url, current_alt_text = context_result
-                    elif len(context_result) == 2:
-                        # Backward compatibility
-                        context_path, image_url = context_result
-                        current_alt_text = ""
+                try:
+                    context_start = time.perf_counter()
+                    context_result = grab_context(image_filename, url, context_folder, page)
+                    CONTEXT_SECONDS.observe(time.perf_counter() - context_start)
+
+                    # Handle tuple return: (context_path, image_url, current_alt_text)
+                    if isinstance(context_result, tuple):
+                        if len(context_result) == 3:
+                            context_path, image_url, current_alt_text = context_result
+                        elif len(context_result) == 2:
+                            # Backward compatibility
+                            context_path, image_url = context_result
+                            current_alt_text = ""
+                        else:
+                            context_path = context_result[0]
+                            image_url = None
+                            current_alt_text = ""
                     else:
-                        context_path = context_result[0]
+                        # Backward compatibility: if it returns just a path
+                        context_path = context_result
                         image_url = None
                         current_alt_text = ""
-                else:
-                    # Backward compatibility: if it returns just a path
-                    context_path = context_result
-                    image_url = None
-                    current_alt_text = ""
 
-                if context_path:
-                    context_results["successful"] += 1
-                    context_results["details"].append({
-                        "image": image_filename,
-                        "status": "success",
-                        "context_file": context_path
-                    })
-                    # Update image_metadata with URL and current alt text from context
-                    if image_filename in image_metadata:
-                        if image_url:
-                            image_metadata[image_filename]['url'] = image_url
-                            debug_log(f"Updated image URL for {image_filename} from context: {image_url}")
-                        if current_alt_text:
-                            image_metadata[image_filename]['current_alt_text'] = current_alt_text
-                            debug_log(f"Stored current alt text for {image_filename}: {current_alt_text}")
-                else:
+                    if context_path:
+                        context_results["successful"] += 1
+                        context_results["details"].append({
+                            "image": image_filename,
+                            "status": "success",
+                            "context_file": context_path
+                        })
+                        # Update image_metadata with URL and current alt text from context
+                        if image_filename in image_metadata:
+                            if image_url:
+                                image_metadata[image_filename]['url'] = image_url
+                                debug_log(f"Updated image URL for {image_filename} from context: {image_url}")
+                            if current_alt_text:
+                                image_metadata[image_filename]['current_alt_text'] = current_alt_text
+                                debug_log(f"Stored current alt text for {image_filename}: {current_alt_text}")
+                    else:
+                        context_results["failed"] += 1
+                        context_results["details"].append({
+                            "image": image_filename,
+                            "status": "failed",
+                            "error": "Context extraction returned None"
+                        })
+                        ERRORS.labels('context', 'no_context').inc()
+
+                except Exception as e:
+                    ERRORS.labels('context', error_class(e)).inc()
                     context_results["failed"] += 1
                     context_results["details"].append({
                         "image": image_filename,
                         "status": "failed",
-                        "error": "Context extraction returned None"
+                        "error": str(e)
                     })
-
-            except Exception as e:
-                context_results["failed"] += 1
-                context_results["details"].append({
-                    "image": image_filename,
-                    "status": "failed",
-                    "error": str(e)
-                })
-                handle_exception(func_name, e, f"extracting context for {image_filename}")
+                    handle_exception(func_name, e, f"extracting context for {image_filename}")
         
+            phase_span.set_attributes({'successful': context_results["successful"], 'failed': context_results["failed"]})
         workflow_results["steps"]["context"] = context_results
         debug_log(f"Context extraction complete: {context_results['successful']} successful, {context_results['failed']} failed")
         
@@ -4312,7 +5879,9 @@ def MyAccessibilityBuddy(url, images_folder=None, context_folder=None, prompt_fo
             print(f"\nStep 3/3: Generating JSON files for all images...")
 
         debug_log("Starting JSON generation step")
-        json_results = process_all_images(images_folder, context_folder, prompt_folder, alt_text_folder, None, url, image_metadata, page_title, languages, max_images, use_geo_boost, image_files_list=download_results)
+        with workflow_phase('generation', {'images': len(download_results)}) as phase_span:
+            json_results = process_all_images(images_folder, context_folder, prompt_folder, alt_text_folder, None, url, image_metadata, page_title, languages, max_images, use_geo_boost, image_files_list=download_results)
+            phase_span.set_attributes({'successful': json_results.get('successful', 0), 'failed': json_results.get('failed', 0)})
 
         workflow_results["steps"]["json_generation"] = json_results
         debug_log(f"JSON generation complete: {json_results.get('successful', 0)} successful, {json_results.get('failed', 0)} failed")
@@ -4326,11 +5895,45 @@ def MyAccessibilityBuddy(url, images_folder=None, context_folder=None, prompt_fo
             "json_files_generated": json_results.get("successful", 0),
             "total_failures": context_results["failed"] + json_results.get("failed", 0)
         }
+        http_cache_stats = get_http_cache_stats()
+        if http_cache_stats:
+            workflow_results["summary"]["http_cache"] = http_cache_stats
+        llm_concurrency = concurrency_snapshot()
+        if llm_concurrency:
+            workflow_results["summary"]["llm_concurrency"] = llm_concurrency
+        circuit_breakers = circuit_snapshot()
+        if circuit_breakers:
+            workflow_results["summary"]["circuit_breakers"] = circuit_breakers
+        hedging = hedging_snapshot()
+        if hedging:
+            workflow_results["summary"]["hedging"] = hedging
+        vision_batching = json_results.get("vision_batching")
+        if vision_batching:
+            workflow_results["summary"]["vision_batching"] = vision_batching
+        llm_usage = json_results.get("llm_usage")
+        if llm_usage:
+            workflow_results["summary"]["llm_usage"] = llm_usage
+        cassettes = cassette_snapshot()
+        if cassettes:
+            workflow_results["summary"]["cassettes"] = cassettes
         
         debug_log(f"AutoAltText workflow complete: {workflow_results['summary']}")
 
         # Report completion progress
-        write_progress(95, "Finalizing results...", phase="finalizing")
+        final_stats = {}
+        if http_cache_stats:
+            final_stats["http_cache"] = http_cache_stats
+        if llm_concurrency:
+            final_stats["llm_concurrency"] = llm_concurrency
+        if circuit_breakers:
+            final_stats["circuit_breakers"] = circuit_breakers
+        if hedging:
+            final_stats["hedging"] = hedging
+        if cassettes:
+            final_stats["cassettes"] = cassettes
+        # Counters and histograms of this process, added to the API's /api/metrics when the job ends
+        final_stats["metrics"] = METRICS_REGISTRY.snapshot()
+        write_progress(95, "Finalizing results...", phase="finalizing", stats=final_stats)
 
         if CONFIG.get('logging', {}).get('show_information', True):
             print(f"\nAutoAltText Complete!")
@@ -4339,6 +5942,20 @@ def MyAccessibilityBuddy(url, images_folder=None, context_folder=None, prompt_fo
             print(f"  JSON files generated: {workflow_results['summary']['json_files_generated']}")
             if workflow_results['summary']['total_failures'] > 0:
                 print(f"  Total failures: {workflow_results['summary']['total_failures']}")
+            if http_cache_stats:
+                print(f"  HTTP cache: {http_cache_stats['hits']} hits, {http_cache_stats['revalidated']} revalidated, "
+                      f"{http_cache_stats['misses']} misses")
+            if vision_batching:
+                print(f"  Batched vision: {vision_batching['batched_images']} images in {vision_batching['batches']} requests "
+                      f"({vision_batching['requests_saved']} requests saved)")
+            if llm_usage:
+                print(f"  LLM usage: {format_llm_usage(llm_usage['total'])}")
+            if cassettes:
+                print(f"  Cassettes ({cassettes['mode']}): {cassettes['recorded']} recorded, {cassettes['replayed']} replayed, "
+                      f"{cassettes['missed']} missed in {cassettes['folder']}")
+            for endpoint, window in llm_concurrency.items():
+                print(f"  LLM concurrency {endpoint}: window {window['window']} (max in flight {window['max_in_flight']}, "
+                      f"{window['increases']} increases, {window['decreases']} decreases)")
             print(f"  Output folder: {alt_text_folder}")
 
         # Close log file
@@ -4354,12 +5971,36 @@ def MyAccessibilityBuddy(url, images_folder=None, context_folder=None, prompt_fo
             "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")
         }
         handle_exception(func_name, e, f"AutoAltText workflow for {url}")
+        write_progress(100, f"Error: {e}", phase="error", stats={"metrics": METRICS_REGISTRY.snapshot()})
 
         # Close log file even on error
         close_log_file()
 
         return error_result
 
+def finish_profiling():
+    """Write the --profile results next to the session logs, print the hotspots and pass them to the job status."""
+    if ACTIVE_PROFILER is None:
+        return
+    logs_folder = CURRENT_SESSION_LOGS or get_absolute_folder_path('logs')
+    profile_folder = os.path.join(logs_folder, f"profile_{get_cet_time().strftime('%Y%m%d_%H%M%S')}")
+    try:
+        summary = ACTIVE_PROFILER.write(profile_folder)
+    except OSError as e:
+        print(f"WARNING: Could not write profile to {profile_folder}: {e}")
+        return
+    print(f"\n{format_profile(summary, top_n=min(ACTIVE_PROFILER.top_n, 10))}")
+    print(f"Profile written to: {profile_folder}")
+    # Phase timings only; hotspots stay in the profile files
+    write_progress(100, "Profile written", phase="finalizing", stats={"profile": {
+        "folder": profile_folder,
+        "mode": summary["mode"],
+        "wall_seconds": summary["wall_seconds"],
+        "cpu_seconds": summary["cpu_seconds"],
+        "phases": {name: {key: value for key, value in phase.items() if key not in ('hotspots', 'cumulative')}
+                   for name, phase in summary["phases"].items()}
+    }})
+
 def main():
     # Load configuration first
     load_config()
@@ -4408,11 +6049,11 @@ def main():
     parser.add_argument('--num-images', type=int, default=None, help='Maximum number of images to download')
     parser.add_argument('--geo', action='store_true', help='Enable GEO (Generative Engine Optimization) boost for AI-friendly alt-text')
     parser.add_argument('--geo-boost', action='store_true', help='Alias for --geo to enable GEO (Generative Engine Optimization) boost')
-    parser.add_argument('--vision-provider', help='Override vision provider (OpenAI, Claude, ECB-LLM, Ollama, Gemini)')
+    parser.add_argument('--vision-provider', help='Override vision provider (OpenAI, Claude, ECB-LLM, Ollama, Gemini, Stub)')
     parser.add_argument('--vision-model', help='Override vision model name')
-    parser.add_argument('--processing-provider', help='Override processing provider (OpenAI, Claude, ECB-LLM, Ollama, Gemini)')
+    parser.add_argument('--processing-provider', help='Override processing provider (OpenAI, Claude, ECB-LLM, Ollama, Gemini, Stub)')
     parser.add_argument('--processing-model', help='Override processing model name')
-    parser.add_argument('--translation-provider', help='Override translation provider (OpenAI, Claude, ECB-LLM, Ollama, Gemini)')
+    parser.add_argument('--translation-provider', help='Override translation provider (OpenAI, Claude, ECB-LLM, Ollama, Gemini, Stub)')
     parser.add_argument('--translation-model', help='Override translation model name')
     parser.add_argument('--advanced-translation', action='store_true', help='Generate fresh alt-text per language (sets translation_mode=accurate)')
     parser.add_argument('--translation-mode', choices=['fast', 'accurate'], help='Set translation mode for multilingual generation')
@@ -4432,6 +6073,22 @@ def main():
     parser.add_argument('--force', action='store_true', help='Skip confirmation prompts (use with --clear-all or --clear-session)')
 
     parser.add_argument('--report', action='store_true', help='Generate accessible HTML report after processing')
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the on-disk HTTP cache for pages and images')
+    parser.add_argument('--download-delay', type=float, metavar='SECONDS',
+                        help='Seconds to wait between image downloads (overrides download.delay_between_requests)')
+    parser.add_argument('--profile', nargs='?', const='sampling', choices=PROFILE_MODES, default=None,
+                        help='Profile the run per phase (download, context, generation, report) and write the profiles '
+                             'next to the session logs: sampling (default, all threads, network vs CPU) or cprofile '
+                             '(main thread, .prof files)')
+    parser.add_argument('--profile-top', type=int, default=DEFAULT_TOP_N, metavar='N',
+                        help=f'Number of hotspots per phase in the profile (default: {DEFAULT_TOP_N})')
+    parser.add_argument('--cassettes', choices=[mode for mode in CASSETTE_MODES if mode != 'off'], default=None,
+                        help='Record every provider response into the cassette folder, or replay recorded responses '
+                             'with their latencies instead of calling the providers')
+    parser.add_argument('--cassette-folder', default=None, metavar='DIR',
+                        help='Cassette folder for --cassettes (default: folders.cassettes from config)')
+    parser.add_argument('--replay-latency-scale', type=float, default=None, metavar='X',
+                        help='Multiply replayed latencies by X (0 = no delay; default: cassettes.latency_scale)')
 
     # Progress reporting (for async API calls)
     parser.add_argument('--progress-file', type=str, default=None,
@@ -4451,12 +6108,37 @@ def main():
     if getattr(args, 'session', None) == SESSION_NEW_SENTINEL:
         args.session = SESSION_NEW_SENTINEL
 
+    # Bypass the HTTP cache for this run if requested
+    global HTTP_CACHE_BYPASS
+    if getattr(args, 'no_cache', False):
+        HTTP_CACHE_BYPASS = True
+
+    # Override the politeness delay between image downloads for this run
+    if getattr(args, 'download_delay', None) is not None:
+        CONFIG.setdefault('download', {})['delay_between_requests'] = max(0.0, args.download_delay)
+
+    # Record or replay provider calls for this run
+    if getattr(args, 'cassettes', None) or getattr(args, 'cassette_folder', None):
+        cassette_settings = dict(CONFIG.get('cassettes', {}))
+        if args.cassettes:
+            cassette_settings['mode'] = args.cassettes
+        if args.replay_latency_scale is not None:
+            cassette_settings['latency_scale'] = args.replay_latency_scale
+        configure_cassettes(cassette_settings, args.cassette_folder or get_absolute_folder_path('cassettes'))
+
     # Set up progress file for async API polling
     global PROGRESS_FILE_PATH
     if getattr(args, 'progress_file', None):
         PROGRESS_FILE_PATH = args.progress_file
         write_progress(0, "Initializing...", phase="init")
 
+    # Profile the whole run; the profile is written when the process exits (also on sys.exit)
+    global ACTIVE_PROFILER
+    if getattr(args, 'profile', None):
+        ACTIVE_PROFILER = RunProfiler(args.profile, top_n=args.profile_top)
+        ACTIVE_PROFILER.start()
+        atexit.register(finish_profiling)
+
     # Handle session management commands FIRST (before other operations)
     if args.list_sessions:
         list_cli_sessions()
@@ -4560,7 +6242,8 @@ def main():
             'claude': 'Claude',
             'ecb-llm': 'ECB-LLM',
             'ollama': 'Ollama',
-            'gemini': 'Gemini'
+            'gemini': 'Gemini',
+            'stub': 'Stub'
         }
         if not provider_name:
             return None
@@ -4653,7 +6336,7 @@ def main():
         else:
             print(f"Downloading images from: {args.url}")
 
-        filenames, metadata, page_title = download_images_from_url(args.url, folder, args.num_images)
+        filenames, metadata, page_title, _ = download_images_from_url(args.url, folder, args.num_images)
 
         print(f"Downloaded {len(filenames)} images with tag/attribute metadata")
         debug_log(f"Downloaded {len(filenames)} images")
@@ -4749,6 +6432,11 @@ OPTIONAL FLAGS:
     --clear-outputs         Clear output folders (alt-text, reports) without prompting
     --num-images <N>        Limit number of images to download (default: all)
     --report                Generate accessible HTML report after processing
+    --profile [MODE]        Profile each phase (sampling: all threads, network vs CPU; cprofile: .prof files)
+    --profile-top <N>       Hotspots listed per phase in the profile (default: 20)
+    --cassettes <MODE>      record: store every provider response; replay: serve them back offline
+    --cassette-folder <dir> Cassette folder (default: output/cassettes)
+    --replay-latency-scale <X> Scale replayed latencies (0 = no delay)
     --images-folder <path>  Custom folder for downloaded images
     --context-folder <path> Custom folder for context files
     --alt-text-folder <path> Custom folder for JSON output
@@ -4774,6 +6462,13 @@ EXAMPLES:
     # Complete workflow with all options
     python3 app.py -w https://www.example.com --clear-all --num-images 20 --report
 
+    # Find out where a slow run spends its time (profile written to the logs folder)
+    python3 app.py -w https://www.example.com --num-images 5 --profile
+
+    # Record provider responses once, then replay them for reproducible benchmarks
+    python3 app.py -w https://www.example.com --cassettes record
+    python3 app.py -w https://www.example.com --cassettes replay --replay-latency-scale 0.5
+
 OUTPUT:
     - Downloaded images in images/ folder
     - Context files in context/ folder
@@ -0,0 +1,264 @@
+"""
+Record/replay cassettes for provider calls.
+
+To compare optimizations fairly, runs must see identical model outputs. In
+'record' mode every successful provider call made through call_llm() (the
+vision, processing and translation calls of analyze_image_with_ai(),
+translate_alt_text() and translate_text()) is stored with its latency; in
+'replay' mode the stored response is served back after the recorded latency,
+optionally scaled, without network access or spend.
+
+The store is content-addressed: the key is the SHA-256 of the step,
+provider, model, prompt text, output token budget and the SHA-256 of every
+attached image file, and each entry lives in <folder>/<key[:2]>/<key>.json.
+The same request in another run, page or process finds the same entry, and
+several analysis processes can record into one folder.
+
+Responses are stored as plain JSON (model_dump() of the SDK objects, the
+Ollama dict, Gemini's to_dict() plus its text). Replayed responses are dicts
+that also allow attribute access, so the code reading
+response.choices[0].message.content, response['message']['content'] or
+response.text, and extract_token_usage(), work unchanged.
+
+Replayed calls still pass through the concurrency window and the rate
+limiter, so their effect on throughput is measured too.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+
+CASSETTE_MODES = ('off', 'record', 'replay')
+
+DEFAULT_CASSETTE_SETTINGS = {
+    'mode': 'off',
+    'latency_scale': 1.0,
+    'on_miss': 'error'  # replay misses: 'error' or 'live' (call the provider and record)
+}
+
+CASSETTE_FORMAT_VERSION = 1
+
+_CASSETTES = None
+_CONFIGURE_LOCK = threading.Lock()
+
+
+class CassetteMissError(Exception):
+    """A replayed call has no recorded response."""
+
+
+def file_digest(path):
+    """SHA-256 of a file's content, or of its path when it cannot be read."""
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 16), b''):
+                digest.update(chunk)
+    except OSError:
+        digest.update(f"unreadable:{path}".encode('utf-8'))
+    return digest.hexdigest()
+
+
+def request_key(step, provider, model, prompt_text, max_output_tokens, images=()):
+    """
+    Content address of a provider request.
+
+    Args:
+        step (str): 'vision', 'processing' or 'translation'
+        provider (str): Provider name
+        model (str): Model name
+        prompt_text (str): Full prompt text of the call
+        max_output_tokens (int): Output token budget
+        images (list): Paths of the attached image files
+
+    Returns:
+        str: Hex SHA-256
+    """
+    material = {
+        'step': step,
+        'provider': provider,
+        'model': model,
+        'prompt': prompt_text or '',
+        'max_output_tokens': max_output_tokens,
+        'images': [file_digest(path) for path in images or ()]
+    }
+    return hashlib.sha256(json.dumps(material, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def response_to_data(response):
+    """
+    Convert a provider response to JSON-serialisable data.
+
+    Raises:
+        TypeError: For response types that cannot be stored
+    """
+    if isinstance(response, dict):
+        return json.loads(json.dumps(response, default=str))
+    if hasattr(response, 'model_dump'):
+        try:
+            return response.model_dump(mode='json')
+        except TypeError:
+            return json.loads(json.dumps(response.model_dump(), default=str))
+    if hasattr(response, 'to_dict'):
+        # Gemini: text is a property computed from the candidates
+        data = json.loads(json.dumps(response.to_dict(), default=str))
+        try:
+            data['text'] = response.text
+        except Exception:
+            pass
+        return data
+    raise TypeError(f"Cannot record provider response of type {type(response).__name__}")
+
+
+class ReplayedResponse(dict):
+    """Recorded response data with attribute access, like the SDK objects it replaces."""
+
+    def __getattr__(self, name):
+        try:
+            return _wrap(self[name])
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, name):
+        return _wrap(dict.__getitem__(self, name))
+
+
+def _wrap(value):
+    if isinstance(value, dict) and not isinstance(value, ReplayedResponse):
+        return ReplayedResponse(value)
+    if isinstance(value, list):
+        return [_wrap(item) for item in value]
+    return value
+
+
+class CassetteStore:
+    """Content-addressed response store in a folder."""
+
+    def __init__(self, folder):
+        self.folder = folder
+
+    def path(self, key):
+        return os.path.join(self.folder, key[:2], f"{key}.json")
+
+    def load(self, key):
+        """Return the entry for a key, or None."""
+        try:
+            with open(self.path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def save(self, key, entry):
+        """Write an entry atomically (concurrent writers of the same key write the same content)."""
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, path)
+
+
+class Cassettes:
+    """Records or replays provider calls according to the 'cassettes' settings."""
+
+    def __init__(self, mode, folder, latency_scale=1.0, on_miss='error'):
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Unknown cassette mode '{mode}' (expected one of: {', '.join(CASSETTE_MODES)})")
+        self.mode = mode
+        self.store = CassetteStore(folder)
+        self.latency_scale = float(latency_scale)
+        self.on_miss = on_miss
+        self._lock = threading.Lock()
+        self.counters = {'recorded': 0, 'replayed': 0, 'missed': 0, 'replayed_seconds': 0.0, 'recorded_seconds': 0.0}
+
+    def _count(self, name, seconds_key=None, seconds=0.0):
+        with self._lock:
+            self.counters[name] += 1
+            if seconds_key:
+                self.counters[seconds_key] += seconds
+
+    def wrap(self, step, provider, model, request_fn, prompt_text, max_output_tokens, images=()):
+        """
+        Wrap one provider request for recording or replay.
+
+        Args:
+            step, provider, model, prompt_text, max_output_tokens, images: See request_key()
+            request_fn (callable): Performs the live API call
+
+        Returns:
+            callable: Drop-in replacement of request_fn; every attempt (retries included)
+            goes through it
+        """
+        key = request_key(step, provider, model, prompt_text, max_output_tokens, images)
+        if self.mode == 'replay':
+            entry = self.store.load(key)
+            if entry is not None:
+                return lambda: self._replay(entry)
+            self._count('missed')
+            if self.on_miss != 'live':
+                def missing():
+                    raise CassetteMissError(f"No recorded {step} response for {provider}/{model} (key {key[:12]})")
+                return missing
+        meta = {'step': step, 'provider': provider, 'model': model, 'prompt_chars': len(prompt_text or ''),
+                'image_count': len(images or ())}
+        return lambda: self._record(key, meta, request_fn)
+
+    def _replay(self, entry):
+        seconds = entry.get('latency_seconds', 0.0) * self.latency_scale
+        if seconds > 0:
+            time.sleep(seconds)
+        self._count('replayed', 'replayed_seconds', seconds)
+        return ReplayedResponse(entry['response'])
+
+    def _record(self, key, meta, request_fn):
+        started = time.perf_counter()
+        response = request_fn()
+        seconds = time.perf_counter() - started
+        try:
+            data = response_to_data(response)
+        except TypeError:
+            return response  # Not storable (e.g. a client-specific object); the run goes on
+        self.store.save(key, dict(meta, version=CASSETTE_FORMAT_VERSION, key=key, latency_seconds=round(seconds, 4),
+                                  recorded_at=time.strftime('%Y-%m-%dT%H:%M:%S'), response=data))
+        self._count('recorded', 'recorded_seconds', seconds)
+        return response
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+        counters['replayed_seconds'] = round(counters['replayed_seconds'], 3)
+        counters['recorded_seconds'] = round(counters['recorded_seconds'], 3)
+        return dict(counters, mode=self.mode, folder=self.store.folder, latency_scale=self.latency_scale)
+
+
+def configure_cassettes(settings=None, folder='cassettes'):
+    """
+    Enable recording or replay for this process.
+
+    Args:
+        settings (dict): Overrides for DEFAULT_CASSETTE_SETTINGS (the 'cassettes' config section)
+        folder (str): Cassette folder (folders.cassettes)
+
+    Returns:
+        Cassettes: The active cassettes, or None when mode is 'off'
+    """
+    global _CASSETTES
+    options = dict(DEFAULT_CASSETTE_SETTINGS)
+    options.update({key: value for key, value in (settings or {}).items() if not key.startswith('_')})
+    with _CONFIGURE_LOCK:
+        if options['mode'] == 'off':
+            _CASSETTES = None
+            return None
+        _CASSETTES = Cassettes(options['mode'], folder, options['latency_scale'], options['on_miss'])
+        return _CASSETTES
+
+
+def get_cassettes():
+    """Return the active Cassettes, or None when recording and replay are off."""
+    return _CASSETTES
+
+
+def cassette_snapshot():
+    """Return the record/replay counters of this process ({} when off)."""
+    return _CASSETTES.snapshot() if _CASSETTES is not None else {}
@@ -0,0 +1,165 @@
+"""
+Circuit breakers for LLM provider endpoints.
+
+A breaker per 'Provider/model' stops sending traffic to an endpoint that keeps
+failing, so a failover chain moves on to the next provider immediately instead
+of waiting for every request to time out:
+
+- closed: calls go through; `failure_threshold` consecutive failures open it
+- open: calls are refused for `reset_timeout_seconds`
+- half-open: after the reset timeout one probe call is let through; success
+  closes the breaker, failure opens it again for another reset timeout
+
+Only errors that say something about the endpoint's health count as failures:
+rate limits, 5xx, overload, timeouts and connection errors. Errors caused by
+the request itself (a 400 for an invalid image, an unsupported format) leave
+the breaker alone, so a few bad images cannot lock out a healthy provider.
+"""
+
+import threading
+import time
+
+from services.rate_limiter import classify_llm_error
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+DEFAULT_BREAKER_SETTINGS = {
+    'failure_threshold': 3,
+    'reset_timeout_seconds': 60
+}
+
+_BREAKERS = {}
+_BREAKERS_LOCK = threading.Lock()
+
+
+def is_provider_failure(exc):
+    """
+    Decide whether an error reflects the endpoint's health rather than the request.
+
+    Wrapped errors (raise ... from sdk_error) are judged by their causes as well.
+
+    Args:
+        exc (Exception): Error of a failed call
+
+    Returns:
+        bool: True for rate limits, 5xx, overload, timeouts and connection errors
+    """
+    while exc is not None:
+        if isinstance(exc, TimeoutError) or classify_llm_error(exc)['retryable']:
+            return True
+        exc = exc.__cause__
+    return False
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a single half-open probe."""
+
+    def __init__(self, key, settings=None):
+        self.key = key
+        self.settings = dict(DEFAULT_BREAKER_SETTINGS)
+        self.settings.update({k: v for k, v in (settings or {}).items() if k in DEFAULT_BREAKER_SETTINGS})
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """
+        Decide whether a call may be sent now.
+
+        Returns:
+            bool: True if the call may proceed (in half-open state only one probe is allowed)
+        """
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN:
+                if time.monotonic() - self.opened_at < self.settings['reset_timeout_seconds']:
+                    return False
+                self.state = HALF_OPEN
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == HALF_OPEN or self.consecutive_failures >= self.settings['failure_threshold']:
+                if self.state != OPEN:
+                    self.trips += 1
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def record_error(self, exc):
+        """
+        Judge the endpoint by a failed call.
+
+        Args:
+            exc (Exception): Error of the call
+
+        Returns:
+            bool: True if the error counted as a failure (see is_provider_failure());
+            otherwise only a half-open probe slot is given back
+        """
+        if is_provider_failure(exc):
+            self.record_failure()
+            return True
+        self.release()
+        return False
+
+    def release(self):
+        """Give back a half-open probe slot without judging the endpoint (e.g. the caller ran out of time)."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self):
+        """
+        Return the breaker state.
+
+        Returns:
+            dict: {state, consecutive_failures, trips}
+        """
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.consecutive_failures,
+                'trips': self.trips
+            }
+
+
+def get_circuit_breaker(key, settings=None):
+    """
+    Return the process-wide breaker for an endpoint, creating it on first use.
+
+    Args:
+        key (str): Endpoint key, e.g. 'Claude/claude-sonnet-4-20250514'
+        settings (dict): Overrides for DEFAULT_BREAKER_SETTINGS (used on creation)
+
+    Returns:
+        CircuitBreaker: Shared breaker
+    """
+    with _BREAKERS_LOCK:
+        breaker = _BREAKERS.get(key)
+        if breaker is None:
+            breaker = CircuitBreaker(key, settings)
+            _BREAKERS[key] = breaker
+        return breaker
+
+
+def circuit_snapshot():
+    """Return {endpoint key: snapshot} for every breaker used in this process."""
+    with _BREAKERS_LOCK:
+        breakers = list(_BREAKERS.values())
+    return {breaker.key: breaker.snapshot() for breaker in breakers}
@@ -0,0 +1,207 @@
+"""
+Adaptive (AIMD) concurrency control for LLM calls.
+
+Each provider endpoint ('Provider/model') gets a window of allowed in-flight
+requests, adjusted like TCP congestion control:
+
+- additive increase: every successful call with healthy latency grows the
+  window by `increase / window`, i.e. about `increase` per full window
+- multiplicative decrease: a 429, 5xx, overload or timeout multiplies the
+  window by `decrease_factor` (at most once per `cooldown_seconds`, so a
+  burst of failures from the same congestion event only counts once)
+
+Latency is healthy while a call takes at most `latency_tolerance` times the
+best smoothed latency seen so far; slower calls hold the window steady.
+
+A slot is held until the provider call really returns: a call abandoned by
+call_with_timeout() keeps its slot while the SDK request is still running,
+so the number of requests in flight never exceeds the window.
+"""
+
+import math
+import threading
+import time
+
+DEFAULT_CONCURRENCY_SETTINGS = {
+    'initial_window': 2,
+    'min_window': 1,
+    'max_window': 16,
+    'increase': 1.0,
+    'decrease_factor': 0.5,
+    'latency_tolerance': 2.0,
+    'cooldown_seconds': 2.0
+}
+
+# EWMA weight of the newest latency sample
+LATENCY_SMOOTHING = 0.2
+
+_CONTROLLERS = {}
+_CONTROLLERS_LOCK = threading.Lock()
+
+
+class AIMDController:
+    """Concurrency window for one provider endpoint, adjusted from call outcomes."""
+
+    def __init__(self, key, settings=None):
+        self.key = key
+        self.settings = dict(DEFAULT_CONCURRENCY_SETTINGS)
+        self.settings.update({k: v for k, v in (settings or {}).items() if k in DEFAULT_CONCURRENCY_SETTINGS})
+        self.window = float(min(max(self.settings['initial_window'], self.settings['min_window']),
+                                self.settings['max_window']))
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.waiting = 0
+        self.latency_ewma = None
+        self.latency_baseline = None
+        self.increases = 0
+        self.decreases = 0
+        self.last_decrease_reason = None
+        self._last_decrease_at = 0.0
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        """Whole number of requests currently allowed in flight."""
+        return max(int(math.floor(self.window)), 1)
+
+    def acquire(self, timeout=None):
+        """
+        Block until a slot in the window is free.
+
+        Args:
+            timeout (float): Seconds to wait at most, None for no limit
+
+        Returns:
+            bool: True when a slot was taken, False when the timeout ran out first
+        """
+        expires_at = time.monotonic() + timeout if timeout is not None else None
+        with self._condition:
+            self.waiting += 1
+            try:
+                while self.in_flight >= self.limit:
+                    if expires_at is None:
+                        self._condition.wait()
+                        continue
+                    remaining = expires_at - time.monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._condition.wait(remaining)
+            finally:
+                self.waiting -= 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            return True
+
+    def release(self, congested=False, latency=None, reason=None):
+        """
+        Free a slot and adjust the window from the call outcome.
+
+        Args:
+            congested (bool): The call hit a 429, 5xx, overload or timeout
+            latency (float): Call duration in seconds (successful calls)
+            reason (str): Short description of the congestion signal
+        """
+        with self._condition:
+            self.in_flight -= 1
+            if congested:
+                self._decrease(reason)
+            elif latency is not None:
+                self._observe_latency(latency)
+            self._condition.notify_all()
+
+    def record_congestion(self, reason):
+        """Shrink the window for a congestion signal seen outside a slot (e.g. an abandoned call)."""
+        with self._condition:
+            self._decrease(reason)
+
+    def run(self, fn, classify=None):
+        """
+        Run fn() in a slot taken with acquire() and release it with the outcome.
+
+        Args:
+            fn (callable): The request attempt
+            classify (callable): exc -> reason string if the exception signals
+                congestion, else None; exceptions are always re-raised
+
+        Returns:
+            Whatever fn() returns; exceptions are re-raised
+        """
+        start = time.perf_counter()
+        try:
+            result = fn()
+        except BaseException as exc:
+            reason = classify(exc) if classify else None
+            self.release(congested=reason is not None, reason=reason)
+            raise
+        self.release(latency=time.perf_counter() - start)
+        return result
+
+    def _observe_latency(self, latency):
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += LATENCY_SMOOTHING * (latency - self.latency_ewma)
+        if self.latency_baseline is None or self.latency_ewma < self.latency_baseline:
+            self.latency_baseline = self.latency_ewma
+
+        if latency <= self.latency_baseline * self.settings['latency_tolerance']:
+            previous = self.limit
+            self.window = min(self.window + self.settings['increase'] / self.window, self.settings['max_window'])
+            if self.limit > previous:
+                self.increases += 1
+
+    def _decrease(self, reason):
+        now = time.monotonic()
+        if now - self._last_decrease_at < self.settings['cooldown_seconds']:
+            return
+        self._last_decrease_at = now
+        self.window = max(self.window * self.settings['decrease_factor'], self.settings['min_window'])
+        self.decreases += 1
+        self.last_decrease_reason = reason
+
+    def snapshot(self):
+        """
+        Return the current controller state.
+
+        Returns:
+            dict: {window, limit, in_flight, waiting, max_in_flight, latency_ewma_seconds,
+                   increases, decreases, last_decrease_reason}
+        """
+        with self._condition:
+            return {
+                'window': round(self.window, 2),
+                'limit': self.limit,
+                'in_flight': self.in_flight,
+                'waiting': self.waiting,
+                'max_in_flight': self.max_in_flight,
+                'latency_ewma_seconds': round(self.latency_ewma, 3) if self.latency_ewma is not None else None,
+                'increases': self.increases,
+                'decreases': self.decreases,
+                'last_decrease_reason': self.last_decrease_reason
+            }
+
+
+def get_concurrency_controller(key, settings=None):
+    """
+    Return the process-wide controller for a provider endpoint, creating it on first use.
+
+    Args:
+        key (str): Endpoint key, e.g. 'OpenAI/gpt-4o'
+        settings (dict): Overrides for DEFAULT_CONCURRENCY_SETTINGS (used on creation)
+
+    Returns:
+        AIMDController: Shared controller
+    """
+    with _CONTROLLERS_LOCK:
+        controller = _CONTROLLERS.get(key)
+        if controller is None:
+            controller = AIMDController(key, settings)
+            _CONTROLLERS[key] = controller
+        return controller
+
+
+def concurrency_snapshot():
+    """Return {endpoint key: snapshot} for every controller used in this process."""
+    with _CONTROLLERS_LOCK:
+        controllers = list(_CONTROLLERS.values())
+    return {controller.key: controller.snapshot() for controller in controllers}
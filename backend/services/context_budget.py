@@ -0,0 +1,81 @@
+"""
+Token budget for the page context sent with each image.
+
+grab_context() collects context pieces (alt text, title, caption, headings,
+nearby text, section text). Character limits per piece do not bound the prompt,
+and section text in particular often carries navigation boilerplate. The
+budgeter ranks pieces by how close they are to the image and keeps them, best
+first, until the token budget is full; the piece that crosses the budget is
+truncated at a word boundary when enough room is left, the rest are dropped.
+Kept pieces stay in their original order.
+"""
+
+# Lower rank = closer to the image = kept first
+PIECE_RANKS = {
+    'alt_text': 0,
+    'title': 1,
+    'caption': 2,
+    'nearest_heading': 3,
+    'nearby_text': 4,
+    'heading': 5,
+    'section_text': 6
+}
+
+# Smallest useful remainder of a truncated piece
+MIN_TRUNCATED_TOKENS = 24
+
+
+def _truncate_to_tokens(text, tokens, count_tokens):
+    # Shrink by the observed characters-per-token ratio until the text fits
+    cut = text
+    while cut and count_tokens(cut + "...") > tokens:
+        ratio = tokens / float(count_tokens(cut + "..."))
+        target = max(int(len(cut) * ratio) - 1, 0)
+        cut = cut[:target]
+        if ' ' in cut:
+            cut = cut[:cut.rfind(' ')]
+    cut = cut.rstrip(' ,;:.')
+    return cut + "..." if cut else ""
+
+
+def budget_context(pieces, budget_tokens, count_tokens):
+    """
+    Keep the context pieces closest to the image within a token budget.
+
+    Args:
+        pieces (list): [{'kind': one of PIECE_RANKS, 'text': str}, ...] in collection order
+        budget_tokens (int): Token budget for all pieces, 0 or None for no limit
+        count_tokens (callable): text -> token count for the target provider
+
+    Returns:
+        tuple: (kept pieces in original order, stats) where stats is
+               {'budget_tokens', 'estimated_tokens', 'truncated': [kinds], 'dropped': [kinds]}
+    """
+    costs = [count_tokens(piece['text']) for piece in pieces]
+    if not budget_tokens:
+        return list(pieces), {'budget_tokens': None, 'estimated_tokens': sum(costs), 'truncated': [], 'dropped': []}
+
+    order = sorted(range(len(pieces)), key=lambda i: (PIECE_RANKS.get(pieces[i]['kind'], len(PIECE_RANKS)), i))
+    kept = {}
+    used = 0
+    truncated = []
+    dropped = []
+    for i in order:
+        piece = pieces[i]
+        remaining = budget_tokens - used
+        if costs[i] <= remaining:
+            kept[i] = piece
+            used += costs[i]
+        elif remaining >= MIN_TRUNCATED_TOKENS:
+            text = _truncate_to_tokens(piece['text'], remaining, count_tokens)
+            if text:
+                kept[i] = dict(piece, text=text)
+                used += count_tokens(text)
+                truncated.append(piece['kind'])
+            else:
+                dropped.append(piece['kind'])
+        else:
+            dropped.append(piece['kind'])
+
+    stats = {'budget_tokens': budget_tokens, 'estimated_tokens': used, 'truncated': truncated, 'dropped': dropped}
+    return [kept[i] for i in sorted(kept)], stats
@@ -0,0 +1,192 @@
+"""
+Precomputed text spans for image context extraction.
+
+grab_context() used to call get_text() on every ancestor and find_all() for
+headings, captions and siblings, which re-walks the same subtrees for every
+image on the page. ContextIndex walks a BeautifulSoup document once and records,
+for every tag, its range of descendant tags and of descendant strings, plus
+ordered positions of headings, figcaptions and sibling-candidate tags.
+Per-image context then comes from slices and bisections over these lists.
+
+Text produced here is identical to BeautifulSoup's:
+- text(tag) == tag.get_text().strip()
+- section_text(tag) == ' '.join(tag.get_text(separator=' ', strip=True).split())
+- headings_in(tag), first_figcaption(tag) and sibling_candidates(tag) follow
+  find_all() document order and exclude the tag itself
+"""
+
+from bisect import bisect_left, bisect_right
+
+from bs4 import CData, NavigableString, Tag
+
+HEADING_TAGS = ('h1', 'h2', 'h3', 'h4', 'h5', 'h6')
+SIBLING_TAGS = ('p', 'span', 'div')
+
+
+class ContextIndex:
+    """
+    One-pass index over a BeautifulSoup document.
+
+    Tags are numbered in document (pre-)order; the document itself is position 0.
+    For a tag at position p, its descendants occupy positions (p, tag_end[p]) and
+    its text is strings[string_start[p]:string_end[p]].
+    """
+
+    def __init__(self, soup):
+        self.soup = soup
+        # get_text() only yields strings whose exact type is one of these
+        # (comments, <script>/<style> contents etc. are skipped)
+        string_types = getattr(soup, 'interesting_string_types', (NavigableString, CData))
+        if isinstance(string_types, type):
+            string_types = (string_types,)
+        string_types = tuple(string_types)
+
+        self._position = {}      # id(tag) -> position
+        self._tag_end = []       # position -> first position after its subtree
+        self._string_start = []  # position -> index of first descendant string
+        self._string_end = []    # position -> index after last descendant string
+        self._tags = []          # position -> Tag
+        self.strings = []        # raw strings, document order
+        self._normalized = []    # ' '.join(string.split()) per string
+        self._heading_positions = []
+        self._figcaption_positions = []
+        self._sibling_positions = []
+        self._text_cache = {}
+
+        # Single iterative pass: a tag's span closes when the walk leaves its subtree
+        self._open_tag(soup)
+        stack = [soup]
+        for element in soup.descendants:
+            parent = element.parent
+            while stack[-1] is not parent:
+                self._close_tag(stack.pop())
+
+            if isinstance(element, Tag):
+                position = self._open_tag(element)
+                name = element.name
+                if name in HEADING_TAGS:
+                    self._heading_positions.append(position)
+                elif name == 'figcaption':
+                    self._figcaption_positions.append(position)
+                if name in SIBLING_TAGS:
+                    self._sibling_positions.append(position)
+                stack.append(element)
+            elif type(element) in string_types:
+                self.strings.append(str(element))
+                self._normalized.append(' '.join(element.split()))
+
+        while stack:
+            self._close_tag(stack.pop())
+
+    def _open_tag(self, tag):
+        position = len(self._tags)
+        self._position[id(tag)] = position
+        self._tags.append(tag)
+        self._tag_end.append(None)
+        self._string_start.append(len(self.strings))
+        self._string_end.append(None)
+        return position
+
+    def _close_tag(self, tag):
+        position = self._position[id(tag)]
+        self._tag_end[position] = len(self._tags)
+        self._string_end[position] = len(self.strings)
+
+    def _tags_at(self, positions):
+        return [self._tags[p] for p in positions]
+
+    def position(self, tag):
+        """Return the document position of a tag from the indexed soup."""
+        return self._position[id(tag)]
+
+    def text(self, tag):
+        """Equivalent of tag.get_text().strip(), cached per tag."""
+        position = self.position(tag)
+        cached = self._text_cache.get(position)
+        if cached is None:
+            cached = ''.join(self.strings[self._string_start[position]:self._string_end[position]]).strip()
+            self._text_cache[position] = cached
+        return cached
+
+    def bounded_text(self, tag, max_length):
+        """
+        Equivalent of tag.get_text().strip() when shorter than max_length.
+
+        Returns None as soon as the stripped text is known to reach max_length,
+        without materializing the rest of a large subtree.
+        """
+        position = self.position(tag)
+        pieces = []
+        offset = 0
+        first = None
+        last_end = 0
+        for string in self.strings[self._string_start[position]:self._string_end[position]]:
+            pieces.append(string)
+            stripped_left = string.lstrip()
+            if stripped_left:
+                if first is None:
+                    first = offset + len(string) - len(stripped_left)
+                last_end = offset + len(string.rstrip())
+                if last_end - first >= max_length:
+                    return None
+            offset += len(string)
+        return ''.join(pieces).strip()
+
+    def section_text(self, tag, max_length):
+        """
+        Whitespace-normalized text of a tag, cut just past max_length characters.
+
+        The result equals ' '.join(tag.get_text(separator=' ', strip=True).split())
+        whenever that is at most max_length characters long; otherwise it is a
+        longer prefix of it, so callers truncating to max_length get the same text.
+        """
+        position = self.position(tag)
+        parts = []
+        length = -1
+        for normalized in self._normalized[self._string_start[position]:self._string_end[position]]:
+            if not normalized:
+                continue
+            parts.append(normalized)
+            length += len(normalized) + 1
+            if length > max_length:
+                break
+        return ' '.join(parts)
+
+    def _positions_within(self, positions, start, end):
+        # Positions strictly inside (start, end), i.e. descendants of the tag at start
+        return positions[bisect_right(positions, start):bisect_left(positions, end)]
+
+    def headings_in(self, tag, exclude=None):
+        """
+        Headings that tag.find_all(HEADING_TAGS) would return, in document order.
+
+        Args:
+            tag: Tag from the indexed soup
+            exclude: Optional descendant tag whose headings have already been visited;
+                they are skipped (the remaining order is unchanged)
+
+        Returns:
+            list: Heading tags
+        """
+        position = self.position(tag)
+        end = self._tag_end[position]
+        if exclude is None:
+            return self._tags_at(self._positions_within(self._heading_positions, position, end))
+
+        inner = self.position(exclude)
+        inner_end = self._tag_end[inner]
+        before = self._positions_within(self._heading_positions, position, inner + 1)
+        after = self._positions_within(self._heading_positions, inner_end - 1, end)
+        return self._tags_at(before + after)
+
+    def first_figcaption(self, tag):
+        """Equivalent of tag.find('figcaption')."""
+        position = self.position(tag)
+        found = self._positions_within(self._figcaption_positions, position, self._tag_end[position])
+        return self._tags_at(found[:1])[0] if found else None
+
+    def sibling_candidates(self, tag, limit=3):
+        """Equivalent of tag.find_all(SIBLING_TAGS, limit=limit)."""
+        position = self.position(tag)
+        found = self._positions_within(self._sibling_positions, position, self._tag_end[position])
+        return self._tags_at(found[:limit])
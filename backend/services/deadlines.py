@@ -0,0 +1,198 @@
+"""
+Per-step timeouts and per-image deadlines for LLM calls.
+
+An image deadline is a time budget for all LLM work on one image (vision,
+processing and every translation). It is bound to the thread processing the
+image, so call sites deep in the pipeline can ask how much time is left
+without it being passed through every function signature.
+
+Each call gets min(step timeout, time left on the image deadline). The
+provider SDKs receive that value as their own request timeout, and
+call_with_timeout() enforces it as a hard bound for SDKs that ignore it.
+
+A timed-out call is only retried when the image deadline leaves room for
+another full step timeout (see mark_timeout_retryable()); otherwise the retry
+would just burn the rest of the budget and time out again.
+"""
+
+import contextlib
+import threading
+import time
+
+
+class LLMTimeoutError(TimeoutError):
+    """Raised when an LLM call exceeds its step timeout."""
+
+    retryable = None  # Left to classify_llm_error() unless set by mark_timeout_retryable()
+
+    def __init__(self, step, timeout, message=None):
+        self.step = step
+        self.timeout = timeout
+        super().__init__(message or f"{step} call timed out after {timeout:.1f}s")
+
+
+class DeadlineExceededError(LLMTimeoutError):
+    """Raised when the image deadline has no time left; never retried."""
+
+    retryable = False
+
+    def __init__(self, step, budget):
+        super().__init__(step, 0.0, f"{step} call skipped: image deadline of {budget:.1f}s exceeded")
+        self.budget = budget
+
+
+class ImageDeadline:
+    """Time budget for one image, plus the timeouts recorded while it was active."""
+
+    def __init__(self, budget_seconds):
+        self.budget = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds if budget_seconds else None
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Seconds left, or None when the budget is unlimited."""
+        if self.expires_at is None:
+            return None
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+    def record_timeout(self, step, timeout_seconds, reason):
+        """
+        Record a timed-out call.
+
+        Args:
+            step (str): 'vision', 'processing' or 'translation'
+            timeout_seconds (float): Timeout that applied to the call
+            reason (str): 'step_timeout' or 'image_deadline'
+        """
+        with self._lock:
+            self.timeouts.append({
+                'step': step,
+                'timeout_seconds': round(timeout_seconds, 2),
+                'reason': reason
+            })
+
+
+_ACTIVE = threading.local()
+
+
+def current_image_deadline():
+    """Return the ImageDeadline of the calling thread, or None."""
+    return getattr(_ACTIVE, 'deadline', None)
+
+
+@contextlib.contextmanager
+def image_deadline(budget_seconds):
+    """
+    Bind a deadline to the current thread for the duration of the block.
+
+    Nested use keeps the outer deadline, so a caller that already set a budget
+    for an image is not extended by an inner one.
+
+    Args:
+        budget_seconds (float): Total seconds allowed, 0 or None for no limit
+
+    Yields:
+        ImageDeadline: The active deadline
+    """
+    outer = current_image_deadline()
+    if outer is not None:
+        yield outer
+        return
+    deadline = ImageDeadline(budget_seconds)
+    _ACTIVE.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _ACTIVE.deadline = None
+
+
+def propagate_deadline(fn):
+    """
+    Wrap fn so that it runs under the calling thread's image deadline.
+
+    Used for work handed to other threads (e.g. hedged requests) that must
+    respect the same budget.
+    """
+    deadline = current_image_deadline()
+
+    def run(*args, **kwargs):
+        previous = current_image_deadline()
+        _ACTIVE.deadline = deadline
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _ACTIVE.deadline = previous
+    return run
+
+
+def effective_timeout(step_timeout):
+    """
+    Combine a step timeout with the time left on the current image deadline.
+
+    Args:
+        step_timeout (float): Configured timeout for the step, 0 or None for none
+
+    Returns:
+        tuple: (seconds or None for no limit, 'step_timeout' or 'image_deadline')
+    """
+    deadline = current_image_deadline()
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is not None and (not step_timeout or remaining < step_timeout):
+        return remaining, 'image_deadline'
+    return (step_timeout or None), 'step_timeout'
+
+
+def mark_timeout_retryable(exc, step_timeout):
+    """
+    Decide whether a timed-out call may be retried within the current image deadline.
+
+    Args:
+        exc (LLMTimeoutError): The timeout; its `retryable` is set to False when
+            the image deadline has less than a full step timeout left
+        step_timeout (float): Configured timeout for the step, 0 or None for none
+
+    Returns:
+        LLMTimeoutError: exc
+    """
+    deadline = current_image_deadline()
+    remaining = deadline.remaining() if deadline is not None else None
+    if remaining is not None and (not step_timeout or remaining < step_timeout):
+        exc.retryable = False
+    return exc
+
+
+def call_with_timeout(fn, timeout, step):
+    """
+    Run fn() and give up waiting after `timeout` seconds.
+
+    The call runs on a daemon thread; on timeout it is abandoned (the SDK's own
+    request timeout closes the connection) and LLMTimeoutError is raised.
+
+    Args:
+        fn (callable): The provider call
+        timeout (float): Seconds to wait, None to call fn() directly
+        step (str): Step name for the error
+
+    Returns:
+        Whatever fn() returns; exceptions from fn() are re-raised
+    """
+    if timeout is None:
+        return fn()
+
+    outcome = {}
+
+    def run():
+        try:
+            outcome['value'] = fn()
+        except BaseException as exc:
+            outcome['error'] = exc
+
+    worker = threading.Thread(target=run, name=f"llm-{step}", daemon=True)
+    worker.start()
+    worker.join(timeout)
+    if worker.is_alive():
+        raise LLMTimeoutError(step, timeout)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('value')
@@ -0,0 +1,195 @@
+"""
+Hedged requests for slow LLM calls.
+
+A hedged call starts the primary request and waits up to a hedge delay, taken
+as a percentile of recent latencies of the same step. If the primary has not
+answered by then, a duplicate request is started (same or secondary provider)
+and whichever finishes first successfully wins. The loser is cancelled: its
+result is discarded and it makes no further attempts or retries (an HTTP
+request already in flight runs to its own timeout).
+
+Hedges are capped to `max_hedge_fraction` of all calls so the extra cost is
+bounded, and no hedging happens until `min_samples` latencies are known.
+"""
+
+import math
+import queue
+import threading
+import time
+from collections import deque
+
+DEFAULT_HEDGING_SETTINGS = {
+    'percentile': 95,
+    'min_samples': 20,
+    'window': 200,
+    'min_delay_seconds': 2.0,
+    'max_hedge_fraction': 0.1
+}
+
+_ACTIVE = threading.local()
+_HEDGERS = {}
+_HEDGERS_LOCK = threading.Lock()
+
+
+class HedgeCancelledError(Exception):
+    """Raised inside a hedged branch that lost the race; never retried."""
+
+    retryable = False
+
+
+def hedge_cancelled():
+    """Return True if the calling thread runs a hedged branch that has lost."""
+    event = getattr(_ACTIVE, 'cancel_event', None)
+    return event is not None and event.is_set()
+
+
+class Hedger:
+    """Latency tracking, hedge delay and hedge budget for one step."""
+
+    def __init__(self, name, settings=None):
+        self.name = name
+        self.settings = dict(DEFAULT_HEDGING_SETTINGS)
+        self.settings.update({k: v for k, v in (settings or {}).items() if k in DEFAULT_HEDGING_SETTINGS})
+        self.latencies = deque(maxlen=int(self.settings['window']))
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+
+    def record_latency(self, seconds):
+        with self._lock:
+            self.latencies.append(seconds)
+
+    def hedge_delay(self):
+        """
+        Seconds to wait for the primary before hedging.
+
+        Returns:
+            float: The configured percentile of recent latencies (at least
+                   min_delay_seconds), or None while there are too few samples
+        """
+        with self._lock:
+            if len(self.latencies) < self.settings['min_samples']:
+                return None
+            ordered = sorted(self.latencies)
+        index = min(int(math.ceil(self.settings['percentile'] / 100.0 * len(ordered))) - 1, len(ordered) - 1)
+        return max(ordered[max(index, 0)], self.settings['min_delay_seconds'])
+
+    def _take_hedge_budget(self):
+        with self._lock:
+            if self.hedges + 1 > self.settings['max_hedge_fraction'] * self.calls:
+                return False
+            self.hedges += 1
+            return True
+
+    def run(self, primary, hedge=None, wrap=None):
+        """
+        Run primary(), hedging with hedge() if it is slow.
+
+        Args:
+            primary (callable): The normal request
+            hedge (callable): The duplicate request, None to disable hedging for this call
+            wrap (callable): wrap(fn) -> fn that restores the caller's thread context
+                (e.g. the image deadline) inside worker threads
+
+        Returns:
+            tuple: (result, hedged) where hedged is True if the hedge won
+
+        Raises:
+            The primary's exception when every started request failed
+        """
+        with self._lock:
+            self.calls += 1
+        delay = self.hedge_delay() if hedge is not None else None
+        start = time.perf_counter()
+
+        if delay is None:
+            result = primary()
+            self.record_latency(time.perf_counter() - start)
+            return result, False
+
+        wrap = wrap or (lambda fn: fn)
+        outcomes = queue.Queue()
+        cancel_events = {'primary': threading.Event(), 'hedge': threading.Event()}
+
+        def launch(label, fn):
+            def run_branch():
+                _ACTIVE.cancel_event = cancel_events[label]
+                try:
+                    outcomes.put((label, True, fn()))
+                except BaseException as exc:
+                    outcomes.put((label, False, exc))
+                finally:
+                    _ACTIVE.cancel_event = None
+            threading.Thread(target=wrap(run_branch), name=f"hedge-{self.name}-{label}", daemon=True).start()
+
+        launch('primary', primary)
+        started = 1
+        try:
+            first = outcomes.get(timeout=delay)
+        except queue.Empty:
+            first = None
+            if self._take_hedge_budget():
+                launch('hedge', hedge)
+                started = 2
+
+        errors = {}
+        finished = 0
+        while True:
+            label, ok, value = first if first is not None else outcomes.get()
+            first = None
+            finished += 1
+            if ok:
+                for other, event in cancel_events.items():
+                    if other != label:
+                        event.set()
+                self.record_latency(time.perf_counter() - start)
+                if label == 'hedge':
+                    with self._lock:
+                        self.hedge_wins += 1
+                return value, label == 'hedge'
+            errors[label] = value
+            if finished >= started:
+                raise errors.get('primary') or errors[label]
+
+    def snapshot(self):
+        """
+        Return hedging counters.
+
+        Returns:
+            dict: {calls, hedges, hedge_wins, hedge_delay_seconds}
+        """
+        delay = self.hedge_delay()
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'hedges': self.hedges,
+                'hedge_wins': self.hedge_wins,
+                'hedge_delay_seconds': round(delay, 3) if delay is not None else None
+            }
+
+
+def get_hedger(name, settings=None):
+    """
+    Return the process-wide hedger for a step, creating it on first use.
+
+    Args:
+        name (str): Step name, e.g. 'vision'
+        settings (dict): Overrides for DEFAULT_HEDGING_SETTINGS (used on creation)
+
+    Returns:
+        Hedger: Shared hedger
+    """
+    with _HEDGERS_LOCK:
+        hedger = _HEDGERS.get(name)
+        if hedger is None:
+            hedger = Hedger(name, settings)
+            _HEDGERS[name] = hedger
+        return hedger
+
+
+def hedging_snapshot():
+    """Return {step: snapshot} for every hedger used in this process."""
+    with _HEDGERS_LOCK:
+        hedgers = list(_HEDGERS.values())
+    return {hedger.name: hedger.snapshot() for hedger in hedgers}
@@ -0,0 +1,170 @@
+"""
+Pluggable HTML parser backends.
+
+BeautifulSoup's pure-Python 'html.parser' is the slowest backend. This module
+resolves the configured html_parsing.backend setting to the fastest installed
+parser and builds documents for the two kinds of callers in app.py:
+
+- Extraction-only paths (download_images_from_url) only need image-bearing tags.
+  They get a SoupStrainer-filtered BeautifulSoup tree, or a lightweight
+  selectolax document exposing the same find/find_all/get interface. Generic
+  containers (div) are only kept when they carry an image attribute; keeping
+  every div subtree would keep nearly the whole page.
+- Context extraction (grab_context) walks parents and siblings, so it always
+  gets a full BeautifulSoup tree (lxml or html.parser).
+"""
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+# Optional fast parsers
+try:
+    import lxml  # noqa: F401 - only needed as a BeautifulSoup tree builder
+    LXML_AVAILABLE = True
+except ImportError:
+    LXML_AVAILABLE = False
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser
+    SELECTOLAX_AVAILABLE = True
+except ImportError:
+    try:
+        from selectolax.parser import HTMLParser as _SelectolaxParser
+        SELECTOLAX_AVAILABLE = True
+    except ImportError:
+        _SelectolaxParser = None
+        SELECTOLAX_AVAILABLE = False
+
+try:
+    import html5lib  # noqa: F401
+    HTML5LIB_AVAILABLE = True
+except ImportError:
+    HTML5LIB_AVAILABLE = False
+
+SUPPORTED_BACKENDS = ('auto', 'selectolax', 'lxml', 'html5lib', 'html.parser')
+
+
+def is_backend_available(backend):
+    """Return True if the given backend can be used in this environment."""
+    if backend == 'lxml':
+        return LXML_AVAILABLE
+    if backend == 'selectolax':
+        return SELECTOLAX_AVAILABLE
+    if backend == 'html5lib':
+        return HTML5LIB_AVAILABLE
+    return backend == 'html.parser'
+
+
+def resolve_backend(configured='auto', tree_required=False):
+    """
+    Resolve a configured backend name to one that is installed.
+
+    Args:
+        configured (str): Value of html_parsing.backend
+        tree_required (bool): True when the caller navigates the tree (parents,
+            siblings, get_text with separators). selectolax is then replaced by
+            the best BeautifulSoup tree builder.
+
+    Returns:
+        str: One of 'selectolax', 'lxml', 'html5lib', 'html.parser'
+    """
+    configured = (configured or 'auto').lower()
+
+    if configured == 'selectolax' and tree_required:
+        configured = 'auto'
+
+    if configured != 'auto' and is_backend_available(configured):
+        return configured
+
+    # auto (or unavailable choice): fastest installed BeautifulSoup-compatible option
+    if not tree_required and configured in ('auto', 'selectolax') and SELECTOLAX_AVAILABLE:
+        return 'selectolax'
+    if LXML_AVAILABLE:
+        return 'lxml'
+    return 'html.parser'
+
+
+class SelectolaxElement:
+    """Minimal BeautifulSoup-like wrapper around a selectolax node."""
+
+    __slots__ = ('_node',)
+
+    def __init__(self, node):
+        self._node = node
+
+    @property
+    def name(self):
+        return self._node.tag
+
+    def get(self, attr, default=None):
+        value = self._node.attributes.get(attr)
+        return default if value is None else value
+
+    def find_all(self, name):
+        if isinstance(name, (list, tuple)):
+            name = ', '.join(name)
+        return [SelectolaxElement(node) for node in self._node.css(name)]
+
+    def find(self, name):
+        node = self._node.css_first(name)
+        return SelectolaxElement(node) if node is not None else None
+
+    def get_text(self):
+        return self._node.text(deep=True)
+
+
+class ExtractionStrainer(SoupStrainer):
+    """
+    SoupStrainer keeping some tags only when they carry one of the given attributes.
+
+    Args:
+        tags (list): Tag names kept unconditionally
+        tag_attrs (dict): {tag name: [attribute names]}; these tags are kept only
+            when one of the attributes has a value
+    """
+
+    def __init__(self, tags, tag_attrs=None):
+        super().__init__(list(tags) + list(tag_attrs or {}))
+        self.tag_attrs = {name: tuple(attrs) for name, attrs in (tag_attrs or {}).items()}
+
+    def allow_tag_creation(self, nsprefix, name, attrs):
+        if name in self.tag_attrs:
+            return any((attrs or {}).get(attr) for attr in self.tag_attrs[name])
+        return super().allow_tag_creation(nsprefix, name, attrs)
+
+
+def parse_for_extraction(markup, backend, tags, tag_attrs=None):
+    """
+    Parse markup keeping only the tags an extraction pass needs.
+
+    Args:
+        markup (bytes|str): Page markup
+        backend (str): Resolved backend name (see resolve_backend)
+        tags (list): Tag names to materialize (their subtrees are kept as well)
+        tag_attrs (dict): {tag name: [attribute names]} for tags to materialize only
+            when they carry one of the attributes, e.g. {'div': ['data-image']}
+
+    Returns:
+        BeautifulSoup or SelectolaxElement: Document supporting find/find_all/get
+    """
+    if backend == 'selectolax':
+        return SelectolaxElement(_SelectolaxParser(markup).root)
+
+    # html5lib ignores parse_only, so only strain for the other builders
+    parse_only = ExtractionStrainer(tags, tag_attrs) if (tags or tag_attrs) and backend != 'html5lib' else None
+    return BeautifulSoup(markup, backend, parse_only=parse_only)
+
+
+def parse_tree(markup, backend):
+    """
+    Parse markup into a full BeautifulSoup tree.
+
+    Args:
+        markup (bytes|str): Page markup
+        backend (str): Resolved backend name; 'selectolax' falls back to a tree builder
+
+    Returns:
+        BeautifulSoup: Full document tree
+    """
+    if backend == 'selectolax' or not is_backend_available(backend):
+        backend = resolve_backend('auto', tree_required=True)
+    return BeautifulSoup(markup, backend)
@@ -0,0 +1,279 @@
+"""
+Incremental HTML scanning for image candidates.
+
+Used by download_images_from_url() when only a limited number of images is
+requested (e.g. the web UI default of 1 image). Instead of downloading the whole
+page and building a full BeautifulSoup tree, the response is streamed chunk by
+chunk into an html.parser based scanner that records image candidates as soon as
+their tags are seen. Reading stops once enough candidates - plus a window of
+surrounding markup for context extraction - have been captured.
+
+The candidate list returned follows the same ordering and de-duplication rules
+as the BeautifulSoup extraction in download_images_from_url() (all <img> tags
+first, then <picture>, <div>, <link> and <meta>), so an early-terminated scan
+yields the same leading candidates as a full parse.
+"""
+
+import codecs
+import re
+from html.parser import HTMLParser
+
+# Order in which download_images_from_url() collects candidates per tag type
+TAG_PRIORITY = ['img', 'picture', 'div', 'link', 'meta']
+
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset=["\']?([\w\-]+)', re.IGNORECASE)
+
+
+def _first_attribute(attrs, attributes):
+    """
+    Return (value, attribute_name) for the first configured attribute with a value.
+
+    Mirrors get_image_url_and_attribute() for the attribute dict produced by html.parser.
+    """
+    for attr in attributes:
+        value = attrs.get(attr)
+        if value:
+            return (value, attr)
+    return (None, None)
+
+
+def sniff_encoding(first_chunk, declared_encoding=None):
+    """
+    Pick a text encoding for a streamed HTML response.
+
+    Args:
+        first_chunk (bytes): First bytes of the response body
+        declared_encoding (str): Charset from the Content-Type header, if any
+
+    Returns:
+        str: Encoding name usable by codecs
+    """
+    candidates = []
+    if declared_encoding:
+        candidates.append(declared_encoding)
+    match = _META_CHARSET_RE.search(first_chunk[:4096])
+    if match:
+        candidates.append(match.group(1).decode('ascii', 'ignore'))
+    candidates.append('utf-8')
+
+    for name in candidates:
+        try:
+            codecs.lookup(name)
+            return name
+        except LookupError:
+            continue
+    return 'utf-8'
+
+
+class ImageCandidateScanner(HTMLParser):
+    """
+    html.parser based scanner that collects image candidates while markup is fed.
+
+    Candidates are kept per tag type in document order so they can be merged in
+    the same priority order used by the BeautifulSoup extraction path.
+    """
+
+    def __init__(self, enabled_tags, enabled_attrs):
+        super().__init__(convert_charrefs=True)
+        self.enabled_tags = set(enabled_tags)
+        self.enabled_attrs = list(enabled_attrs)
+        self.page_title = None
+        self._title_parts = None
+        self.img_sources = []
+        self.pictures = []  # [{'sources': [...], 'img': {...} or None}]
+        self._open_pictures = []
+        self.div_sources = []
+        self.link_sources = []
+        self.meta_sources = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+
+        if tag == 'title' and self.page_title is None and self._title_parts is None:
+            self._title_parts = []
+            return
+
+        if tag == 'img':
+            url, attr_used = _first_attribute(attrs, self.enabled_attrs)
+            if url:
+                self.img_sources.append({'url': url, 'tag': 'img', 'attribute': attr_used})
+            for picture in self._open_pictures:
+                if picture['img'] is None:
+                    picture['img'] = {'url': url, 'attribute': attr_used}
+
+        elif tag == 'picture':
+            picture = {'sources': [], 'img': None}
+            self.pictures.append(picture)
+            self._open_pictures.append(picture)
+
+        elif tag == 'source':
+            if self._open_pictures:
+                url, attr_used = _first_attribute(attrs, self.enabled_attrs)
+                if url:
+                    for picture in self._open_pictures:
+                        picture['sources'].append({'url': url, 'attribute': attr_used})
+
+        elif tag == 'div':
+            url, attr_used = _first_attribute(attrs, self.enabled_attrs)
+            if url:
+                self.div_sources.append({'url': url, 'tag': 'div', 'attribute': attr_used})
+
+        elif tag == 'link':
+            rel_str = attrs.get('rel') or ''
+            if any(icon_type in rel_str.lower() for icon_type in ['icon', 'apple-touch-icon', 'shortcut']):
+                url, attr_used = _first_attribute(attrs, self.enabled_attrs)
+                if url:
+                    self.link_sources.append({'url': url, 'tag': 'link', 'attribute': attr_used})
+
+        elif tag == 'meta':
+            property_attr = (attrs.get('property') or '').lower()
+            name_attr = (attrs.get('name') or '').lower()
+            if (any(img_type in property_attr for img_type in ['og:image', 'twitter:image']) or
+                    any(img_type in name_attr for img_type in ['og:image', 'twitter:image'])) and \
+                    not any(exclude in property_attr for exclude in ['width', 'height', 'alt']):
+                url, attr_used = _first_attribute(attrs, self.enabled_attrs)
+                if url and not url.isdigit():
+                    self.meta_sources.append({'url': url, 'tag': 'meta', 'attribute': attr_used})
+
+    def handle_endtag(self, tag):
+        if tag == 'title' and self._title_parts is not None:
+            self.page_title = ''.join(self._title_parts).strip()
+            self._title_parts = None
+        elif tag == 'picture' and self._open_pictures:
+            self._open_pictures.pop()
+
+    def handle_data(self, data):
+        if self._title_parts is not None:
+            self._title_parts.append(data)
+
+    def _picture_candidates(self, seen):
+        candidates = []
+        for picture in self.pictures:
+            for source in picture['sources']:
+                # srcset can have multiple URLs, use the first one
+                src_url = source['url'].split(',')[0].split()[0]
+                if src_url not in seen:
+                    seen.add(src_url)
+                    candidates.append({'url': src_url, 'tag': 'picture>source', 'attribute': source['attribute']})
+            img = picture['img']
+            if img and img['url'] and img['url'] not in seen:
+                seen.add(img['url'])
+                candidates.append({'url': img['url'], 'tag': 'picture>img', 'attribute': img['attribute']})
+        return candidates
+
+    def candidates(self):
+        """
+        Merge collected candidates in download_images_from_url() priority order.
+
+        Returns:
+            list: [{url, tag, attribute}, ...]
+        """
+        image_sources = []
+        seen = set()
+
+        if 'img' in self.enabled_tags:
+            # img tags are not de-duplicated against each other (same as the soup path)
+            image_sources.extend(dict(item) for item in self.img_sources)
+            seen.update(item['url'] for item in self.img_sources)
+
+        if 'picture' in self.enabled_tags:
+            image_sources.extend(self._picture_candidates(seen))
+
+        for tag, items in (('div', self.div_sources), ('link', self.link_sources), ('meta', self.meta_sources)):
+            if tag not in self.enabled_tags:
+                continue
+            for item in items:
+                if item['url'] not in seen:
+                    seen.add(item['url'])
+                    image_sources.append(dict(item))
+
+        return image_sources
+
+    def leading_candidates_settled(self, needed):
+        """
+        Check whether the first `needed` merged candidates can no longer change.
+
+        Candidates are merged by tag priority, so later markup can only append to
+        the highest-priority enabled tag type. Once that type alone holds `needed`
+        candidates, the head of the merged list is final.
+        """
+        for tag in TAG_PRIORITY:
+            if tag not in self.enabled_tags:
+                continue
+            if tag == 'img':
+                count = len(self.img_sources)
+            elif tag == 'picture':
+                count = len(self._picture_candidates(set()))
+            elif tag == 'div':
+                count = len(self.div_sources)
+            elif tag == 'link':
+                count = len(self.link_sources)
+            else:
+                count = len(self.meta_sources)
+            return count >= needed
+        return False
+
+
+def stream_image_candidates(response, max_candidates, enabled_tags, enabled_attrs,
+                            chunk_size=16384, context_bytes=65536):
+    """
+    Stream an HTML response into ImageCandidateScanner and stop early when possible.
+
+    Args:
+        response: requests.Response opened with stream=True
+        max_candidates (int): Number of leading candidates that must be settled
+        enabled_tags (list): Enabled image tags from config
+        enabled_attrs (list): Enabled image attributes from config
+        chunk_size (int): Bytes read per iteration
+        context_bytes (int): Extra bytes read after candidates settle, kept for context extraction
+
+    Returns:
+        dict: {
+            'candidates': [{url, tag, attribute}, ...],
+            'page_title': str,
+            'markup': str (decoded markup consumed so far),
+            'bytes_read': int,
+            'truncated': bool (True if reading stopped before the end of the body)
+        }
+    """
+    scanner = ImageCandidateScanner(enabled_tags, enabled_attrs)
+    decoder = None
+    markup_parts = []
+    bytes_read = 0
+    settled_at = None
+    truncated = False
+
+    for chunk in response.iter_content(chunk_size=chunk_size):
+        if not chunk:
+            continue
+        if decoder is None:
+            encoding = sniff_encoding(chunk, response.encoding if 'charset' in response.headers.get('content-type', '').lower() else None)
+            decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+
+        bytes_read += len(chunk)
+        text = decoder.decode(chunk)
+        markup_parts.append(text)
+        scanner.feed(text)
+
+        if settled_at is None and scanner.leading_candidates_settled(max_candidates):
+            settled_at = bytes_read
+
+        if settled_at is not None and bytes_read - settled_at >= context_bytes:
+            truncated = True
+            break
+
+    if decoder is not None and not truncated:
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            markup_parts.append(tail)
+            scanner.feed(tail)
+    scanner.close()
+    response.close()
+
+    return {
+        'candidates': scanner.candidates(),
+        'page_title': scanner.page_title or '',
+        'markup': ''.join(markup_parts),
+        'bytes_read': bytes_read,
+        'truncated': truncated
+    }
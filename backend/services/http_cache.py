@@ -0,0 +1,334 @@
+"""
+On-disk HTTP cache for scraped pages and images.
+
+A private-cache subset of RFC 7234 used in front of the scraping session:
+
+- 200 responses are stored with their ETag, Last-Modified, Cache-Control,
+  Expires and Date headers (unless Cache-Control says no-store)
+- fresh entries (max-age / Expires, or the 10% Last-Modified heuristic) are
+  served without touching the network
+- stale entries are revalidated with If-None-Match / If-Modified-Since; a 304
+  answer reuses the stored body
+- total body size is bounded; least recently used entries are evicted first
+
+Each entry is two files named after the SHA-256 of the URL: <key>.body holds the
+decoded body and <key>.json the metadata. Writes are atomic so concurrent
+analysis processes can share the folder.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from services.metrics import CACHE_REQUESTS
+
+# Response headers kept with a cached body (Content-Encoding/Length are dropped: bodies are stored decoded)
+STORED_HEADERS = ('content-type', 'etag', 'last-modified', 'cache-control', 'expires', 'date', 'age', 'vary')
+
+# Upper bound for heuristic freshness when only Last-Modified is known
+MAX_HEURISTIC_FRESHNESS = 24 * 3600
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+# Lookup counters mirrored to /api/metrics
+_LOOKUP_METRICS = {
+    'hits': CACHE_REQUESTS.labels('http', 'hit'),
+    'revalidated': CACHE_REQUESTS.labels('http', 'revalidated'),
+    'misses': CACHE_REQUESTS.labels('http', 'miss')
+}
+
+
+def _parse_cache_control(value):
+    directives = {}
+    for part in (value or '').split(','):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, arg = part.partition('=')
+        directives[name.strip().lower()] = arg.strip().strip('"') if arg else None
+    return directives
+
+
+def _parse_http_date(value):
+    if not value:
+        return None
+    try:
+        return parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+def freshness_lifetime(headers):
+    """
+    Compute how long a stored response stays fresh (RFC 7234 section 4.2.1).
+
+    Args:
+        headers (dict): Stored response headers (lower-case keys)
+
+    Returns:
+        float: Seconds of freshness; 0 means the entry must be revalidated
+    """
+    directives = _parse_cache_control(headers.get('cache-control'))
+    if 'no-cache' in directives:
+        return 0
+    if directives.get('max-age') is not None:
+        try:
+            return max(int(directives['max-age']), 0)
+        except ValueError:
+            return 0
+
+    date = _parse_http_date(headers.get('date'))
+    expires = _parse_http_date(headers.get('expires'))
+    if expires is not None:
+        return max(expires - (date or time.time()), 0)
+
+    last_modified = _parse_http_date(headers.get('last-modified'))
+    if last_modified is not None and date is not None and date > last_modified:
+        return min((date - last_modified) * 0.1, MAX_HEURISTIC_FRESHNESS)
+    return 0
+
+
+class HTTPCache:
+    """Size-bounded on-disk cache with conditional revalidation."""
+
+    def __init__(self, folder, max_size_bytes):
+        self.folder = folder
+        self.max_size_bytes = max_size_bytes
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'revalidated': 0, 'misses': 0, 'stored': 0, 'evicted': 0, 'bytes_saved': 0}
+        os.makedirs(folder, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in os.scandir(folder) if entry.name.endswith('.body'))
+
+    def _paths(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.folder, key)
+        return base + '.body', base + '.json'
+
+    def _load(self, url):
+        body_path, meta_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or not os.path.exists(body_path):
+            return None
+        return meta
+
+    def _write_atomic(self, path, data, mode):
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, mode, **({'encoding': 'utf-8'} if 'b' not in mode else {})) as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def _save_meta(self, url, meta):
+        _, meta_path = self._paths(url)
+        self._write_atomic(meta_path, json.dumps(meta), 'w')
+
+    def _touch(self, url):
+        # Body mtime doubles as the LRU timestamp
+        body_path, _ = self._paths(url)
+        try:
+            os.utime(body_path, None)
+        except OSError:
+            pass
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._stats[name] += amount
+        metric = _LOOKUP_METRICS.get(name)
+        if metric is not None:
+            metric.inc(amount)
+
+    def stats(self):
+        """Return a copy of the hit/miss counters for this process."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _is_fresh(self, meta):
+        headers = meta.get('headers', {})
+        try:
+            initial_age = max(int(headers.get('age', 0)), 0)
+        except ValueError:
+            initial_age = 0
+        age = initial_age + (time.time() - meta.get('stored_at', 0))
+        return age < freshness_lifetime(headers)
+
+    def _build_response(self, meta):
+        # The body is streamed from disk: iter_content() reads it in chunks, .content reads it whole
+        body_path, _ = self._paths(meta['url'])
+        response = requests.Response()
+        response.status_code = 200
+        response.reason = 'OK'
+        response.url = meta['url']
+        response.headers = CaseInsensitiveDict(meta.get('headers', {}))
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.raw = open(body_path, 'rb')
+        response.from_cache = True
+        return response
+
+    def _storable_headers(self, response, size):
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        directives = _parse_cache_control(headers.get('cache-control'))
+        if 'no-store' in directives or headers.get('vary', '').strip() == '*':
+            return None
+        if size > self.max_size_bytes:
+            return None
+        return headers
+
+    def _commit(self, url, headers, size, write_body):
+        body_path, _ = self._paths(url)
+        try:
+            previous_size = os.path.getsize(body_path)
+        except OSError:
+            previous_size = 0
+
+        write_body(body_path)
+        self._save_meta(url, {'url': url, 'headers': headers, 'stored_at': time.time(), 'size': size})
+        with self._lock:
+            self._size += size - previous_size
+            self._stats['stored'] += 1
+        self._evict_if_needed()
+
+    def _store(self, url, response):
+        body = response.content
+        headers = self._storable_headers(response, len(body))
+        if headers is not None:
+            self._commit(url, headers, len(body), lambda path: self._write_atomic(path, body, 'wb'))
+
+    def store_file(self, url, response, source_path):
+        """
+        Store a body that was streamed to disk by the caller.
+
+        Streamed responses are not stored by get(); callers that read the whole
+        body into a file hand it over here so the cache never holds it in memory.
+
+        Args:
+            url (str): URL the response was fetched from
+            response (requests.Response): Response whose headers describe the body
+            source_path (str): File containing the complete decoded body
+        """
+        if getattr(response, 'from_cache', False) or response.status_code != 200:
+            return
+        size = os.path.getsize(source_path)
+        headers = self._storable_headers(response, size)
+        if headers is None:
+            return
+
+        def copy_body(body_path):
+            temp_path = f"{body_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            shutil.copyfile(source_path, temp_path)
+            os.replace(temp_path, body_path)
+
+        self._commit(url, headers, size, copy_body)
+
+    def _evict_if_needed(self):
+        with self._lock:
+            if self._size <= self.max_size_bytes:
+                return
+            entries = []
+            for entry in os.scandir(self.folder):
+                if entry.name.endswith('.body'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            entries.sort()
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, body_path in entries:
+                if total <= self.max_size_bytes:
+                    break
+                for path in (body_path, body_path[:-len('.body')] + '.json'):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+                self._stats['evicted'] += 1
+            self._size = total
+
+    def get(self, session, url, stream=False, **kwargs):
+        """
+        GET a URL through the cache.
+
+        Args:
+            session: requests.Session used for network requests
+            url (str): URL to fetch
+            stream (bool): Passed to the session on a miss; streamed bodies may be
+                read partially, so they are not stored (see store_file)
+            **kwargs: Extra arguments for session.get (headers, timeout, ...)
+
+        Returns:
+            requests.Response: Network response, or a response rebuilt from the cache
+                (response.from_cache is True in that case)
+        """
+        meta = self._load(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+
+        if meta is not None:
+            if self._is_fresh(meta):
+                self._count('hits')
+                self._count('bytes_saved', meta.get('size', 0))
+                self._touch(url)
+                return self._build_response(meta)
+
+            stored_headers = meta.get('headers', {})
+            if stored_headers.get('etag'):
+                headers['If-None-Match'] = stored_headers['etag']
+            if stored_headers.get('last-modified'):
+                headers['If-Modified-Since'] = stored_headers['last-modified']
+
+        response = session.get(url, headers=headers, stream=stream, **kwargs)
+
+        if response.status_code == 304 and meta is not None:
+            response.close()
+            # Refresh freshness information from the 304 (RFC 7234 section 4.3.4)
+            for name in ('cache-control', 'expires', 'date', 'etag', 'last-modified', 'age'):
+                if name in response.headers:
+                    meta['headers'][name] = response.headers[name]
+            meta['stored_at'] = time.time()
+            self._save_meta(url, meta)
+            self._touch(url)
+            self._count('revalidated')
+            self._count('bytes_saved', meta.get('size', 0))
+            return self._build_response(meta)
+
+        self._count('misses')
+        if response.status_code == 200 and not stream:
+            try:
+                self._store(url, response)
+            except OSError:
+                pass  # Caching is best effort
+        return response
+
+
+def get_http_cache(folder, max_size_mb=500):
+    """
+    Return the process-wide cache for a folder, creating it on first use.
+
+    Args:
+        folder (str): Absolute cache folder
+        max_size_mb (int|float): Upper bound for stored bodies in megabytes
+
+    Returns:
+        HTTPCache: Shared cache instance
+    """
+    max_size_bytes = int(max_size_mb * 1024 * 1024)
+    with _CACHES_LOCK:
+        cache = _CACHES.get(folder)
+        if cache is None:
+            cache = HTTPCache(folder, max_size_bytes)
+            _CACHES[folder] = cache
+        cache.max_size_bytes = max_size_bytes
+        return cache
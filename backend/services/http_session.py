@@ -0,0 +1,164 @@
+"""
+Shared HTTP session for page and image scraping.
+
+Module-level requests.get()/requests.head() open a new TCP (and TLS) connection
+for every call. All scraping goes through one ScrapingSession instead:
+
+- per-host connection pooling with keep-alive (HTTPAdapter pool settings)
+- gzip/deflate decoding, plus brotli when the brotli package is installed
+- retries with exponential backoff on connection errors and 5xx responses
+- the configured user agent and a default timeout on every request
+- per-host latency statistics (request count, errors, min/avg/max seconds)
+
+The session is created lazily and rebuilt only when its settings change.
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# urllib3 decodes 'br' responses only when a brotli implementation is installed
+try:
+    import brotli  # noqa: F401
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi  # noqa: F401
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
+
+DEFAULT_HTTP_SETTINGS = {
+    'pool_connections': 10,
+    'pool_maxsize': 20,
+    'max_retries': 3,
+    'backoff_factor': 0.5,
+    'retry_status_codes': [500, 502, 503, 504],
+    'compression': True
+}
+
+_SESSION = None
+_SESSION_KEY = None
+_SESSION_LOCK = threading.Lock()
+
+
+class ScrapingSession(requests.Session):
+    """requests.Session with a default timeout and per-host latency statistics."""
+
+    def __init__(self, timeout=30):
+        super().__init__()
+        self.default_timeout = timeout
+        self._stats_lock = threading.Lock()
+        self._host_stats = {}
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.default_timeout)
+        host = urlparse(url).netloc.lower()
+        start = time.perf_counter()
+        try:
+            response = super().request(method, url, **kwargs)
+        except requests.exceptions.RequestException:
+            self._record(host, time.perf_counter() - start, error=True)
+            raise
+        # With stream=True this measures time to response headers, not the full body
+        self._record(host, time.perf_counter() - start, error=response.status_code >= 500)
+        return response
+
+    def _record(self, host, seconds, error=False):
+        with self._stats_lock:
+            stats = self._host_stats.get(host)
+            if stats is None:
+                stats = {'requests': 0, 'errors': 0, 'total_seconds': 0.0,
+                         'min_seconds': None, 'max_seconds': 0.0}
+                self._host_stats[host] = stats
+            stats['requests'] += 1
+            if error:
+                stats['errors'] += 1
+            stats['total_seconds'] += seconds
+            stats['max_seconds'] = max(stats['max_seconds'], seconds)
+            if stats['min_seconds'] is None or seconds < stats['min_seconds']:
+                stats['min_seconds'] = seconds
+
+    def host_stats(self):
+        """
+        Return a snapshot of per-host latency statistics.
+
+        Returns:
+            dict: {host: {requests, errors, avg_seconds, min_seconds, max_seconds}}
+        """
+        with self._stats_lock:
+            snapshot = {}
+            for host, stats in self._host_stats.items():
+                snapshot[host] = {
+                    'requests': stats['requests'],
+                    'errors': stats['errors'],
+                    'avg_seconds': round(stats['total_seconds'] / stats['requests'], 4),
+                    'min_seconds': round(stats['min_seconds'] or 0.0, 4),
+                    'max_seconds': round(stats['max_seconds'], 4)
+                }
+            return snapshot
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._host_stats = {}
+
+
+def _build_session(user_agent, timeout, settings):
+    session = ScrapingSession(timeout=timeout)
+
+    retry = Retry(
+        total=settings['max_retries'],
+        connect=settings['max_retries'],
+        read=settings['max_retries'],
+        status=settings['max_retries'],
+        backoff_factor=settings['backoff_factor'],
+        status_forcelist=settings['retry_status_codes'],
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False  # Return the last response; callers use raise_for_status()
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings['pool_connections'],
+        pool_maxsize=settings['pool_maxsize'],
+        max_retries=retry
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+
+    if user_agent:
+        session.headers['User-Agent'] = user_agent
+    if settings['compression']:
+        session.headers['Accept-Encoding'] = 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate'
+    else:
+        session.headers['Accept-Encoding'] = 'identity'
+    return session
+
+
+def get_http_session(user_agent=None, timeout=30, http_settings=None):
+    """
+    Return the shared scraping session, creating it on first use.
+
+    Args:
+        user_agent (str): User-Agent header sent with every request
+        timeout (int|float): Default timeout in seconds (per-call timeout= still wins)
+        http_settings (dict): Overrides for DEFAULT_HTTP_SETTINGS (config 'http' section)
+
+    Returns:
+        ScrapingSession: Shared session; rebuilt if any of the settings changed
+    """
+    global _SESSION, _SESSION_KEY
+
+    settings = dict(DEFAULT_HTTP_SETTINGS)
+    settings.update({k: v for k, v in (http_settings or {}).items() if k in DEFAULT_HTTP_SETTINGS})
+    key = (user_agent, timeout, repr(sorted(settings.items())))
+
+    with _SESSION_LOCK:
+        if _SESSION is None or _SESSION_KEY != key:
+            if _SESSION is not None:
+                _SESSION.close()
+            _SESSION = _build_session(user_agent, timeout, settings)
+            _SESSION_KEY = key
+        return _SESSION
@@ -0,0 +1,135 @@
+"""
+Cheap local image features for complexity-based model routing.
+
+Charts, infographics and text-heavy screenshots need a strong vision model;
+photos, icons and logos usually do not. The features below are computed on a
+small greyscale thumbnail in a few milliseconds with Pillow and NumPy:
+
+- edge_density: share of pixels with a strong brightness gradient
+- colour_count: distinct colours after quantising to 32 levels per channel
+                (photos have thousands, flat graphics and charts few)
+- text_likeness: share of rows with many sharp dark/light transitions, the
+                 pattern printed text produces
+- aspect_ratio: width / height
+"""
+
+from PIL import Image
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# Longest side of the analysis thumbnail
+THUMBNAIL_SIZE = 256
+
+# Brightness gradient (0-255) that counts as an edge
+EDGE_THRESHOLD = 40
+
+# Sharp transitions per pixel of row width that mark a row as text-like
+TEXT_ROW_TRANSITIONS = 0.08
+
+DEFAULT_ROUTING_THRESHOLDS = {
+    'text_likeness': 0.25,
+    'edge_density': 0.12,
+    'max_graphic_colours': 512,
+    'min_complex_size': 120,
+    'extreme_aspect_ratio': 3.0
+}
+
+
+def compute_image_features(image):
+    """
+    Compute routing features for an image.
+
+    Args:
+        image (PIL.Image.Image or str): Image, or path of a raster image file
+
+    Returns:
+        dict: {edge_density, colour_count, text_likeness, aspect_ratio, width, height}
+
+    Raises:
+        RuntimeError: If NumPy is not installed
+    """
+    if not NUMPY_AVAILABLE:
+        raise RuntimeError("numpy is required for image complexity features")
+
+    if not isinstance(image, Image.Image):
+        image = Image.open(image)
+    width, height = image.size
+    if image.format == 'JPEG':
+        # Let the decoder downscale large photos instead of decoding every pixel
+        image.draft('RGB', (THUMBNAIL_SIZE * 2, THUMBNAIL_SIZE * 2))
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # Flatten transparency on white, as pages usually render it
+        rgba = image.convert('RGBA')
+        background = Image.new('RGBA', rgba.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, rgba)
+    rgb = image.convert('RGB')
+    rgb.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+
+    pixels = np.asarray(rgb, dtype=np.uint8)
+    quantised = (pixels >> 3).astype(np.uint32)
+    colour_count = int(np.unique((quantised[..., 0] << 10) | (quantised[..., 1] << 5) | quantised[..., 2]).size)
+
+    grey = np.asarray(rgb.convert('L'), dtype=np.int16)
+    if grey.shape[0] < 2 or grey.shape[1] < 2:
+        edge_density = 0.0
+        text_likeness = 0.0
+    else:
+        horizontal = np.abs(np.diff(grey, axis=1))
+        vertical = np.abs(np.diff(grey, axis=0))
+        edges = (horizontal[:-1, :] > EDGE_THRESHOLD) | (vertical[:, :-1] > EDGE_THRESHOLD)
+        edge_density = float(edges.mean())
+
+        transitions_per_row = (horizontal > EDGE_THRESHOLD).sum(axis=1) / float(horizontal.shape[1])
+        text_likeness = float((transitions_per_row > TEXT_ROW_TRANSITIONS).mean())
+
+    return {
+        'edge_density': round(edge_density, 4),
+        'colour_count': colour_count,
+        'text_likeness': round(text_likeness, 4),
+        'aspect_ratio': round(width / float(height), 3) if height else 0.0,
+        'width': width,
+        'height': height
+    }
+
+
+def classify_complexity(features, thresholds=None):
+    """
+    Decide whether an image needs the 'complex' or the 'simple' model pair.
+
+    An image is complex when it looks text-heavy, or when it is a busy flat
+    graphic (many edges, few colours: charts, diagrams, infographics) that is
+    large enough to carry detail. Extreme aspect ratios (banners, wide
+    screenshots) lower the text threshold.
+
+    Args:
+        features (dict): Output of compute_image_features()
+        thresholds (dict): Overrides for DEFAULT_ROUTING_THRESHOLDS
+
+    Returns:
+        tuple: ('simple' or 'complex', list of reasons)
+    """
+    limits = dict(DEFAULT_ROUTING_THRESHOLDS)
+    limits.update({k: v for k, v in (thresholds or {}).items() if k in DEFAULT_ROUTING_THRESHOLDS})
+
+    reasons = []
+    large_enough = min(features['width'], features['height']) >= limits['min_complex_size']
+    aspect = features['aspect_ratio']
+    extreme_aspect = aspect and (aspect >= limits['extreme_aspect_ratio'] or aspect <= 1.0 / limits['extreme_aspect_ratio'])
+
+    text_threshold = limits['text_likeness'] * (0.6 if extreme_aspect else 1.0)
+    if features['text_likeness'] >= text_threshold and large_enough:
+        reasons.append(f"text-like rows {features['text_likeness']:.2f} >= {text_threshold:.2f}")
+    if (features['edge_density'] >= limits['edge_density'] and
+            features['colour_count'] <= limits['max_graphic_colours'] and large_enough):
+        reasons.append(f"busy flat graphic (edges {features['edge_density']:.2f}, {features['colour_count']} colours)")
+
+    if reasons:
+        return 'complex', reasons
+    if not large_enough:
+        return 'simple', [f"small image ({features['width']}x{features['height']})"]
+    return 'simple', ["no text or chart signals"]
@@ -0,0 +1,160 @@
+"""
+Streaming image downloads with size caps and content sniffing.
+
+Image bodies are written to disk chunk by chunk instead of being buffered in
+memory. The first bytes are checked against known image signatures so that
+HTML error pages, redirects to login pages and other non-images served from
+image URLs are rejected before anything is kept. A SHA-256 hash and the byte
+count are computed in the same pass.
+"""
+
+import hashlib
+import os
+
+# Extension to use for each sniffed image type
+IMAGE_TYPE_EXTENSIONS = {
+    'jpeg': '.jpg',
+    'png': '.png',
+    'gif': '.gif',
+    'webp': '.webp',
+    'bmp': '.bmp',
+    'tiff': '.tiff',
+    'ico': '.ico',
+    'avif': '.avif',
+    'heic': '.heic',
+    'svg': '.svg'
+}
+
+# Bytes needed before a type decision is made (shorter bodies are sniffed as-is)
+SNIFF_BYTES = 512
+
+# Text that may still turn out to be SVG (XML declaration, comments, doctype) is
+# read up to this many bytes looking for the <svg tag
+SVG_SNIFF_BYTES = 32768
+
+# DIB header sizes of the BMP variants (BITMAPCOREHEADER up to BITMAPV5HEADER)
+BMP_DIB_HEADER_SIZES = (12, 16, 40, 52, 56, 64, 108, 124)
+
+
+class ImageDownloadError(Exception):
+    """Raised when a downloaded body is not an image or exceeds the size limit."""
+
+
+def sniff_image_type(head):
+    """
+    Identify an image format from its leading bytes.
+
+    Args:
+        head (bytes): First bytes of the body (SNIFF_BYTES is enough for binary formats;
+            SVG with a long prolog needs up to SVG_SNIFF_BYTES, see needs_more_bytes())
+
+    Returns:
+        str: Image type key of IMAGE_TYPE_EXTENSIONS, or None if not an image
+    """
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head.startswith(b'BM') and len(head) >= 18 and int.from_bytes(head[14:18], 'little') in BMP_DIB_HEADER_SIZES:
+        return 'bmp'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    if head[:4] in (b'\x00\x00\x01\x00', b'\x00\x00\x02\x00'):
+        return 'ico'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in (b'avif', b'avis'):
+            return 'avif'
+        if brand in (b'heic', b'heix', b'mif1', b'msf1'):
+            return 'heic'
+
+    # SVG is text: allow a BOM, whitespace, XML declaration, comments and doctype before <svg
+    text = head.lstrip(b'\xef\xbb\xbf').lstrip().lower()
+    if text.startswith(b'<svg') or (_has_svg_prolog(text) and b'<svg' in text):
+        return 'svg'
+    return None
+
+
+def _has_svg_prolog(text):
+    return text.startswith((b'<?xml', b'<!--', b'<!doctype svg'))
+
+
+def needs_more_bytes(head):
+    """True when an unrecognized head may still be an SVG whose <svg tag comes later."""
+    return len(head) < SVG_SNIFF_BYTES and _has_svg_prolog(head.lstrip(b'\xef\xbb\xbf').lstrip().lower())
+
+
+def stream_image_to_file(chunks, filepath, max_bytes=None, declared_length=None):
+    """
+    Write an image body to disk chunk by chunk.
+
+    Args:
+        chunks (iterable): Body chunks, e.g. response.iter_content(chunk_size)
+        filepath (str): Destination path; it only exists if the download succeeds
+        max_bytes (int): Maximum body size, None or 0 for no limit
+        declared_length (str|int): Content-Length header, checked before reading
+
+    Returns:
+        dict: {'bytes': int, 'sha256': str, 'image_type': str}
+
+    Raises:
+        ImageDownloadError: If the body is not an image or is larger than max_bytes
+    """
+    if max_bytes and declared_length:
+        try:
+            if int(declared_length) > max_bytes:
+                raise ImageDownloadError(f"Content-Length {declared_length} exceeds limit of {max_bytes} bytes")
+        except ValueError:
+            pass
+
+    temp_path = f"{filepath}.part"
+    digest = hashlib.sha256()
+    total = 0
+    head = b''
+    image_type = None
+
+    try:
+        with open(temp_path, 'wb') as f:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                total += len(chunk)
+                if max_bytes and total > max_bytes:
+                    raise ImageDownloadError(f"Image exceeds limit of {max_bytes} bytes")
+
+                if image_type is None:
+                    # Hold data back until enough bytes are available to sniff
+                    head += chunk
+                    if len(head) < SNIFF_BYTES:
+                        continue
+                    image_type = sniff_image_type(head)
+                    if image_type is None and needs_more_bytes(head):
+                        continue  # SVG prolog (XML declaration, comments, doctype) before <svg
+                    if image_type is None:
+                        raise ImageDownloadError("Response body is not a recognized image format")
+                    chunk, head = head, b''
+
+                digest.update(chunk)
+                f.write(chunk)
+
+            if image_type is None:
+                # Body shorter than SNIFF_BYTES (or an SVG prolog shorter than SVG_SNIFF_BYTES)
+                image_type = sniff_image_type(head)
+                if image_type is None:
+                    raise ImageDownloadError("Response body is not a recognized image format")
+                digest.update(head)
+                f.write(head)
+
+        os.replace(temp_path, filepath)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+    return {'bytes': total, 'sha256': digest.hexdigest(), 'image_type': image_type}
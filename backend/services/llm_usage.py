@@ -0,0 +1,287 @@
+"""
+Token usage helpers for LLM provider responses.
+
+Each provider SDK reports usage differently:
+- OpenAI / ECB-LLM: response.usage.prompt_tokens / completion_tokens
+- Claude: response.usage.input_tokens / output_tokens (+ cache read/creation tokens)
+- Ollama: response['prompt_eval_count'] / response['eval_count']
+- Gemini: response.usage_metadata.prompt_token_count / candidates_token_count
+
+extract_token_usage() normalizes them; estimate_text_tokens() gives a rough
+pre-call estimate when no tokenizer is available.
+
+Every call is accounted (tokens, wall time, estimated cost) in the UsageLedger
+bound to the calling thread by usage_scope(); ledgers nest image -> job ->
+session (SESSION_USAGE) and sum per step and per provider endpoint.
+"""
+
+import contextlib
+import threading
+
+# Rough per-image token cost used for pre-call estimates (vision inputs)
+IMAGE_TOKEN_ESTIMATE = 1000
+
+# Average characters per token for English-like text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_text_tokens(text):
+    """
+    Estimate the number of tokens in a text without a tokenizer.
+
+    Args:
+        text (str): Prompt or completion text
+
+    Returns:
+        int: Estimated token count
+    """
+    if not text:
+        return 0
+    return max(1, (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN)
+
+
+def _field(obj, name):
+    # SDK objects expose attributes, Ollama responses also support item access
+    if obj is None:
+        return None
+    value = getattr(obj, name, None)
+    if value is None and isinstance(obj, dict):
+        value = obj.get(name)
+    if value is None:
+        try:
+            value = obj[name]
+        except (KeyError, TypeError, IndexError, AttributeError):
+            value = None
+    return value
+
+
+def _as_int(value):
+    try:
+        return int(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_token_usage(response):
+    """
+    Normalize token usage reported by a provider response.
+
+    Args:
+        response: Raw SDK response object (any supported provider)
+
+    Returns:
+        dict: {'input_tokens', 'output_tokens', 'total_tokens', 'cached_input_tokens'}
+              or None if the response carries no usage information
+    """
+    input_tokens = output_tokens = cached = None
+
+    usage = _field(response, 'usage')
+    if usage is not None:
+        # OpenAI-style
+        input_tokens = _as_int(_field(usage, 'prompt_tokens'))
+        output_tokens = _as_int(_field(usage, 'completion_tokens'))
+        details = _field(usage, 'prompt_tokens_details')
+        cached = _as_int(_field(details, 'cached_tokens'))
+        if input_tokens is None:
+            # Claude-style: input_tokens excludes cached prefix tokens
+            input_tokens = _as_int(_field(usage, 'input_tokens'))
+            output_tokens = _as_int(_field(usage, 'output_tokens'))
+            cache_read = _as_int(_field(usage, 'cache_read_input_tokens')) or 0
+            cache_write = _as_int(_field(usage, 'cache_creation_input_tokens')) or 0
+            if input_tokens is not None:
+                input_tokens += cache_read + cache_write
+                cached = cache_read
+    else:
+        metadata = _field(response, 'usage_metadata')
+        if metadata is not None:
+            # Gemini
+            input_tokens = _as_int(_field(metadata, 'prompt_token_count'))
+            output_tokens = _as_int(_field(metadata, 'candidates_token_count'))
+            cached = _as_int(_field(metadata, 'cached_content_token_count'))
+        else:
+            # Ollama
+            input_tokens = _as_int(_field(response, 'prompt_eval_count'))
+            output_tokens = _as_int(_field(response, 'eval_count'))
+
+    if input_tokens is None and output_tokens is None:
+        return None
+
+    input_tokens = input_tokens or 0
+    output_tokens = output_tokens or 0
+    return {
+        'input_tokens': input_tokens,
+        'output_tokens': output_tokens,
+        'total_tokens': input_tokens + output_tokens,
+        'cached_input_tokens': cached or 0
+    }
+
+
+def estimate_cost(usage, price):
+    """
+    Estimate the cost of a call from a price entry.
+
+    Args:
+        usage (dict): Output of extract_token_usage()
+        price (dict): Prices per million tokens: {'input', 'output', optional 'cached_input'}
+
+    Returns:
+        float: Estimated cost, or None when the usage or the price is unknown
+    """
+    if not usage or not price:
+        return None
+    cached = usage['cached_input_tokens']
+    uncached = max(usage['input_tokens'] - cached, 0)
+    cost = (uncached * price.get('input', 0.0)
+            + cached * price.get('cached_input', price.get('input', 0.0))
+            + usage['output_tokens'] * price.get('output', 0.0))
+    return cost / 1000000.0
+
+
+def _empty_totals():
+    return {'calls': 0, 'estimated_input_tokens': 0, 'input_tokens': 0, 'cached_input_tokens': 0,
+            'output_tokens': 0, 'seconds': 0.0, 'cost': 0.0, 'unpriced_calls': 0}
+
+
+def _add_totals(totals, other):
+    for field, value in other.items():
+        totals[field] = totals.get(field, 0) + value
+
+
+def _rounded(totals):
+    return dict(totals, seconds=round(totals['seconds'], 3), cost=round(totals['cost'], 6))
+
+
+class UsageLedger:
+    """
+    LLM call accounting for one scope (an image, a job or the whole process).
+
+    Calls are summed per step and per 'Provider/model' endpoint. A ledger created
+    with a parent also adds every call to the parent, so image ledgers roll up
+    into the job ledger and from there into the session ledger.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.steps = {}
+        self.endpoints = {}
+        self._lock = threading.Lock()
+
+    def record(self, step, usage, estimated_input_tokens=0, endpoint=None, seconds=0.0, cost=None):
+        """
+        Add one call.
+
+        Args:
+            step (str): 'vision', 'processing' or 'translation'
+            usage (dict): Output of extract_token_usage(), None if not reported
+            estimated_input_tokens (int): Prompt tokens estimated before the call
+            endpoint (str): 'Provider/model'
+            seconds (float): Wall time of the call, retries and rate-limit waits included
+            cost (float): Output of estimate_cost(), None when unknown
+        """
+        call = _empty_totals()
+        call['calls'] = 1
+        call['estimated_input_tokens'] = estimated_input_tokens or 0
+        call['seconds'] = seconds or 0.0
+        if usage:
+            call['input_tokens'] = usage['input_tokens']
+            call['cached_input_tokens'] = usage['cached_input_tokens']
+            call['output_tokens'] = usage['output_tokens']
+        if cost is None:
+            call['unpriced_calls'] = 1
+        else:
+            call['cost'] = cost
+        self._add(step, endpoint or 'unknown', call)
+
+    def _add(self, step, endpoint, call):
+        with self._lock:
+            _add_totals(self.steps.setdefault(step, _empty_totals()), call)
+            _add_totals(self.endpoints.setdefault(endpoint, _empty_totals()), call)
+        if self.parent is not None:
+            self.parent._add(step, endpoint, call)
+
+    def merge(self, summary):
+        """Add the per-endpoint totals of another ledger's summary() (e.g. from a job subprocess)."""
+        with self._lock:
+            for step, totals in (summary or {}).get('steps', {}).items():
+                _add_totals(self.steps.setdefault(step, _empty_totals()), totals)
+            for endpoint, totals in (summary or {}).get('endpoints', {}).items():
+                _add_totals(self.endpoints.setdefault(endpoint, _empty_totals()), totals)
+
+    def summary(self):
+        """
+        Return the accounting of this scope.
+
+        Returns:
+            dict: {'steps': {step: totals}, 'endpoints': {'Provider/model': totals}, 'total': totals}
+                  where totals are {calls, estimated_input_tokens, input_tokens, cached_input_tokens,
+                  output_tokens, seconds, cost, unpriced_calls}; empty dict when no call was made
+        """
+        with self._lock:
+            if not self.steps:
+                return {}
+            total = _empty_totals()
+            for totals in self.steps.values():
+                _add_totals(total, totals)
+            return {
+                'steps': {step: _rounded(totals) for step, totals in self.steps.items()},
+                'endpoints': {endpoint: _rounded(totals) for endpoint, totals in self.endpoints.items()},
+                'total': _rounded(total)
+            }
+
+
+# Every call made in this process, whatever scope it ran in
+SESSION_USAGE = UsageLedger()
+
+_ACTIVE = threading.local()
+
+
+def current_usage_ledger():
+    """Return the UsageLedger of the calling thread, or None."""
+    return getattr(_ACTIVE, 'ledger', None)
+
+
+@contextlib.contextmanager
+def usage_scope():
+    """
+    Bind a new UsageLedger to the current thread for the duration of the block.
+
+    The ledger is a child of the thread's current ledger (e.g. an image inside a
+    job), or of SESSION_USAGE at the top level.
+
+    Yields:
+        UsageLedger: The active ledger
+    """
+    previous = current_usage_ledger()
+    ledger = UsageLedger(parent=previous or SESSION_USAGE)
+    _ACTIVE.ledger = ledger
+    try:
+        yield ledger
+    finally:
+        _ACTIVE.ledger = previous
+
+
+def propagate_usage(fn, ledger=None):
+    """
+    Wrap fn so that the calls it makes are recorded in a given ledger.
+
+    Used for work handed to other threads (image workers, hedged requests).
+
+    Args:
+        fn (callable): Function to wrap
+        ledger (UsageLedger): Ledger to record in; the caller's current ledger if None
+    """
+    ledger = ledger or current_usage_ledger()
+
+    def run(*args, **kwargs):
+        previous = current_usage_ledger()
+        _ACTIVE.ledger = ledger
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _ACTIVE.ledger = previous
+    return run
+
+
+def record_llm_usage(step, usage, estimated_input_tokens=0, endpoint=None, seconds=0.0, cost=None):
+    """Record a call in the current thread's ledger, or in SESSION_USAGE outside any scope."""
+    (current_usage_ledger() or SESSION_USAGE).record(step, usage, estimated_input_tokens, endpoint, seconds, cost)
@@ -0,0 +1,385 @@
+"""
+Prometheus-style metrics for the analysis pipeline.
+
+Counters and histograms are updated on the hot path (every page fetch, image
+download and LLM call attempt), so an update takes no lock: each thread adds to
+its own shard of the values and a scrape sums the shards. When a thread ends,
+its shards are folded into the totals and dropped, so short-lived threads
+(hedge branches, call_with_timeout workers, per-run thread pools) do not grow
+memory or scrape cost in the long-running API process.
+
+The child of a label combination is created once and cached. Call sites with
+fixed labels (HTTP timings, image outcomes, cache results) bind the child once
+at import time; labels known only per call (LLM step, provider and model, error
+classes) cost one dict lookup in labels(). Either way an update builds no label
+dicts.
+
+Gauges are read at scrape time from callbacks (queue depths, in-flight jobs,
+JOB_STATUS size), so they cost nothing between scrapes.
+
+Analysis jobs run app.py in a subprocess. Its counters and histograms are
+passed back with snapshot() in the job statistics and added to the API
+process registry with merge(), so /api/metrics covers both.
+"""
+
+import itertools
+import threading
+import weakref
+from bisect import bisect_left
+
+# Seconds; covers cached fetches (milliseconds) up to slow multi-image LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class _Shard:
+    """Value list of one thread; dropped with the thread's locals when it ends."""
+
+    __slots__ = ('values', '__weakref__')
+
+    def __init__(self, width):
+        self.values = [0.0] * width
+
+
+class _Shards:
+    """Per-thread value lists of one metric child, summed when read."""
+
+    __slots__ = ('width', '_local', '_shards', '_merged', '_lock', '_ids', '__weakref__')
+
+    def __init__(self, width):
+        self.width = width
+        self._local = threading.local()
+        self._shards = {}
+        self._merged = [0.0] * width
+        self._lock = threading.Lock()  # Taken for a thread's first and last update and by readers
+        self._ids = itertools.count()
+
+    def local(self):
+        try:
+            return self._local.shard.values
+        except AttributeError:
+            shard = _Shard(self.width)
+            shard_id = next(self._ids)
+            with self._lock:
+                self._shards[shard_id] = shard.values
+            self._local.shard = shard
+            # Runs when the thread ends and its locals are released
+            weakref.finalize(shard, _retire_shard, weakref.ref(self), shard_id)
+            return shard.values
+
+    def _retire(self, shard_id):
+        with self._lock:
+            values = self._shards.pop(shard_id, None)
+            if values is not None:
+                for i, value in enumerate(values):
+                    self._merged[i] += value
+
+    def add(self, values):
+        with self._lock:
+            for i, value in enumerate(values[:self.width]):
+                self._merged[i] += value
+
+    def totals(self):
+        with self._lock:
+            shards = list(self._shards.values())
+            totals = list(self._merged)
+        for values in shards:
+            for i, value in enumerate(values):
+                totals[i] += value
+        return totals
+
+
+def _retire_shard(shards_ref, shard_id):
+    shards = shards_ref()
+    if shards is not None:
+        shards._retire(shard_id)
+
+
+class _CounterChild:
+    __slots__ = ('_shards',)
+
+    def __init__(self):
+        self._shards = _Shards(1)
+
+    def inc(self, amount=1):
+        """Add a non-negative amount."""
+        self._shards.local()[0] += amount
+
+
+class _HistogramChild:
+    __slots__ = ('_shards', '_bounds')
+
+    def __init__(self, bounds):
+        self._bounds = bounds
+        # One slot per bucket, one for +Inf, one for the sum
+        self._shards = _Shards(len(bounds) + 2)
+
+    def observe(self, value):
+        """Record one observation (e.g. a duration in seconds)."""
+        values = self._shards.local()
+        values[bisect_left(self._bounds, value)] += 1
+        values[-1] += value
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        (REGISTRY if registry is None else registry).register(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """
+        Return the child for a label combination, creating it on first use.
+
+        Bind the result once where the labels are fixed; values are converted to str.
+        """
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            key = tuple(str(value) for value in values)
+            with self._lock:
+                child = self._children.get(key)
+                if child is None:
+                    child = self._children[key] = self._new_child()
+                self._children[values] = child
+        return child
+
+    def children(self):
+        with self._lock:
+            items = list(self._children.items())
+        # Children are cached under both the given and the str() label values
+        seen = set()
+        for values, child in items:
+            if id(child) not in seen and all(isinstance(value, str) for value in values):
+                seen.add(id(child))
+                yield values, child
+
+
+class Counter(_Metric):
+    """Monotonic counter, e.g. requests or errors."""
+
+    kind = 'counter'
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1):
+        """Increment an unlabelled counter."""
+        self.labels().inc(amount)
+
+    def values(self):
+        """Return {label value tuple: current value}."""
+        return {values: child._shards.totals()[0] for values, child in self.children()}
+
+    def samples(self):
+        for values, value in self.values().items():
+            yield '', values, value
+
+
+class Histogram(_Metric):
+    """Distribution of observed values in cumulative buckets, plus sum and count."""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(float(bound) for bound in buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        """Record an observation on an unlabelled histogram."""
+        self.labels().observe(value)
+
+    def samples(self):
+        for values, child in self.children():
+            totals = child._shards.totals()
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float('inf'),), totals[:-1]):
+                cumulative += count
+                yield '_bucket', values + (('le', _format_value(bound)),), cumulative
+            yield '_sum', values, totals[-1]
+            yield '_count', values, cumulative
+
+
+class Gauge(_Metric):
+    """Value read at scrape time from a callback."""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self._function = None
+        super().__init__(name, documentation, labelnames, registry)
+
+    def set_function(self, fn):
+        """
+        Read the gauge from a callback.
+
+        Args:
+            fn (callable): () -> number for an unlabelled gauge, or
+                {label value tuple: number} for a labelled one
+        """
+        self._function = fn
+
+    def samples(self):
+        if self._function is None:
+            return
+        try:
+            value = self._function()
+        except Exception:
+            return  # A failing callback must not break the whole scrape
+        if not self.labelnames:
+            if value is not None:
+                yield '', (), value
+            return
+        for values, number in (value or {}).items():
+            if number is not None:
+                yield '', tuple(str(v) for v in values), number
+
+
+class MetricsRegistry:
+    """Named collection of metrics, rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} is already registered")
+            self._metrics[metric.name] = metric
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def render(self):
+        """
+        Render every metric in the Prometheus text exposition format (0.0.4).
+
+        Returns:
+            str: Exposition text
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {_escape_help(metric.documentation)}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for suffix, values, number in metric.samples():
+                pairs = list(zip(metric.labelnames, values[:len(metric.labelnames)])) + list(values[len(metric.labelnames):])
+                label_text = ','.join(f'{name}="{_escape_label(value)}"' for name, value in pairs)
+                lines.append(f"{metric.name}{suffix}{{{label_text}}} {_format_value(number)}" if label_text
+                             else f"{metric.name}{suffix} {_format_value(number)}")
+        return '\n'.join(lines) + '\n'
+
+    def snapshot(self):
+        """
+        Return counter and histogram values as JSON-serialisable data for merge().
+
+        Returns:
+            dict: {metric name: [[label values], [values]], ...}
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        data = {}
+        for metric in metrics:
+            if metric.kind not in ('counter', 'histogram'):
+                continue
+            samples = [[list(values), child._shards.totals()] for values, child in metric.children()]
+            samples = [sample for sample in samples if any(sample[1])]
+            if samples:
+                data[metric.name] = samples
+        return data
+
+    def merge(self, snapshot):
+        """
+        Add the counters and histograms of another process's snapshot() to this registry.
+
+        Unknown metrics and mismatched label or bucket counts are skipped.
+        """
+        for name, samples in (snapshot or {}).items():
+            metric = self.get(name)
+            if metric is None or metric.kind not in ('counter', 'histogram'):
+                continue
+            for values, numbers in samples:
+                if len(values) != len(metric.labelnames):
+                    continue
+                child = metric.labels(*values)
+                if len(numbers) == child._shards.width:
+                    child._shards.add(numbers)
+
+
+def _escape_help(text):
+    return text.replace('\\', '\\\\').replace('\n', '\\n')
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(number):
+    if number == float('inf'):
+        return '+Inf'
+    if float(number).is_integer():
+        return str(int(number))
+    return repr(float(number))
+
+
+REGISTRY = MetricsRegistry()
+
+# Pipeline metrics shared by the API process and the analysis subprocesses
+HTTP_REQUEST_SECONDS = Histogram(
+    'mab_http_request_seconds', 'Page fetch and image download latency (cache hits included)', ('kind',))
+HTTP_BYTES = Counter('mab_http_downloaded_bytes_total', 'Bytes of pages and images downloaded', ('kind',))
+CONTEXT_SECONDS = Histogram('mab_context_extraction_seconds', 'Context extraction time per image')
+LLM_REQUEST_SECONDS = Histogram(
+    'mab_llm_request_seconds', 'Latency of successful LLM calls by step, provider and model (retries and backoff included)',
+    ('step', 'provider', 'model'))
+LLM_TOKENS = Counter(
+    'mab_llm_tokens_total', 'LLM tokens by step, provider, model and kind (input, cached_input, output)',
+    ('step', 'provider', 'model', 'kind'))
+LLM_COST = Counter('mab_llm_cost_total', 'Estimated LLM cost in the llm_costs currency', ('provider', 'model'))
+ERRORS = Counter(
+    'mab_errors_total', 'Errors by stage and class (rate_limit, auth, timeout, server, parse_failure, ...)',
+    ('stage', 'error_class'))
+CACHE_REQUESTS = Counter(
+    'mab_cache_requests_total', 'Cache lookups by cache and result (hit, revalidated, miss)', ('cache', 'result'))
+CACHE_HIT_RATIO = Gauge(
+    'mab_cache_hit_ratio', 'Share of cache lookups served from the cache; llm_prompt is cached input tokens / input tokens',
+    ('cache',))
+IMAGES_PROCESSED = Counter('mab_images_processed_total', 'Images processed by outcome', ('outcome',))
+
+
+def _cache_hit_ratios():
+    lookups = {}
+    for (cache, result), value in CACHE_REQUESTS.values().items():
+        hits, total = lookups.get(cache, (0.0, 0.0))
+        lookups[cache] = (hits + (value if result in ('hit', 'revalidated') else 0.0), total + value)
+    ratios = {(cache,): hits / total for cache, (hits, total) in lookups.items() if total}
+
+    tokens = {}
+    for (_, _, _, kind), value in LLM_TOKENS.values().items():
+        tokens[kind] = tokens.get(kind, 0.0) + value
+    if tokens.get('input'):
+        ratios[('llm_prompt',)] = tokens.get('cached_input', 0.0) / tokens['input']
+    return ratios
+
+
+CACHE_HIT_RATIO.set_function(_cache_hit_ratios)
+
+
+def render_metrics():
+    """Render the default registry in the Prometheus text format."""
+    return REGISTRY.render()
@@ -0,0 +1,291 @@
+"""
+Profiling for CLI runs and analysis jobs (--profile).
+
+Two profilers are available:
+
+- 'sampling' (default): a background thread samples the Python stack of
+  every thread at a fixed interval. It sees the image worker threads, costs
+  little, and classifies each sample by what the thread is doing:
+    network - blocked in socket, SSL or selector calls (page fetch, image
+              downloads, provider APIs)
+    waiting - blocked on locks, events, queues or futures (rate limiter,
+              concurrency windows, idle workers)
+    cpu     - running Python code or C extensions (parsing, image work, JSON)
+  Hotspots list where CPU time is spent and which of our functions wait on
+  the network; waiting samples only count in the per-state thread time.
+- 'cprofile': deterministic cProfile of the calling thread per phase, written
+  as .prof files for pstats or snakeviz. Worker threads are not profiled.
+
+In both modes each phase (download, context, generation, report) records its
+wall time and the process CPU time, so wall minus CPU bounds the time spent
+waiting on the network, the providers or locks.
+"""
+
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+
+PROFILE_MODES = ('sampling', 'cprofile')
+DEFAULT_SAMPLE_INTERVAL = 0.005
+DEFAULT_TOP_N = 20
+
+# Frames deeper than this are not walked for cumulative counts
+MAX_STACK_DEPTH = 128
+
+NETWORK_FILES = ('socket.py', 'ssl.py', 'selectors.py')
+WAITING_FILES = ('threading.py', 'queue.py')
+WAITING_PATHS = (os.path.join('concurrent', 'futures', '_base.py'), os.path.join('concurrent', 'futures', 'thread.py'))
+
+# Network samples are attributed to the innermost frame outside these folders (our code)
+LIBRARY_PATHS = tuple({sysconfig.get_paths()[key] for key in ('stdlib', 'platstdlib', 'purelib', 'platlib')})
+
+# Time outside any phase
+OTHER_PHASE = 'other'
+
+
+def classify_frame(frame):
+    """
+    Classify what a thread is doing from its innermost Python frame.
+
+    A thread blocked in a C call (socket read, lock acquire) shows the Python
+    frame that made the call, e.g. socket.py for a receive. Blocking C calls
+    made directly from our code (time.sleep) therefore count as cpu; the
+    per-phase wall/CPU split still shows them as waiting.
+
+    Returns:
+        str: 'network', 'waiting' or 'cpu'
+    """
+    filename = frame.f_code.co_filename
+    basename = os.path.basename(filename)
+    if basename in NETWORK_FILES:
+        return 'network'
+    if basename in WAITING_FILES or filename.endswith(WAITING_PATHS):
+        return 'waiting'
+    return 'cpu'
+
+
+def _caller_outside_libraries(frame):
+    caller = frame
+    while caller is not None and caller.f_code.co_filename.startswith(LIBRARY_PATHS):
+        caller = caller.f_back
+    return caller or frame
+
+
+def _location(filename, lineno, name):
+    return f"{name} ({os.path.basename(filename)}:{lineno})"
+
+
+class SamplingProfiler:
+    """Sample the stacks of all threads and aggregate them per phase."""
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.phase = None
+        self.stats = {}  # phase -> {'states': Counter, 'self': Counter, 'cumulative': Counter}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='profile-sampler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def _run(self):
+        own = threading.get_ident()
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            stats = self.stats.setdefault(self.phase or OTHER_PHASE,
+                                          {'states': Counter(), 'self': Counter(), 'cumulative': Counter()})
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                state = classify_frame(frame)
+                stats['states'][state] += elapsed
+                if state == 'waiting':
+                    continue  # Idle workers and coordination; only counted in the thread time
+                hotspot = _caller_outside_libraries(frame) if state == 'network' else frame
+                stats['self'][(hotspot.f_code.co_filename, hotspot.f_lineno, hotspot.f_code.co_name, state)] += elapsed
+                seen = set()
+                depth = 0
+                while frame is not None and depth < MAX_STACK_DEPTH:
+                    code = frame.f_code
+                    key = (code.co_filename, code.co_firstlineno, code.co_name)
+                    if key not in seen:
+                        seen.add(key)
+                        stats['cumulative'][key] += elapsed
+                    frame = frame.f_back
+                    depth += 1
+
+
+class RunProfiler:
+    """Per-phase profiles of one run, written next to the session logs."""
+
+    def __init__(self, mode='sampling', top_n=DEFAULT_TOP_N, interval=DEFAULT_SAMPLE_INTERVAL):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode '{mode}' (expected one of: {', '.join(PROFILE_MODES)})")
+        self.mode = mode
+        self.top_n = top_n
+        self.phases = {}  # name -> {'wall_seconds', 'cpu_seconds', 'calls'}
+        self.sampler = SamplingProfiler(interval) if mode == 'sampling' else None
+        self._cprofiles = {}
+        self._cprofile_active = False
+        self._start = None
+        self._wall = None
+        self._cpu = None
+
+    def start(self):
+        self._start = (time.perf_counter(), time.process_time())
+        if self.sampler is not None:
+            self.sampler.start()
+
+    def stop(self):
+        if self._start is None or self._wall is not None:
+            return
+        if self.sampler is not None:
+            self.sampler.stop()
+        self._wall = time.perf_counter() - self._start[0]
+        self._cpu = time.process_time() - self._start[1]
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Profile a block as one phase; repeated phases are added up."""
+        previous = self.sampler.phase if self.sampler is not None else None
+        if self.sampler is not None:
+            self.sampler.phase = name
+        profile = None
+        if self.mode == 'cprofile' and not self._cprofile_active:
+            # Only one cProfile can be active per thread; nested phases count in the outer one
+            profile = cProfile.Profile()
+            self._cprofile_active = True
+            profile.enable()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            if profile is not None:
+                profile.disable()
+                self._cprofile_active = False
+                self._cprofiles.setdefault(name, []).append(profile)
+            if self.sampler is not None:
+                self.sampler.phase = previous
+            totals = self.phases.setdefault(name, {'wall_seconds': 0.0, 'cpu_seconds': 0.0, 'calls': 0})
+            totals['wall_seconds'] += wall
+            totals['cpu_seconds'] += cpu
+            totals['calls'] += 1
+
+    def _phase_summary(self, name, totals):
+        summary = {
+            'wall_seconds': round(totals['wall_seconds'], 3),
+            'cpu_seconds': round(totals['cpu_seconds'], 3),
+            'wait_seconds': round(max(totals['wall_seconds'] - totals['cpu_seconds'], 0.0), 3)
+        }
+        stats = self.sampler.stats.get(name) if self.sampler is not None else None
+        if stats:
+            summary['thread_seconds'] = {state: round(seconds, 3) for state, seconds in stats['states'].items()}
+            summary['hotspots'] = [
+                {'function': _location(filename, lineno, function), 'state': state, 'seconds': round(seconds, 3)}
+                for (filename, lineno, function, state), seconds in stats['self'].most_common(self.top_n)
+            ]
+            summary['cumulative'] = [
+                {'function': _location(filename, lineno, function), 'seconds': round(seconds, 3)}
+                for (filename, lineno, function), seconds in stats['cumulative'].most_common(self.top_n)
+            ]
+        elif name in self._cprofiles:
+            stats = self._pstats(name)
+            summary['hotspots'] = [
+                {'function': _location(filename, lineno, function), 'calls': calls, 'seconds': round(total, 3),
+                 'cumulative_seconds': round(cumulative, 3)}
+                for (filename, lineno, function), (_, calls, total, cumulative, _) in
+                sorted(stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:self.top_n]
+            ]
+        return summary
+
+    def _pstats(self, name, stream=None):
+        profiles = self._cprofiles[name]
+        stats = pstats.Stats(profiles[0], stream=stream or io.StringIO())
+        for profile in profiles[1:]:
+            stats.add(profile)
+        return stats
+
+    def summary(self):
+        """
+        Return the profile of the run.
+
+        Returns:
+            dict: {mode, wall_seconds, cpu_seconds, phases: {name: {wall_seconds, cpu_seconds,
+                   wait_seconds, thread_seconds (sampling), hotspots, cumulative (sampling)}}}
+        """
+        self.stop()
+        phases = {name: self._phase_summary(name, totals) for name, totals in self.phases.items()}
+        if self.sampler is not None and OTHER_PHASE in self.sampler.stats:
+            outside_wall = max(self._wall - sum(t['wall_seconds'] for t in self.phases.values()), 0.0)
+            outside_cpu = max(self._cpu - sum(t['cpu_seconds'] for t in self.phases.values()), 0.0)
+            phases[OTHER_PHASE] = self._phase_summary(OTHER_PHASE, {'wall_seconds': outside_wall, 'cpu_seconds': outside_cpu})
+        return {
+            'mode': self.mode,
+            'wall_seconds': round(self._wall or 0.0, 3),
+            'cpu_seconds': round(self._cpu or 0.0, 3),
+            'phases': phases
+        }
+
+    def write(self, folder):
+        """
+        Write profile.json, a text report per phase and, in cprofile mode, a .prof file per phase.
+
+        Args:
+            folder (str): Output folder (created if missing)
+
+        Returns:
+            dict: The summary() that was written
+        """
+        summary = self.summary()
+        os.makedirs(folder, exist_ok=True)
+        with open(os.path.join(folder, 'profile.json'), 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        for name, phase in summary['phases'].items():
+            with open(os.path.join(folder, f'profile-{name}.txt'), 'w', encoding='utf-8') as f:
+                f.write('\n'.join(format_phase(name, phase)) + '\n')
+                if name in self._cprofiles:
+                    stream = io.StringIO()
+                    self._pstats(name, stream).sort_stats('cumulative').print_stats(self.top_n)
+                    f.write('\n' + stream.getvalue())
+            if name in self._cprofiles:
+                self._pstats(name).dump_stats(os.path.join(folder, f'profile-{name}.prof'))
+        return summary
+
+
+def format_phase(name, phase, top_n=None):
+    """Readable lines for one phase of a summary()."""
+    lines = [f"{name}: {phase['wall_seconds']:.2f}s wall, {phase['cpu_seconds']:.2f}s CPU, "
+             f"{phase['wait_seconds']:.2f}s waiting (network, providers, locks)"]
+    threads = phase.get('thread_seconds')
+    if threads:
+        lines.append("  thread time: " + ", ".join(f"{state} {threads.get(state, 0.0):.2f}s"
+                                                   for state in ('cpu', 'network', 'waiting')))
+    for hotspot in phase.get('hotspots', [])[:top_n]:
+        detail = hotspot.get('state') or f"{hotspot['calls']} calls"
+        lines.append(f"  {hotspot['seconds']:>8.3f}s  {detail:<10} {hotspot['function']}")
+    return lines
+
+
+def format_summary(summary, top_n=10):
+    """Readable hotspot summary of a run, top_n hotspots per phase."""
+    lines = [f"Profile ({summary['mode']}): {summary['wall_seconds']:.2f}s wall, {summary['cpu_seconds']:.2f}s CPU"]
+    for name, phase in summary['phases'].items():
+        lines.extend(format_phase(name, phase, top_n))
+    return '\n'.join(lines)
@@ -0,0 +1,347 @@
+"""
+Per-provider/model rate limiting and retries for LLM calls.
+
+Every provider call is gated by two token buckets per (provider, model) key:
+requests per minute (RPM) and tokens per minute (TPM). Bucket state can be kept
+in a small JSON file guarded by an exclusive file lock, so every analysis
+process (the API runs each job as a separate CLI process) draws from the same
+quota. Without file locking support the buckets are process-local.
+
+Failed calls are retried with exponential backoff and full jitter. Rate-limit
+responses honour Retry-After / retry-after-ms and the x-ratelimit-* (OpenAI)
+and anthropic-ratelimit-* reset headers, and block the bucket for everyone
+until the reset time (at most max_delay, so one long reset header cannot
+freeze a key for every process). Waiting for the buckets is bounded by the
+image deadline.
+"""
+
+import contextlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from email.utils import parsedate_to_datetime
+
+try:
+    import fcntl
+    FILE_LOCKING_AVAILABLE = True
+except ImportError:  # Windows
+    fcntl = None
+    FILE_LOCKING_AVAILABLE = False
+
+from services.deadlines import DeadlineExceededError
+
+RATE_LIMIT_MARKERS = ('rate_limit', 'rate limit', 'too many requests', 'resource_exhausted', 'quota exceeded')
+TRANSIENT_MARKERS = ('overloaded', 'timed out', 'timeout', 'temporarily unavailable', 'connection reset',
+                     'connection error', 'service unavailable', 'bad gateway')
+TRANSIENT_EXCEPTION_NAMES = ('Timeout', 'Connection', 'ServiceUnavailable', 'InternalServer', 'Overloaded',
+                             'DeadlineExceeded')
+
+_DURATION_RE = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+
+
+def parse_reset_duration(value):
+    """
+    Parse a reset/retry value into seconds.
+
+    Accepts plain seconds ("20", "1.5"), OpenAI durations ("6m0s", "20ms", "1h2m"),
+    HTTP dates and RFC 3339 timestamps (Anthropic reset headers).
+
+    Returns:
+        float: Seconds from now, or None if the value cannot be parsed
+    """
+    if value is None:
+        return None
+    value = str(value).strip()
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    matches = _DURATION_RE.findall(value)
+    if matches and ''.join(f"{n}{u}" for n, u in matches) == value:
+        factors = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+        return sum(float(number) * factors[unit] for number, unit in matches)
+
+    for parse in (parsedate_to_datetime, lambda v: datetime.fromisoformat(v.replace('Z', '+00:00'))):
+        try:
+            return max(parse(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError, IndexError, OverflowError):
+            continue
+    return None
+
+
+def _error_headers(exc):
+    response = getattr(exc, 'response', None)
+    headers = getattr(response, 'headers', None)
+    if headers is None:
+        return {}
+    try:
+        return {str(k).lower(): v for k, v in headers.items()}
+    except AttributeError:
+        return {}
+
+
+def _error_status(exc):
+    for candidate in (getattr(exc, 'status_code', None),
+                      getattr(getattr(exc, 'response', None), 'status_code', None),
+                      getattr(exc, 'code', None)):
+        if isinstance(candidate, int):
+            return candidate
+    return None
+
+
+def classify_llm_error(exc):
+    """
+    Classify a provider SDK exception for retry decisions.
+
+    Works on exceptions from the OpenAI, Anthropic, Ollama and Gemini SDKs by
+    duck typing (status codes, response headers, class names and messages).
+
+    Returns:
+        dict: {
+            'rate_limited': bool (429 / quota / rate-limit error),
+            'retryable': bool (rate limit, 5xx, overload, timeout, connection error),
+            'retry_after': float seconds the server asked to wait, or None,
+            'status': int HTTP status if known
+        }
+    """
+    status = _error_status(exc)
+    headers = _error_headers(exc)
+    message = str(exc).lower()
+    name = type(exc).__name__
+
+    rate_limited = status == 429 or 'RateLimit' in name or any(marker in message for marker in RATE_LIMIT_MARKERS)
+    transient = (
+        (status is not None and (status >= 500 or status == 408)) or
+        any(part in name for part in TRANSIENT_EXCEPTION_NAMES) or
+        any(marker in message for marker in TRANSIENT_MARKERS)
+    )
+    if status is not None and 400 <= status < 500 and status not in (408, 429):
+        transient = False  # Authentication, bad request, model not found, ...
+    if getattr(exc, 'retryable', None) is False:
+        transient = False  # Errors that know retrying cannot help (e.g. an exhausted deadline)
+
+    retry_after = None
+    if 'retry-after-ms' in headers:
+        ms = parse_reset_duration(headers['retry-after-ms'])
+        retry_after = ms / 1000.0 if ms is not None else None
+    if retry_after is None and 'retry-after' in headers:
+        retry_after = parse_reset_duration(headers['retry-after'])
+    if retry_after is None and rate_limited:
+        # Fall back to the reset time of whichever quota is exhausted
+        resets = []
+        for kind in ('requests', 'tokens', 'input-tokens', 'output-tokens'):
+            for remaining_key, reset_key in ((f'x-ratelimit-remaining-{kind}', f'x-ratelimit-reset-{kind}'),
+                                             (f'anthropic-ratelimit-{kind}-remaining', f'anthropic-ratelimit-{kind}-reset')):
+                if str(headers.get(remaining_key, '')).strip() == '0':
+                    reset = parse_reset_duration(headers.get(reset_key))
+                    if reset is not None:
+                        resets.append(reset)
+        if resets:
+            retry_after = max(resets)
+
+    return {
+        'rate_limited': rate_limited,
+        'retryable': rate_limited or transient,
+        'retry_after': retry_after,
+        'status': status
+    }
+
+
+def backoff_delay(attempt, base_delay=1.0, max_delay=60.0, retry_after=None):
+    """
+    Delay before retry number `attempt` (0-based): full jitter exponential backoff.
+
+    A server-provided Retry-After is treated as a lower bound.
+    """
+    delay = random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, max_delay) + random.uniform(0, base_delay))
+    return delay
+
+
+class RateLimiter:
+    """
+    RPM/TPM token buckets per key, optionally shared between processes via a state file.
+
+    Limits are passed per call as {'rpm': int, 'tpm': int}; 0 or missing means unlimited.
+    """
+
+    def __init__(self, state_path=None):
+        self.state_path = state_path if (state_path and FILE_LOCKING_AVAILABLE) else None
+        self._thread_lock = threading.Lock()
+        self._local_state = {}
+        if self.state_path:
+            os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+
+    @contextlib.contextmanager
+    def _state(self):
+        with self._thread_lock:
+            if not self.state_path:
+                yield self._local_state
+                return
+            with open(self.state_path, 'a+', encoding='utf-8') as f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+                try:
+                    f.seek(0)
+                    try:
+                        state = json.loads(f.read() or '{}')
+                    except ValueError:
+                        state = {}
+                    yield state
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                finally:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _refill(bucket, limits, now):
+        elapsed = max(now - bucket.get('updated', now), 0)
+        rpm = limits.get('rpm') or 0
+        tpm = limits.get('tpm') or 0
+        if rpm:
+            bucket['requests'] = min(rpm, bucket.get('requests', rpm) + elapsed * rpm / 60.0)
+        if tpm:
+            bucket['tokens'] = min(tpm, bucket.get('tokens', tpm) + elapsed * tpm / 60.0)
+        bucket['updated'] = now
+
+    def acquire(self, key, limits, tokens=0, deadline=None, step='llm'):
+        """
+        Block until one request of `tokens` estimated tokens fits in the buckets.
+
+        Args:
+            key (str): Bucket key, e.g. 'OpenAI/gpt-4o'
+            limits (dict): {'rpm': int, 'tpm': int}
+            tokens (int): Estimated tokens of the request (clamped to the TPM capacity)
+            deadline (ImageDeadline): Image deadline bounding the wait, None for no limit
+            step (str): Step name for DeadlineExceededError
+
+        Returns:
+            float: Seconds spent waiting
+
+        Raises:
+            DeadlineExceededError: The buckets have no room before the deadline runs out
+        """
+        rpm = limits.get('rpm') or 0
+        tpm = limits.get('tpm') or 0
+        tokens = min(tokens, tpm) if tpm else 0
+        waited = 0.0
+
+        while True:
+            with self._state() as state:
+                now = time.time()
+                bucket = state.setdefault(key, {})
+                self._refill(bucket, limits, now)
+
+                wait = max(bucket.get('blocked_until', 0) - now, 0)
+                if rpm and bucket['requests'] < 1:
+                    wait = max(wait, (1 - bucket['requests']) * 60.0 / rpm)
+                if tpm and bucket['tokens'] < tokens:
+                    wait = max(wait, (tokens - bucket['tokens']) * 60.0 / tpm)
+
+                if wait <= 0:
+                    if rpm:
+                        bucket['requests'] -= 1
+                    if tpm:
+                        bucket['tokens'] -= tokens
+                    return waited
+
+            remaining = deadline.remaining() if deadline is not None else None
+            if remaining is not None and wait > remaining:
+                raise DeadlineExceededError(step, deadline.budget)
+            sleep_for = min(wait, 5.0)
+            time.sleep(sleep_for)
+            waited += sleep_for
+
+    def reconcile(self, key, limits, estimated_tokens, actual_tokens):
+        """Correct the token bucket once the real usage of a request is known."""
+        tpm = limits.get('tpm') or 0
+        if not tpm or actual_tokens is None:
+            return
+        with self._state() as state:
+            bucket = state.setdefault(key, {})
+            self._refill(bucket, limits, time.time())
+            charged = min(estimated_tokens, tpm)
+            bucket['tokens'] = min(tpm, bucket['tokens'] + charged - actual_tokens)
+
+    def block(self, key, seconds):
+        """Hold back all requests for `key` for the given number of seconds (e.g. after a 429)."""
+        if not seconds or seconds <= 0:
+            return
+        with self._state() as state:
+            bucket = state.setdefault(key, {})
+            bucket['blocked_until'] = max(bucket.get('blocked_until', 0), time.time() + seconds)
+
+
+def run_with_rate_limit(limiter, key, limits, request_fn, estimated_tokens=0, usage_fn=None,
+                        max_retries=5, base_delay=1.0, max_delay=60.0, on_retry=None, deadline=None, step='llm'):
+    """
+    Execute a provider call under the rate limiter, retrying transient failures.
+
+    Args:
+        limiter (RateLimiter): Shared limiter
+        key (str): Bucket key ('Provider/model')
+        limits (dict): {'rpm': int, 'tpm': int}
+        request_fn (callable): Performs the API call and returns the raw response
+        estimated_tokens (int): Tokens charged before the call
+        usage_fn (callable): response -> actual total tokens (or None), used to reconcile
+        max_retries (int): Retries after the first attempt
+        base_delay (float): Backoff base in seconds
+        max_delay (float): Backoff cap in seconds, also the longest a 429 blocks the key
+        on_retry (callable): Called as on_retry(attempt, delay, error_info, exc) before sleeping
+        deadline (ImageDeadline): Image deadline bounding the wait for the buckets
+        step (str): Step name for DeadlineExceededError
+
+    Returns:
+        Response returned by request_fn
+
+    Raises:
+        The last exception when it is not retryable or retries are exhausted
+    """
+    attempt = 0
+    while True:
+        limiter.acquire(key, limits, estimated_tokens, deadline, step)
+        try:
+            response = request_fn()
+        except Exception as exc:
+            info = classify_llm_error(exc)
+            if info['rate_limited']:
+                limiter.block(key, min(info['retry_after'], max_delay) if info['retry_after'] is not None
+                              else backoff_delay(attempt, base_delay, max_delay))
+            if not info['retryable'] or attempt >= max_retries:
+                raise
+            delay = backoff_delay(attempt, base_delay, max_delay, info['retry_after'])
+            if on_retry:
+                on_retry(attempt + 1, delay, info, exc)
+            time.sleep(delay)
+            attempt += 1
+            continue
+
+        if usage_fn is not None:
+            try:
+                limiter.reconcile(key, limits, estimated_tokens, usage_fn(response))
+            except Exception:
+                pass  # Usage accounting must never fail a successful call
+        return response
+
+
+_LIMITERS = {}
+_LIMITERS_LOCK = threading.Lock()
+
+
+def get_rate_limiter(state_path=None):
+    """Return the process-wide limiter for a state file (None = process-local buckets)."""
+    with _LIMITERS_LOCK:
+        limiter = _LIMITERS.get(state_path)
+        if limiter is None:
+            limiter = RateLimiter(state_path)
+            _LIMITERS[state_path] = limiter
+        return limiter
@@ -0,0 +1,446 @@
+"""
+Offline stub LLM server for load tests and benchmarks.
+
+A local HTTP server speaking the two wire protocols the pipeline uses:
+
+- OpenAI chat completions: POST /v1/chat/completions (the 'Stub' provider
+  and any OpenAI-compatible client pointed at it)
+- Ollama chat: POST /api/chat (the 'Ollama' provider with ollama.base_url
+  pointed at it)
+
+Responses are deterministic functions of the request, shaped like the real
+ones the pipeline expects:
+
+- a json_schema response_format is filled in from the schema (alt-text
+  result, cascade confidence, batched vision descriptions)
+- prompts asking for the alt-text JSON or batched descriptions get a
+  schema-valid object, also without a schema (Ollama format='json')
+- other requests with images get a plain image description
+- translation prompts get the quoted source text back
+
+Latency follows a configurable distribution (fixed, uniform or lognormal,
+plus an optional cost per output token); a share of requests fails with HTTP
+500 or 429 (with Retry-After). Usage reports tokens estimated from the
+prompt, including cached prompt tokens for repeated system prompts, so the
+usage ledger, metrics and cost accounting see realistic numbers.
+
+Random draws are seeded per request content and attempt, so a run sees the
+same latencies and failures whatever the thread interleaving. GET /stats
+returns the request, failure and token counters.
+"""
+
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_STUB_SETTINGS = {
+    'host': '127.0.0.1',
+    'port': 0,  # 0 = any free port
+    'seed': 0,
+    'latency': {
+        'distribution': 'lognormal',  # none, fixed, uniform or lognormal
+        'fixed_ms': 500,
+        'min_ms': 200,
+        'max_ms': 30000,
+        'median_ms': 800,
+        'sigma': 0.5
+    },
+    'ms_per_output_token': 0.0,
+    'error_rate': 0.0,
+    'rate_limit_rate': 0.0,
+    'retry_after_seconds': 1,
+    'chars_per_token': 4.0,
+    'image_tokens': 765,
+    'prompt_cache': True
+}
+
+LATENCY_DISTRIBUTIONS = ('none', 'fixed', 'uniform', 'lognormal')
+
+IMAGE_TYPES = ('informative', 'decorative', 'functional')
+SUBJECTS = ('a chart', 'a group of people', 'a building', 'a product photo', 'a logo', 'a landscape',
+            'a screenshot', 'a diagram', 'an illustration', 'a portrait')
+SETTINGS_WORDS = ('in an office', 'outdoors', 'on a white background', 'at a conference', 'in a city street',
+                  'on a desk', 'in a laboratory', 'at sunset')
+
+DEFAULT_MAX_CHARS = 125
+
+
+def merge_settings(settings=None):
+    """Return DEFAULT_STUB_SETTINGS updated with settings (latency merged key by key)."""
+    options = dict(DEFAULT_STUB_SETTINGS)
+    options['latency'] = dict(DEFAULT_STUB_SETTINGS['latency'])
+    for key, value in (settings or {}).items():
+        if key == 'latency' and isinstance(value, dict):
+            options['latency'].update(value)
+        elif not key.startswith('_'):
+            options[key] = value
+    if options['latency']['distribution'] not in LATENCY_DISTRIBUTIONS:
+        raise ValueError(f"Unknown latency distribution '{options['latency']['distribution']}' "
+                         f"(expected one of: {', '.join(LATENCY_DISTRIBUTIONS)})")
+    return options
+
+
+def draw_latency(rng, latency):
+    """
+    Draw one response latency in seconds.
+
+    Args:
+        rng (random.Random): Seeded generator
+        latency (dict): The 'latency' settings
+
+    Returns:
+        float: Seconds, clipped to [min_ms, max_ms] for random distributions
+    """
+    distribution = latency['distribution']
+    if distribution == 'none':
+        return 0.0
+    if distribution == 'fixed':
+        return latency['fixed_ms'] / 1000.0
+    if distribution == 'uniform':
+        ms = rng.uniform(latency['min_ms'], latency['max_ms'])
+    else:
+        ms = rng.lognormvariate(math.log(latency['median_ms']), latency['sigma'])
+    return min(max(ms, latency['min_ms']), latency['max_ms']) / 1000.0
+
+
+def _text_and_images(messages):
+    # OpenAI content is a string or a list of parts; Ollama attaches base64 images per message
+    texts, images, system = [], 0, []
+    for message in messages or []:
+        content = message.get('content')
+        if isinstance(content, list):
+            for part in content:
+                if part.get('type') == 'text':
+                    texts.append(part.get('text', ''))
+                elif part.get('type') in ('image_url', 'image'):
+                    images += 1
+        elif content:
+            texts.append(content)
+            if message.get('role') == 'system':
+                system.append(content)
+        images += len(message.get('images') or [])
+    return '\n'.join(texts), images, '\n'.join(system)
+
+
+def _max_chars(prompt):
+    match = re.search(r'(\d+) characters or (?:less|fewer)', prompt) or re.search(r'max (\d+) characters', prompt)
+    return int(match.group(1)) if match else DEFAULT_MAX_CHARS
+
+
+def _sentence(rng, index=None):
+    subject = rng.choice(SUBJECTS)
+    where = rng.choice(SETTINGS_WORDS)
+    label = f" (image {index})" if index is not None else ''
+    return f"The image shows {subject} {where}{label}, with clear details and readable labels."
+
+
+def _alt_text(rng, max_chars):
+    text = f"{rng.choice(SUBJECTS).capitalize()} {rng.choice(SETTINGS_WORDS)}."
+    return text if len(text) <= max_chars else text[:max(max_chars - 1, 1)].rstrip() + '.'
+
+
+def _from_schema(schema, rng, context, name=None, index=None):
+    # Fill in a JSON schema with plausible values; arrays get one item per image
+    kind = schema.get('type')
+    if kind == 'object' or 'properties' in schema:
+        return {key: _from_schema(sub, rng, context, key, index) for key, sub in schema.get('properties', {}).items()}
+    if kind == 'array':
+        count = max(context['images'], 1)
+        return [_from_schema(schema.get('items', {}), rng, context, name, i) for i in range(1, count + 1)]
+    if 'enum' in schema:
+        return rng.choice(schema['enum'])
+    if kind == 'integer':
+        return index if index is not None else 1
+    if kind == 'number':
+        return round(rng.uniform(0.6, 0.98), 2)
+    if kind == 'boolean':
+        return True
+    if name == 'alt_text':
+        return _alt_text(rng, context['max_chars'])
+    if name == 'reasoning':
+        return "The image conveys information relevant to the surrounding content, so it needs a concise description."
+    return _sentence(rng, index)
+
+
+ALT_TEXT_OBJECT_SCHEMA = {'type': 'object', 'properties': {
+    'image_type': {'type': 'string', 'enum': list(IMAGE_TYPES)},
+    'image_description': {'type': 'string'},
+    'reasoning': {'type': 'string'},
+    'alt_text': {'type': 'string'}
+}}
+BATCH_OBJECT_SCHEMA = {'type': 'object', 'properties': {'descriptions': {'type': 'array', 'items': {
+    'type': 'object', 'properties': {'index': {'type': 'integer'}, 'description': {'type': 'string'}}}}}}
+
+
+def generate_content(prompt, images, schema, rng):
+    """
+    Build the response text for a request.
+
+    Args:
+        prompt (str): All text of the request messages
+        images (int): Number of attached images
+        schema (dict): JSON schema from the response_format, or None
+        rng (random.Random): Generator seeded from the request
+
+    Returns:
+        str: Response content (JSON text for structured or JSON-prompted requests)
+    """
+    context = {'images': images, 'max_chars': _max_chars(prompt)}
+    if schema is None:
+        if '"descriptions"' in prompt:
+            schema = BATCH_OBJECT_SCHEMA
+        elif '"alt_text"' in prompt or 'alt_text' in prompt and 'JSON' in prompt:
+            schema = ALT_TEXT_OBJECT_SCHEMA
+    if schema is not None:
+        return json.dumps(_from_schema(schema, rng, context), ensure_ascii=False)
+    if images:
+        return _sentence(rng)
+    source = re.search(r'Source text[^:]*:\s*"(.*)"', prompt, re.DOTALL)
+    if source:
+        return source.group(1).strip()
+    return _alt_text(rng, context['max_chars'])
+
+
+class StubLLM:
+    """Request handling shared by both protocols: seeding, failures, latency and usage."""
+
+    def __init__(self, settings=None):
+        self.settings = merge_settings(settings)
+        self._lock = threading.Lock()
+        self._attempts = {}  # request digest -> attempts seen (retries draw again)
+        self._cached_prefixes = set()
+        self.counters = {'requests': 0, 'errors': 0, 'rate_limited': 0, 'images': 0,
+                         'prompt_tokens': 0, 'cached_tokens': 0, 'completion_tokens': 0}
+
+    def _rng(self, body):
+        digest = hashlib.sha256(json.dumps(body, sort_keys=True, default=str).encode('utf-8')).hexdigest()
+        with self._lock:
+            attempt = self._attempts.get(digest, 0)
+            self._attempts[digest] = attempt + 1
+        return random.Random(f"{self.settings['seed']}:{digest}:{attempt}"), random.Random(f"{self.settings['seed']}:{digest}")
+
+    def _tokens(self, text):
+        return int(math.ceil(len(text) / float(self.settings['chars_per_token']))) if text else 0
+
+    def complete(self, body, schema):
+        """
+        Answer one chat request.
+
+        Args:
+            body (dict): Request JSON
+            schema (dict): Requested JSON schema, or None
+
+        Returns:
+            tuple: (status, result) where result is {'content', 'prompt_tokens', 'cached_tokens',
+                   'completion_tokens', 'seconds'} for status 200, or an error message otherwise
+        """
+        started = time.perf_counter()
+        attempt_rng, content_rng = self._rng(body)
+        prompt, images, system = _text_and_images(body.get('messages'))
+        with self._lock:
+            self.counters['requests'] += 1
+
+        # Failures are drawn per attempt, the content per request: retries get the same answer
+        roll = attempt_rng.random()
+        failure = None
+        if roll < self.settings['rate_limit_rate']:
+            failure = 429
+        elif roll < self.settings['rate_limit_rate'] + self.settings['error_rate']:
+            failure = 500
+        delay = draw_latency(attempt_rng, self.settings['latency'])
+        if failure is not None:
+            time.sleep(min(delay, 0.05))
+            with self._lock:
+                self.counters['rate_limited' if failure == 429 else 'errors'] += 1
+            return failure, 'Rate limit reached (stub)' if failure == 429 else 'Internal server error (stub)'
+
+        content = generate_content(prompt, images, schema, content_rng)
+        prompt_tokens = self._tokens(prompt) + images * self.settings['image_tokens']
+        completion_tokens = self._tokens(content)
+        cached_tokens = 0
+        if self.settings['prompt_cache'] and system:
+            key = hashlib.sha256(system.encode('utf-8')).hexdigest()
+            with self._lock:
+                if key in self._cached_prefixes:
+                    cached_tokens = self._tokens(system)
+                self._cached_prefixes.add(key)
+
+        delay += completion_tokens * self.settings['ms_per_output_token'] / 1000.0
+        remaining = delay - (time.perf_counter() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+        with self._lock:
+            self.counters['images'] += images
+            self.counters['prompt_tokens'] += prompt_tokens
+            self.counters['cached_tokens'] += cached_tokens
+            self.counters['completion_tokens'] += completion_tokens
+        return 200, {'content': content, 'prompt_tokens': prompt_tokens, 'cached_tokens': cached_tokens,
+                     'completion_tokens': completion_tokens, 'seconds': time.perf_counter() - started}
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+def _openai_schema(body):
+    response_format = body.get('response_format') or {}
+    if response_format.get('type') == 'json_schema':
+        return (response_format.get('json_schema') or {}).get('schema') or ALT_TEXT_OBJECT_SCHEMA
+    return None
+
+
+def _ollama_schema(body):
+    # Ollama takes format='json' or a JSON schema object
+    return body['format'] if isinstance(body.get('format'), dict) else None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = 'StubLLM/1.0'
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def _send(self, status, payload, headers=None):
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b'{}')
+        except ValueError:
+            return None
+
+    def _error(self, status, message, ollama):
+        headers = {'Retry-After': str(self.server.stub.settings['retry_after_seconds'])} if status == 429 else None
+        if ollama:
+            payload = {'error': message}
+        else:
+            kind = {429: 'rate_limit_exceeded', 400: 'invalid_request_error'}.get(status, 'server_error')
+            payload = {'error': {'message': message, 'type': kind, 'code': kind}}
+        self._send(status, payload, headers)
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0].rstrip('/')
+        if path in ('/v1/models', '/models'):
+            self._send(200, {'object': 'list', 'data': [{'id': 'stub', 'object': 'model', 'owned_by': 'stub'}]})
+        elif path == '/api/tags':
+            self._send(200, {'models': [{'name': 'stub', 'model': 'stub'}]})
+        elif path == '/stats':
+            self._send(200, self.server.stub.stats())
+        elif path in ('', '/health'):
+            self._send(200, {'status': 'ok'})
+        else:
+            self._send(404, {'error': f'Unknown path {path}'})
+
+    def do_POST(self):
+        path = self.path.split('?', 1)[0].rstrip('/')
+        ollama = path == '/api/chat'
+        if path not in ('/v1/chat/completions', '/chat/completions', '/api/chat'):
+            self._send(404, {'error': f'Unknown path {path}'})
+            return
+        body = self._body()
+        if not isinstance(body, dict) or not isinstance(body.get('messages'), list):
+            self._error(400, "Request body must be a JSON object with a 'messages' list", ollama)
+            return
+
+        status, result = self.server.stub.complete(body, _ollama_schema(body) if ollama else _openai_schema(body))
+        if status != 200:
+            self._error(status, result, ollama)
+            return
+        model = body.get('model') or 'stub'
+        if ollama:
+            nanoseconds = int(result['seconds'] * 1e9)
+            self._send(200, {
+                'model': model,
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+                'message': {'role': 'assistant', 'content': result['content']},
+                'done': True,
+                'done_reason': 'stop',
+                'total_duration': nanoseconds,
+                'eval_duration': nanoseconds,
+                'prompt_eval_count': result['prompt_tokens'],
+                'eval_count': result['completion_tokens']
+            })
+        else:
+            request_id = base64.b32encode(hashlib.sha256(result['content'].encode('utf-8')).digest()[:10]).decode().lower()
+            self._send(200, {
+                'id': f'chatcmpl-stub-{request_id}',
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': model,
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': result['content']}}],
+                'usage': {
+                    'prompt_tokens': result['prompt_tokens'],
+                    'completion_tokens': result['completion_tokens'],
+                    'total_tokens': result['prompt_tokens'] + result['completion_tokens'],
+                    'prompt_tokens_details': {'cached_tokens': result['cached_tokens']}
+                }
+            })
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """Threaded stub server; one thread per connection, so slow responses overlap like a real API."""
+
+    daemon_threads = True
+
+    def __init__(self, settings=None):
+        self.stub = StubLLM(settings)
+        super().__init__((self.stub.settings['host'], int(self.stub.settings['port'])), _Handler)
+        self._thread = None
+
+    @property
+    def base_url(self):
+        """Root URL, e.g. http://127.0.0.1:8911 (Ollama base_url)."""
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    @property
+    def openai_base_url(self):
+        """OpenAI-compatible base URL, e.g. http://127.0.0.1:8911/v1."""
+        return self.base_url + '/v1'
+
+    def start(self):
+        """Serve in a daemon thread and return self."""
+        self._thread = threading.Thread(target=self.serve_forever, name='stub-llm-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+_IN_PROCESS_SERVER = None
+_IN_PROCESS_LOCK = threading.Lock()
+
+
+def ensure_stub_server(settings=None):
+    """
+    Start the in-process stub server on first use.
+
+    Args:
+        settings (dict): Overrides for DEFAULT_STUB_SETTINGS
+
+    Returns:
+        StubLLMServer: The running server (shared by all later calls)
+    """
+    global _IN_PROCESS_SERVER
+    with _IN_PROCESS_LOCK:
+        if _IN_PROCESS_SERVER is None:
+            _IN_PROCESS_SERVER = StubLLMServer(settings).start()
+        return _IN_PROCESS_SERVER
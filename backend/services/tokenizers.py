@@ -0,0 +1,121 @@
+"""
+Per-provider token estimators.
+
+Prompt budgets are set in tokens, but each provider counts tokens with its own
+tokenizer. A tokenizer here is any callable text -> int, registered per
+provider with register_tokenizer(). By default:
+
+- OpenAI / ECB-LLM: tiktoken (exact) when installed
+- every provider: a characters-per-token heuristic tuned per provider
+
+count_tokens() picks the registered tokenizer for the provider and falls back
+to the heuristic, so callers never need to know which one is available.
+"""
+
+import threading
+
+from services.llm_usage import CHARS_PER_TOKEN
+
+try:
+    import tiktoken
+    TIKTOKEN_AVAILABLE = True
+except ImportError:
+    tiktoken = None
+    TIKTOKEN_AVAILABLE = False
+
+# Average characters per token when no exact tokenizer is available
+PROVIDER_CHARS_PER_TOKEN = {
+    'OpenAI': 4.0,
+    'ECB-LLM': 4.0,
+    'Claude': 3.5,
+    'Gemini': 4.0,
+    'Ollama': 3.8,
+    'Stub': 4.0
+}
+
+# tiktoken encoding for models tiktoken does not know yet
+DEFAULT_TIKTOKEN_ENCODING = 'o200k_base'
+
+_TOKENIZERS = {}
+_ENCODINGS = {}
+_LOCK = threading.Lock()
+
+
+def heuristic_token_count(text, provider=None):
+    """
+    Estimate tokens from the text length.
+
+    Args:
+        text (str): Text to count
+        provider (str): Provider name, selects the characters-per-token ratio
+
+    Returns:
+        int: Estimated token count
+    """
+    if not text:
+        return 0
+    chars_per_token = PROVIDER_CHARS_PER_TOKEN.get(provider, CHARS_PER_TOKEN)
+    return max(1, int(len(text) / chars_per_token + 0.999))
+
+
+def _tiktoken_encoding(model):
+    with _LOCK:
+        encoding = _ENCODINGS.get(model)
+        if encoding is None:
+            try:
+                encoding = tiktoken.encoding_for_model(model)
+            except KeyError:
+                encoding = tiktoken.get_encoding(DEFAULT_TIKTOKEN_ENCODING)
+            _ENCODINGS[model] = encoding
+        return encoding
+
+
+def tiktoken_token_count(text, model=None):
+    """Count tokens exactly with tiktoken (OpenAI models)."""
+    if not text:
+        return 0
+    return len(_tiktoken_encoding(model or 'gpt-4o').encode(text, disallowed_special=()))
+
+
+def register_tokenizer(provider, tokenizer):
+    """
+    Use a custom tokenizer for a provider.
+
+    Args:
+        provider (str): Provider name, e.g. 'Claude'
+        tokenizer (callable): tokenizer(text, model) -> token count; None removes it
+    """
+    with _LOCK:
+        if tokenizer is None:
+            _TOKENIZERS.pop(provider, None)
+        else:
+            _TOKENIZERS[provider] = tokenizer
+
+
+def count_tokens(text, provider=None, model=None):
+    """
+    Count the tokens of a text for a provider/model.
+
+    Args:
+        text (str): Text to count
+        provider (str): Provider name; None uses the generic heuristic
+        model (str): Model name, passed to the provider's tokenizer
+
+    Returns:
+        int: Token count (exact when a tokenizer is registered, else estimated)
+    """
+    if not text:
+        return 0
+    with _LOCK:
+        tokenizer = _TOKENIZERS.get(provider)
+    if tokenizer is not None:
+        try:
+            return tokenizer(text, model)
+        except Exception:
+            pass  # A broken tokenizer must not break prompt assembly
+    return heuristic_token_count(text, provider)
+
+
+if TIKTOKEN_AVAILABLE:
+    register_tokenizer('OpenAI', tiktoken_token_count)
+    register_tokenizer('ECB-LLM', tiktoken_token_count)
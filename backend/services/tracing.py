@@ -0,0 +1,333 @@
+"""
+OpenTelemetry-compatible tracing without a collector.
+
+Spans follow the OpenTelemetry data model: 128-bit trace id, 64-bit span id,
+parent span, start/end time in Unix nanoseconds, attributes, status and
+exception events. Finished spans are exported as they end:
+
+- 'file': one OTLP/JSON ExportTraceServiceRequest per line (JSONL), which
+  OTLP-aware tools can import and jq can query offline
+- 'console': one readable line per span on stderr
+
+The trace crosses processes with the W3C traceparent format: the API passes
+its job span to the analysis subprocess in the TRACEPARENT environment
+variable, so the subprocess spans join the API request's trace.
+
+The current span is held in a context variable, which follows asyncio tasks
+in the API; work handed to other threads keeps its parent with
+propagate_span(), like propagate_usage() and propagate_deadline().
+When tracing is disabled start_span() returns a shared no-op span.
+"""
+
+import contextvars
+import functools
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+DEFAULT_TRACING_SETTINGS = {
+    'enabled': False,
+    'exporter': 'file',
+    'file': 'traces.jsonl',
+    'service_name': 'myaccessibilitybuddy'
+}
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+_CURRENT_SPAN = contextvars.ContextVar('current_span', default=None)
+_EXPORTER = None
+_REMOTE_PARENT = None  # (trace_id, span_id) from TRACEPARENT, parent of this process's root spans
+_SERVICE_NAME = DEFAULT_TRACING_SETTINGS['service_name']
+
+
+class Span:
+    """One timed operation; becomes the current span until end() (or the end of a with block)."""
+
+    def __init__(self, name, attributes=None, kind=SPAN_KIND_INTERNAL, parent=None):
+        parent_ids = (parent.trace_id, parent.span_id) if parent is not None else _REMOTE_PARENT
+        self.name = name
+        self.kind = kind
+        self.trace_id = parent_ids[0] if parent_ids else f"{random.getrandbits(128):032x}"
+        self.parent_span_id = parent_ids[1] if parent_ids else ''
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.attributes = dict(attributes or {})
+        self.events = []
+        self.status = None
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self._parent = parent
+        _CURRENT_SPAN.set(self)
+
+    def set_attribute(self, key, value):
+        if value is not None:
+            self.attributes[key] = value
+
+    def set_attributes(self, attributes):
+        for key, value in attributes.items():
+            self.set_attribute(key, value)
+
+    def record_exception(self, exc):
+        """Add an exception event and mark the span as failed."""
+        self.events.append({
+            'name': 'exception',
+            'time_ns': time.time_ns(),
+            'attributes': {'exception.type': type(exc).__name__, 'exception.message': str(exc)}
+        })
+        self.status = (STATUS_ERROR, str(exc))
+
+    def traceparent(self):
+        """W3C traceparent header value of this span."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def end(self):
+        """Finish and export the span; calling it again does nothing."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        # Restore the parent, also over children that were never ended (e.g. after an exception)
+        span = _CURRENT_SPAN.get()
+        while span is not None and span is not self:
+            span = getattr(span, '_parent', None)
+        if span is self:
+            _CURRENT_SPAN.set(self._parent)
+        if _EXPORTER is not None:
+            _EXPORTER.export(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc is not None:
+            self.record_exception(exc)
+        self.end()
+        return False
+
+
+class _NoopSpan:
+    """Span returned while tracing is disabled."""
+
+    trace_id = span_id = parent_span_id = ''
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_attributes(self, attributes):
+        pass
+
+    def record_exception(self, exc):
+        pass
+
+    def traceparent(self):
+        return None
+
+    def end(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{'key': key, 'value': _otlp_value(value)} for key, value in attributes.items()]
+
+
+def span_to_otlp(span, service_name=None):
+    """
+    Convert a finished span to an OTLP/JSON ExportTraceServiceRequest.
+
+    Returns:
+        dict: {'resourceSpans': [...]} holding the single span
+    """
+    record = {
+        'traceId': span.trace_id,
+        'spanId': span.span_id,
+        'parentSpanId': span.parent_span_id,
+        'name': span.name,
+        'kind': span.kind,
+        'startTimeUnixNano': str(span.start_ns),
+        'endTimeUnixNano': str(span.end_ns),
+        'attributes': _otlp_attributes(span.attributes),
+        'events': [{'name': event['name'], 'timeUnixNano': str(event['time_ns']),
+                    'attributes': _otlp_attributes(event['attributes'])} for event in span.events],
+        'status': {'code': span.status[0], 'message': span.status[1]} if span.status else {'code': STATUS_OK}
+    }
+    return {'resourceSpans': [{
+        'resource': {'attributes': _otlp_attributes({'service.name': service_name or _SERVICE_NAME,
+                                                     'process.pid': os.getpid()})},
+        'scopeSpans': [{'scope': {'name': 'myaccessibilitybuddy'}, 'spans': [record]}]
+    }]}
+
+
+class FileSpanExporter:
+    """Append spans as OTLP/JSON lines; several processes may share the file."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        folder = os.path.dirname(path)
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+    def export(self, span):
+        line = json.dumps(span_to_otlp(span), separators=(',', ':')) + '\n'
+        try:
+            with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError:
+            pass  # Tracing must never break the traced work
+
+
+class ConsoleSpanExporter:
+    """Print one line per span on stderr."""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stderr
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        duration_ms = (span.end_ns - span.start_ns) / 1e6
+        attributes = ' '.join(f"{key}={value}" for key, value in span.attributes.items())
+        status = ' ERROR' if span.status and span.status[0] == STATUS_ERROR else ''
+        with self._lock:
+            print(f"[trace {span.trace_id[:8]} {span.span_id[:8]}<{span.parent_span_id[:8] or 'root'}] "
+                  f"{span.name} {duration_ms:.1f} ms{status} {attributes}".rstrip(), file=self.stream, flush=True)
+
+
+def parse_traceparent(value):
+    """
+    Parse a W3C traceparent value.
+
+    Returns:
+        tuple: (trace_id, span_id), or None if the value is missing or malformed
+    """
+    parts = (value or '').strip().split('-')
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        valid = int(parts[1], 16) and int(parts[2], 16)  # All-zero ids are invalid
+    except ValueError:
+        return None
+    return (parts[1], parts[2]) if valid else None
+
+
+def configure_tracing(settings=None, logs_folder=None):
+    """
+    Enable or disable tracing for this process.
+
+    Args:
+        settings (dict): Overrides for DEFAULT_TRACING_SETTINGS (the 'tracing' config section)
+        logs_folder (str): Folder of a relative 'file' path
+    """
+    global _EXPORTER, _REMOTE_PARENT, _SERVICE_NAME
+    options = dict(DEFAULT_TRACING_SETTINGS)
+    options.update(settings or {})
+    _SERVICE_NAME = options['service_name']
+    _REMOTE_PARENT = parse_traceparent(os.environ.get('TRACEPARENT'))
+    if not options['enabled']:
+        _EXPORTER = None
+    elif options['exporter'] == 'console':
+        _EXPORTER = ConsoleSpanExporter()
+    else:
+        path = options['file']
+        if logs_folder and not os.path.isabs(path):
+            path = os.path.join(logs_folder, path)
+        _EXPORTER = FileSpanExporter(path)
+
+
+def tracing_enabled():
+    return _EXPORTER is not None
+
+
+def start_span(name, attributes=None, kind=SPAN_KIND_INTERNAL):
+    """
+    Start a span as a child of the current span and make it current.
+
+    Use it as a context manager, or call end() on the returned span.
+
+    Args:
+        name (str): Operation name, e.g. 'phase.download'
+        attributes (dict): Initial attributes (None values are skipped)
+        kind (int): SPAN_KIND_INTERNAL, SPAN_KIND_SERVER or SPAN_KIND_CLIENT
+
+    Returns:
+        Span: The started span (NOOP_SPAN while tracing is disabled)
+    """
+    if _EXPORTER is None:
+        return NOOP_SPAN
+    return Span(name, {k: v for k, v in (attributes or {}).items() if v is not None}, kind, _CURRENT_SPAN.get())
+
+
+def current_span():
+    """Return the current span, or NOOP_SPAN."""
+    return _CURRENT_SPAN.get() or NOOP_SPAN
+
+
+def traced(name, kind=SPAN_KIND_INTERNAL):
+    """Decorator running every call of a function in a span; attributes can be added with current_span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _EXPORTER is None:
+                return fn(*args, **kwargs)
+            with start_span(name, kind=kind):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def propagate_span(fn, span=None):
+    """
+    Wrap fn so that spans it starts are children of a given span.
+
+    Used for work handed to other threads (image workers, hedged requests, jobs).
+
+    Args:
+        fn (callable): Function to wrap
+        span (Span): Parent span; the caller's current span if None
+    """
+    parent = span or _CURRENT_SPAN.get()
+
+    def run(*args, **kwargs):
+        token = _CURRENT_SPAN.set(parent)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _CURRENT_SPAN.reset(token)
+    return run
+
+
+def traceparent_environment():
+    """
+    Environment for a subprocess that continues the current trace.
+
+    Returns:
+        dict: os.environ plus TRACEPARENT, or None (inherit) when there is no current span
+    """
+    span = _CURRENT_SPAN.get()
+    if span is None:
+        return None
+    return dict(os.environ, TRACEPARENT=span.traceparent())
@@ -0,0 +1,49 @@
+from services.circuit_breaker import CLOSED, OPEN, CircuitBreaker, is_provider_failure
+from services.deadlines import LLMTimeoutError
+
+
+class FakeAPIError(Exception):
+    """Provider SDK error carrying an HTTP status, like openai.APIStatusError."""
+
+    def __init__(self, message, status_code):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def test_bad_input_errors_leave_circuit_closed():
+    breaker = CircuitBreaker('OpenAI/gpt-4o', {'failure_threshold': 3})
+    errors = [FakeAPIError("Invalid image", 400), ValueError("Unsupported image format: .xyz"),
+              ImportError("cairosvg is required for SVG images")]
+    for _ in range(5):
+        for error in errors:
+            assert breaker.allow()
+            assert breaker.record_error(error) is False
+    assert breaker.snapshot() == {'state': CLOSED, 'consecutive_failures': 0, 'trips': 0}
+
+
+def test_provider_health_errors_open_circuit():
+    breaker = CircuitBreaker('OpenAI/gpt-4o', {'failure_threshold': 3})
+    for error in (FakeAPIError("Too many requests", 429), FakeAPIError("Bad gateway", 502),
+                  LLMTimeoutError('vision', 30.0)):
+        assert breaker.record_error(error) is True
+    assert breaker.snapshot()['state'] == OPEN
+    assert not breaker.allow()
+
+
+def test_wrapped_errors_are_judged_by_their_cause():
+    try:
+        try:
+            raise FakeAPIError("upstream failure", 503)
+        except FakeAPIError as sdk_error:
+            raise ValueError("Claude API error: upstream failure") from sdk_error
+    except ValueError as wrapped:
+        assert is_provider_failure(wrapped)
+    assert not is_provider_failure(ValueError("Claude model 'x' not found or not accessible."))
+
+
+def test_request_error_frees_half_open_probe():
+    breaker = CircuitBreaker('OpenAI/gpt-4o', {'failure_threshold': 1, 'reset_timeout_seconds': 0})
+    breaker.record_error(FakeAPIError("Service unavailable", 503))
+    assert breaker.allow()  # Half-open probe
+    breaker.record_error(FakeAPIError("Invalid image", 400))
+    assert breaker.allow()  # The probe slot was given back, not judged
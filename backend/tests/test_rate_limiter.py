@@ -0,0 +1,51 @@
+import time
+
+import pytest
+
+from services.deadlines import LLMTimeoutError, image_deadline, mark_timeout_retryable
+from services.rate_limiter import RateLimiter, classify_llm_error, run_with_rate_limit
+
+
+def timing_out_call(step_timeout, calls):
+    def request():
+        calls.append(time.monotonic())
+        raise mark_timeout_retryable(LLMTimeoutError('vision', step_timeout), step_timeout)
+    return request
+
+
+def test_step_timeout_not_retried_without_room_for_another_timeout():
+    calls = []
+    with image_deadline(10):
+        with pytest.raises(LLMTimeoutError):
+            run_with_rate_limit(RateLimiter(), 'OpenAI/gpt-4o', {}, timing_out_call(30, calls),
+                                max_retries=3, base_delay=0.0)
+    assert len(calls) == 1
+
+
+def test_step_timeout_retried_when_deadline_has_room():
+    calls = []
+    with image_deadline(120):
+        with pytest.raises(LLMTimeoutError):
+            run_with_rate_limit(RateLimiter(), 'OpenAI/gpt-4o', {}, timing_out_call(30, calls),
+                                max_retries=2, base_delay=0.0)
+    assert len(calls) == 3
+
+
+def test_step_timeout_retryable_without_image_deadline():
+    assert classify_llm_error(mark_timeout_retryable(LLMTimeoutError('vision', 30), 30))['retryable']
+
+
+def test_rate_limit_block_capped_at_max_delay():
+    class RateLimited(Exception):
+        status_code = 429
+
+        class response:
+            headers = {'retry-after': '6m0s'}
+
+    def request():
+        raise RateLimited("Too many requests")
+
+    limiter = RateLimiter()
+    with pytest.raises(RateLimited):
+        run_with_rate_limit(limiter, 'OpenAI/gpt-4o', {}, request, max_retries=0, max_delay=3.0)
+    assert limiter._local_state['OpenAI/gpt-4o']['blocked_until'] - time.time() <= 3.0
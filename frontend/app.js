@@ -292,7 +292,8 @@
                     'claude': 'Claude',
                     'ecb-llm': 'ECB-LLM',
                     'ollama': 'Ollama',
-                    'gemini': 'Gemini'
+                    'gemini': 'Gemini',
+                    'stub': 'Stub'
                 };
 
                 option.textContent = displayNames[provider] || provider;
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+MyAccessibilityBuddy - Complexity Routing Benchmark
+
+Runs the local complexity features used by complexity_routing on a folder of
+images and prints, per image, the features, the route ('simple' or 'complex'),
+the reasons and the time taken. No LLM is called.
+
+With labels the routing decisions are scored (accuracy and confusion matrix),
+so thresholds can be tuned before enabling routing. Labels come from either:
+  - a JSON file mapping file name to 'simple' or 'complex' (--labels), or
+  - 'simple/' and 'complex/' subfolders of the image folder
+
+Thresholds default to complexity_routing.thresholds in config.advanced.json
+and can be overridden with --threshold NAME=VALUE.
+
+Example Usage:
+  # Docker
+  docker compose exec myaccessibilitybuddy python3 /app/tools/benchmark_complexity_routing.py
+
+  # Local environment, labelled folder, custom threshold and JSON output
+  python3 tools/benchmark_complexity_routing.py test/input/images --labels labels.json \\
+      --threshold text_likeness=0.2 --json bench_routing.json
+"""
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+DEFAULT_FOLDER = Path(__file__).resolve().parent.parent / 'test' / 'input' / 'images'
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp', '.bmp', '.tif', '.tiff'}
+ROUTES = ('simple', 'complex')
+
+
+def collect_images(folder, labels_file=None):
+    """
+    List the images to benchmark with their expected route.
+
+    Args:
+        folder (Path): Image folder
+        labels_file (str): JSON file {file name: 'simple' | 'complex'}, optional
+
+    Returns:
+        list: [(path, expected route or None), ...]
+    """
+    labels = {}
+    if labels_file:
+        with open(labels_file, 'r', encoding='utf-8') as f:
+            labels = json.load(f)
+
+    images = []
+    for route in ROUTES:
+        subfolder = folder / route
+        if subfolder.is_dir():
+            images.extend((path, route) for path in sorted(subfolder.iterdir())
+                          if path.suffix.lower() in IMAGE_EXTENSIONS)
+    images.extend((path, labels.get(path.name)) for path in sorted(folder.iterdir())
+                  if path.is_file() and path.suffix.lower() in IMAGE_EXTENSIONS)
+    return images
+
+
+def parse_thresholds(overrides):
+    """Routing thresholds from config.advanced.json with NAME=VALUE overrides applied."""
+    from config import settings as config_settings
+    from services.image_complexity import DEFAULT_ROUTING_THRESHOLDS
+
+    thresholds = dict(DEFAULT_ROUTING_THRESHOLDS)
+    thresholds.update(config_settings.get_config().get('complexity_routing', {}).get('thresholds', {}))
+    for override in overrides or []:
+        name, _, value = override.partition('=')
+        if name not in DEFAULT_ROUTING_THRESHOLDS:
+            raise SystemExit(f"Unknown threshold '{name}' (expected one of: {', '.join(DEFAULT_ROUTING_THRESHOLDS)})")
+        thresholds[name] = float(value)
+    return thresholds
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark complexity-based model routing on a folder of images')
+    parser.add_argument('folder', nargs='?', default=str(DEFAULT_FOLDER), help='Image folder (default: test/input/images)')
+    parser.add_argument('--labels', default=None, help="JSON file mapping file name to 'simple' or 'complex'")
+    parser.add_argument('--threshold', action='append', metavar='NAME=VALUE', help='Override a routing threshold')
+    parser.add_argument('--json', dest='json_output', default=None, help='Write results to this JSON file')
+    args = parser.parse_args()
+
+    from services.image_complexity import compute_image_features, classify_complexity, NUMPY_AVAILABLE
+    if not NUMPY_AVAILABLE:
+        raise SystemExit("numpy is required: pip install numpy")
+
+    folder = Path(args.folder)
+    thresholds = parse_thresholds(args.threshold)
+    images = collect_images(folder, args.labels)
+    if not images:
+        raise SystemExit(f"No images found in {folder}")
+
+    print(f"Thresholds: {thresholds}\n")
+    print(f"{'image':<28} {'edges':>6} {'colours':>8} {'text':>6} {'aspect':>7} {'ms':>7}  {'route':<8} {'label':<8} reasons")
+
+    results = []
+    confusion = {expected: {actual: 0 for actual in ROUTES} for expected in ROUTES}
+    for path, expected in images:
+        start = time.perf_counter()
+        try:
+            features = compute_image_features(str(path))
+        except Exception as e:
+            print(f"{path.name[:28]:<28} FAILED: {e}")
+            continue
+        route, reasons = classify_complexity(features, thresholds)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+
+        if expected in ROUTES:
+            confusion[expected][route] += 1
+        results.append({'image': str(path.relative_to(folder)), 'route': route, 'label': expected,
+                        'reasons': reasons, 'features': features, 'milliseconds': round(elapsed_ms, 2)})
+        print(f"{path.name[:28]:<28} {features['edge_density']:>6.3f} {features['colour_count']:>8} "
+              f"{features['text_likeness']:>6.3f} {features['aspect_ratio']:>7.2f} {elapsed_ms:>7.1f}  "
+              f"{route:<8} {expected or '-':<8} {'; '.join(reasons)}")
+
+    timings = sorted(r['milliseconds'] for r in results)
+    summary = {
+        'images': len(results),
+        'routes': {route: sum(1 for r in results if r['route'] == route) for route in ROUTES},
+        'median_milliseconds': timings[len(timings) // 2] if timings else None,
+        'max_milliseconds': timings[-1] if timings else None
+    }
+    labelled = sum(sum(row.values()) for row in confusion.values())
+    if labelled:
+        summary['labelled'] = labelled
+        summary['accuracy'] = round(sum(confusion[route][route] for route in ROUTES) / labelled, 3)
+        summary['confusion'] = confusion
+
+    print(f"\nRouted: {summary['routes']['simple']} simple, {summary['routes']['complex']} complex "
+          f"(median {summary['median_milliseconds']} ms, max {summary['max_milliseconds']} ms per image)")
+    if labelled:
+        print(f"Accuracy on {labelled} labelled images: {summary['accuracy']:.1%}")
+        print(f"  {'label / route':<16} {'simple':>7} {'complex':>8}")
+        for expected in ROUTES:
+            print(f"  {expected:<16} {confusion[expected]['simple']:>7} {confusion[expected]['complex']:>8}")
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump({'thresholds': thresholds, 'summary': summary, 'results': results}, f, indent=2)
+        print(f"\nResults written to {args.json_output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+MyAccessibilityBuddy - HTML Parser Backend Benchmark
+
+Measures parse time and peak memory of the HTML parser backends used by
+download_images_from_url() and grab_context() on synthetic fixture pages.
+
+For every page size and every installed backend, two modes are measured:
+  - tree:       full BeautifulSoup tree (what grab_context() needs)
+  - extraction: image-only parse (SoupStrainer / selectolax) followed by
+                extract_image_sources_from_soup() (what download_images_from_url() does)
+
+Each measurement runs in a fresh subprocess so peak RSS is not polluted by
+previous runs. Peak memory is reported both as process max RSS (covers C
+parsers such as lxml/selectolax) and as the tracemalloc peak (Python objects).
+
+Example Usage:
+  # Docker
+  docker compose exec myaccessibilitybuddy python3 /app/tools/benchmark_html_parsing.py
+
+  # Local environment, custom sizes (MB) and JSON output
+  python3 tools/benchmark_html_parsing.py --sizes 1 5 20 --json bench_parsing.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+DEFAULT_SIZES_MB = [1, 5, 20]
+DEFAULT_TAGS = ['img', 'picture', 'div', 'link', 'meta']
+DEFAULT_ATTRS = ['src', 'data-src', 'data-image', 'data-image-webp', 'srcset', 'data-srcset', 'href', 'content']
+
+
+def generate_fixture_page(target_bytes):
+    """
+    Build a synthetic article page of roughly target_bytes.
+
+    The page mixes deep div nesting, long paragraphs, headings, figures and the
+    image-bearing tags handled by the extraction code.
+    """
+    head = (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        '<title>Benchmark fixture page</title>'
+        '<link rel="icon" href="/favicon.ico"><link rel="stylesheet" href="/site.css">'
+        '<meta property="og:image" content="/og-image.png"></head><body>'
+    )
+    paragraph = ('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor '
+                 'incididunt ut labore et dolore magna aliqua. ') * 6
+    parts = [head]
+    size = len(head)
+    block = 0
+    while size < target_bytes:
+        block += 1
+        section = (
+            f'<section class="s{block}"><div class="wrap"><div class="row"><div class="col">'
+            f'<h2>Section {block}</h2><p>{paragraph}</p>'
+            f'<figure><img src="/img/photo-{block}.jpg" alt="Photo {block}" width="640" height="480">'
+            f'<figcaption>Caption for photo {block}</figcaption></figure>'
+            f'<picture><source srcset="/img/pic-{block}.webp 1x, /img/pic-{block}@2x.webp 2x" type="image/webp">'
+            f'<img src="/img/pic-{block}.jpg" alt=""></picture>'
+            f'<div class="hero" data-image="/img/hero-{block}.png"><span>{paragraph[:120]}</span></div>'
+            f'<ul>' + ''.join(f'<li><a href="/page/{block}/{i}">Link {i}</a></li>' for i in range(10)) + '</ul>'
+            f'<script>var x{block} = {block};</script>'
+            f'</div></div></div></section>'
+        )
+        parts.append(section)
+        size += len(section)
+    parts.append('</body></html>')
+    return ''.join(parts).encode('utf-8')
+
+
+def run_worker(fixture_path, backend, mode):
+    """Parse one fixture in this process and print a JSON measurement."""
+    import resource
+    import tracemalloc
+
+    from services.html_backends import parse_for_extraction, parse_tree
+
+    with open(fixture_path, 'rb') as f:
+        markup = f.read()
+
+    baseline_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    if mode == 'tree':
+        document = parse_tree(markup, backend)
+        found = len(document.find_all('img'))
+    else:
+        # Same extraction code path as download_images_from_url()
+        from app import extract_image_sources_from_soup
+        document = parse_for_extraction(markup, backend, ['title'] + DEFAULT_TAGS)
+        found = len(extract_image_sources_from_soup(document, DEFAULT_TAGS, DEFAULT_ATTRS))
+
+    elapsed = time.perf_counter() - start
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    peak_rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({
+        'seconds': round(elapsed, 4),
+        'peak_rss_mb': round(max(peak_rss_kb - baseline_rss_kb, 0) / 1024, 1),
+        'tracemalloc_peak_mb': round(traced_peak / (1024 * 1024), 1),
+        'images_found': found
+    }))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark HTML parser backends on synthetic pages')
+    parser.add_argument('--sizes', nargs='+', type=float, default=DEFAULT_SIZES_MB, help='Fixture sizes in MB (default: 1 5 20)')
+    parser.add_argument('--backends', nargs='+', default=None, help='Backends to test (default: all installed)')
+    parser.add_argument('--modes', nargs='+', choices=['tree', 'extraction'], default=['tree', 'extraction'])
+    parser.add_argument('--json', dest='json_output', default=None, help='Write results to this JSON file')
+    parser.add_argument('--worker', nargs=3, metavar=('FIXTURE', 'BACKEND', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(*args.worker)
+        return
+
+    from services.html_backends import SUPPORTED_BACKENDS, is_backend_available
+
+    backends = args.backends or [b for b in SUPPORTED_BACKENDS if b not in ('auto', 'html5lib') and is_backend_available(b)]
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix='mab_parse_bench_') as tmp_dir:
+        for size_mb in args.sizes:
+            fixture = Path(tmp_dir) / f'fixture_{size_mb}mb.html'
+            fixture.write_bytes(generate_fixture_page(int(size_mb * 1024 * 1024)))
+            actual_mb = os.path.getsize(fixture) / (1024 * 1024)
+            print(f"\nFixture {size_mb} MB ({actual_mb:.1f} MB on disk)")
+            print(f"  {'backend':<12} {'mode':<11} {'seconds':>8} {'peak RSS MB':>12} {'py peak MB':>11} {'images':>7}")
+
+            for backend in backends:
+                for mode in args.modes:
+                    if backend == 'selectolax' and mode == 'tree':
+                        continue  # context extraction always uses a BeautifulSoup tree
+                    proc = subprocess.run(
+                        [sys.executable, __file__, '--worker', str(fixture), backend, mode],
+                        capture_output=True, text=True
+                    )
+                    if proc.returncode != 0:
+                        print(f"  {backend:<12} {mode:<11} FAILED: {proc.stderr.strip().splitlines()[-1] if proc.stderr else 'unknown error'}")
+                        continue
+                    measurement = json.loads(proc.stdout.strip().splitlines()[-1])
+                    measurement.update({'size_mb': size_mb, 'backend': backend, 'mode': mode})
+                    results.append(measurement)
+                    print(f"  {backend:<12} {mode:<11} {measurement['seconds']:>8.3f} {measurement['peak_rss_mb']:>12.1f} "
+                          f"{measurement['tracemalloc_peak_mb']:>11.1f} {measurement['images_found']:>7}")
+
+    if args.json_output:
+        with open(args.json_output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"\nResults written to {args.json_output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+MyAccessibilityBuddy - End-to-End Workflow Benchmark
+
+Runs the full workflow (backend/app.py -w: page fetch, image downloads,
+context extraction, alt-text generation) on synthetic fixture pages served
+locally (tools/site_fixtures.py), with no network access or provider spend:
+  - --llm stub:   every step uses the Stub provider, answered by a stub LLM
+                  server started here (services/stub_llm.py)
+  - --llm replay: the configured providers' responses are replayed from
+                  cassettes recorded earlier with app.py --cassettes record
+
+Each run is a fresh app.py process. Reported per page:
+  - images_per_minute       alt-text JSON files written per minute of wall time
+  - latency_p50/p95/p99     per-image processing_time_seconds from the JSON files
+  - peak_rss_mb             peak resident memory of the app process
+  - cpu_seconds_per_image   user + system CPU of the app process per image
+  - bytes_downloaded        bytes served by the fixture server (page and images)
+With --repeat N the median of the N runs is kept. The crawler's politeness
+delay between image downloads (download.delay_between_requests) is set to
+--download-delay, 0 by default, so throughput measures the workflow rather
+than the sleep; the delay used is stored with the run's settings.
+
+Results are appended to a JSON history file (benchmark.history_file in
+config.advanced.json). The first run of a scenario stores its results as the
+baseline; later runs fail (exit code 1) when a metric regresses beyond its
+tolerance in percent (benchmark.tolerances, --tolerance NAME=PERCENT).
+--update-baseline replaces the baseline with the current results. Exit codes:
+0 within tolerance, 1 regression, 2 a run failed (its app.log is kept).
+
+Example Usage:
+  # 10- and 100-image pages against the stub, fixed 100 ms LLM latency
+  python3 tools/benchmark_workflow.py --pages 10 100 --stub-latency-ms 100
+
+  # Replay cassettes at half the recorded latency, three runs, 30 ms page/image latency
+  python3 tools/benchmark_workflow.py --llm replay --replay-latency-scale 0.5 --repeat 3 --latency-ms 30
+
+  # Accept the current numbers as the new baseline
+  python3 tools/benchmark_workflow.py --pages 100 --update-baseline --label "after download pool"
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+BACKEND_DIR = PROJECT_ROOT / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from site_fixtures import FixtureServer, generate_page, generate_site
+
+# Metric name -> better direction
+METRICS = {
+    'images_per_minute': 'higher',
+    'latency_p50_seconds': 'lower',
+    'latency_p95_seconds': 'lower',
+    'latency_p99_seconds': 'lower',
+    'peak_rss_mb': 'lower',
+    'cpu_seconds_per_image': 'lower',
+    'bytes_downloaded': 'lower'
+}
+
+DEFAULT_TOLERANCES = {
+    'images_per_minute': 10,
+    'latency_p50_seconds': 15,
+    'latency_p95_seconds': 20,
+    'latency_p99_seconds': 25,
+    'peak_rss_mb': 15,
+    'cpu_seconds_per_image': 15,
+    'bytes_downloaded': 5
+}
+
+STUB_MODELS = {'vision': 'stub-vision', 'processing': 'stub-processing', 'translation': 'stub-translation'}
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a list of numbers (None when empty)."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(fraction * len(ordered)), 1)
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def median(values):
+    values = sorted(value for value in values if value is not None)
+    if not values:
+        return None
+    middle = len(values) // 2
+    return values[middle] if len(values) % 2 else (values[middle - 1] + values[middle]) / 2
+
+
+def load_benchmark_config():
+    from config import settings as config_settings
+    return config_settings.get_config().get('benchmark', {})
+
+
+def resolve_path(value):
+    path = Path(value)
+    return path if path.is_absolute() else PROJECT_ROOT / path
+
+
+def parse_tolerances(config, overrides):
+    """Tolerances in percent from the config with NAME=PERCENT overrides applied."""
+    tolerances = dict(DEFAULT_TOLERANCES)
+    tolerances.update(config.get('tolerances', {}))
+    for override in overrides or []:
+        name, _, value = override.partition('=')
+        if name not in METRICS:
+            raise SystemExit(f"Unknown metric '{name}' (expected one of: {', '.join(METRICS)})")
+        tolerances[name] = float(value)
+    return tolerances
+
+
+def ensure_fixture(fixtures_folder, image_count, seed):
+    """Generate page-<image_count>.html unless it exists; returns its manifest entry."""
+    manifest_path = fixtures_folder / 'manifest.json'
+    manifest = {'pages': []}
+    if manifest_path.exists():
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    for page in manifest.get('pages', []):
+        if page['image_count'] == image_count and (fixtures_folder / page['page']).exists():
+            return page
+    print(f"Generating fixture page with {image_count} images in {fixtures_folder}...")
+    if not manifest_path.exists():
+        return generate_site(str(fixtures_folder), [image_count], {'seed': seed})['pages'][0]
+    page = generate_page(str(fixtures_folder), image_count, {'seed': seed})
+    manifest['pages'] = [p for p in manifest.get('pages', []) if p['image_count'] != image_count] + [page]
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return page
+
+
+def run_workflow(url, work_dir, args, env):
+    """
+    Run app.py -w on one page in a fresh process.
+
+    Returns:
+        dict: {exit_code, wall_seconds, cpu_seconds, peak_rss_mb, processing_times, outcomes, stats}
+    """
+    folders = {name: work_dir / name for name in ('images', 'context', 'alt-text')}
+    progress_file = work_dir / 'progress.json'
+    cmd = [sys.executable, str(BACKEND_DIR / 'app.py'), '-w', url,
+           '--images-folder', str(folders['images']), '--context-folder', str(folders['context']),
+           '--alt-text-folder', str(folders['alt-text']), '--progress-file', str(progress_file),
+           '--download-delay', str(args.download_delay)]
+    if not args.http_cache:
+        cmd.append('--no-cache')
+    if args.num_images:
+        cmd.extend(['--num-images', str(args.num_images)])
+    if args.language:
+        cmd.extend(['--language'] + args.language)
+    if args.llm == 'stub':
+        for step, model in STUB_MODELS.items():
+            cmd.extend([f'--{step}-provider', 'Stub', f'--{step}-model', model])
+    else:
+        cmd.extend(['--cassettes', 'replay', '--replay-latency-scale', str(args.replay_latency_scale)])
+        if args.cassette_folder:
+            cmd.extend(['--cassette-folder', args.cassette_folder])
+
+    with open(work_dir / 'app.log', 'w', encoding='utf-8') as log:
+        start = time.perf_counter()
+        process = subprocess.Popen(cmd, stdout=log, stderr=subprocess.STDOUT, env=env, cwd=str(PROJECT_ROOT))
+        timer = threading.Timer(args.timeout, process.kill) if args.timeout else None
+        if timer:
+            timer.start()
+        try:
+            # wait4() returns the resource usage of this child alone
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            if timer:
+                timer.cancel()
+        wall_seconds = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+
+    processing_times = []
+    outcomes = {}
+    for path in folders['alt-text'].rglob('*.json'):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        if isinstance(data, dict) and 'processing_time_seconds' in data:
+            processing_times.append(float(data['processing_time_seconds']))
+            outcome = data.get('outcome') or 'unknown'
+            outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    stats = {}
+    try:
+        with open(progress_file, 'r', encoding='utf-8') as f:
+            stats = json.load(f).get('stats') or {}
+    except (OSError, ValueError):
+        pass
+
+    return {
+        'exit_code': process.returncode,
+        'wall_seconds': wall_seconds,
+        'cpu_seconds': usage.ru_utime + usage.ru_stime,
+        'peak_rss_mb': usage.ru_maxrss / 1024.0,  # KiB on Linux
+        'processing_times': processing_times,
+        'outcomes': outcomes,
+        'stats': stats
+    }
+
+
+def run_metrics(run, bytes_downloaded):
+    images = len(run['processing_times'])
+    times = run['processing_times']
+    return {
+        'images': images,
+        'wall_seconds': round(run['wall_seconds'], 3),
+        'images_per_minute': round(images / run['wall_seconds'] * 60, 2) if run['wall_seconds'] > 0 else None,
+        'latency_p50_seconds': _round(percentile(times, 0.50)),
+        'latency_p95_seconds': _round(percentile(times, 0.95)),
+        'latency_p99_seconds': _round(percentile(times, 0.99)),
+        'peak_rss_mb': round(run['peak_rss_mb'], 1),
+        'cpu_seconds_per_image': _round(run['cpu_seconds'] / images) if images else None,
+        'bytes_downloaded': bytes_downloaded
+    }
+
+
+def _round(value, digits=3):
+    return round(value, digits) if value is not None else None
+
+
+def compare(results, baseline, tolerances):
+    """
+    Compare metrics with a baseline.
+
+    Returns:
+        list: [{metric, baseline, current, change_percent, tolerance_percent}] for each regression
+    """
+    regressions = []
+    for metric, direction in METRICS.items():
+        current, reference = results.get(metric), (baseline or {}).get(metric)
+        if current is None or not reference:
+            continue
+        change = (current - reference) / reference * 100
+        worse = -change if direction == 'higher' else change
+        if worse > tolerances.get(metric, 0):
+            regressions.append({'metric': metric, 'baseline': reference, 'current': current,
+                                'change_percent': round(change, 1), 'tolerance_percent': tolerances.get(metric, 0)})
+    return regressions
+
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=str(PROJECT_ROOT), capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main():
+    config = load_benchmark_config()
+    parser = argparse.ArgumentParser(description='End-to-end workflow benchmark on local fixtures with regression thresholds')
+    parser.add_argument('--pages', nargs='+', type=int, default=[10, 100], help='Images per fixture page (default: 10 100)')
+    parser.add_argument('--fixtures', default=config.get('fixtures_folder', 'output/benchmarks/fixtures'),
+                        help='Fixture folder; missing pages are generated (default: benchmark.fixtures_folder)')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for generated fixtures and the stub')
+    parser.add_argument('--llm', choices=['stub', 'replay'], default='stub', help='Provider for all LLM calls')
+    parser.add_argument('--stub-config', help='JSON file with stub LLM settings (keys of stub_server in config.advanced.json)')
+    parser.add_argument('--stub-latency-ms', type=float, help='Fixed stub latency (overrides the stub latency distribution)')
+    parser.add_argument('--cassette-folder', help='Cassettes to replay (default: folders.cassettes)')
+    parser.add_argument('--replay-latency-scale', type=float, default=1.0, help='Scale replayed latencies (default: 1.0)')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Fixture server latency per response')
+    parser.add_argument('--bandwidth-kbps', type=float, default=0.0, help='Fixture server KiB/s per connection (0 = unlimited)')
+    parser.add_argument('--num-images', type=int, help='Process at most this many images per page')
+    parser.add_argument('--language', nargs='+', help='Alt-text languages (default: from config)')
+    parser.add_argument('--download-delay', type=float, default=0.0,
+                        help='Seconds between image downloads in app.py (default: 0, no politeness delay)')
+    parser.add_argument('--http-cache', action='store_true', help='Keep the on-disk HTTP cache (default: bypassed)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per page; the median is reported')
+    parser.add_argument('--timeout', type=float, default=3600, help='Seconds before a run is killed (0 = no limit)')
+    parser.add_argument('--history', default=config.get('history_file', 'output/benchmarks/history.json'),
+                        help='JSON history file (default: benchmark.history_file)')
+    parser.add_argument('--label', default='', help='Label stored with this run in the history')
+    parser.add_argument('--tolerance', action='append', metavar='NAME=PERCENT', help='Override a regression tolerance')
+    parser.add_argument('--update-baseline', action='store_true', help='Store this run as the new baseline')
+    parser.add_argument('--keep-output', action='store_true', help='Keep the images, context and alt-text of each run')
+    args = parser.parse_args()
+
+    if not hasattr(os, 'wait4'):
+        raise SystemExit("This benchmark needs os.wait4 (Linux or macOS)")
+    tolerances = parse_tolerances(config, args.tolerance)
+    fixtures_folder = resolve_path(args.fixtures)
+    history_path = resolve_path(args.history)
+
+    fixture_server = FixtureServer(fixtures_folder, latency_ms=args.latency_ms, bandwidth_kbps=args.bandwidth_kbps).start()
+    env = dict(os.environ, PYTHONUNBUFFERED='1')
+    stub_server = None
+    if args.llm == 'stub':
+        from config import settings as config_settings
+        from services.stub_llm import StubLLMServer
+        stub_settings = dict(config_settings.get_config().get('stub_server', {}))
+        if args.stub_config:
+            with open(args.stub_config, 'r', encoding='utf-8') as f:
+                stub_settings.update(json.load(f))
+        stub_settings['seed'] = args.seed
+        if args.stub_latency_ms is not None:
+            stub_settings['latency'] = {'distribution': 'fixed', 'fixed_ms': args.stub_latency_ms}
+        stub_server = StubLLMServer(stub_settings).start()
+        env['STUB_LLM_BASE_URL'] = stub_server.openai_base_url
+
+    scenario_suffix = 'stub' if args.llm == 'stub' else 'replay'
+    results = {}
+    details = {}
+    failed = []
+    work_root = Path(tempfile.mkdtemp(prefix='mab-bench-'))
+    try:
+        for image_count in args.pages:
+            page = ensure_fixture(fixtures_folder, image_count, args.seed)
+            scenario = f"page-{image_count}/{scenario_suffix}"
+            url = f"{fixture_server.url}/{page['page']}"
+            runs = []
+            for repeat in range(1, args.repeat + 1):
+                work_dir = work_root / f"{scenario.replace('/', '-')}-{repeat}"
+                work_dir.mkdir(parents=True)
+                bytes_before = fixture_server.snapshot()['bytes']
+                run = run_workflow(url, work_dir, args, env)
+                metrics = run_metrics(run, fixture_server.snapshot()['bytes'] - bytes_before)
+                runs.append(metrics)
+                status = 'ok' if run['exit_code'] in (0, 3) else f"exit code {run['exit_code']}"
+                print(f"{scenario} run {repeat}: {metrics['images']} images in {metrics['wall_seconds']:.1f}s, "
+                      f"{metrics['images_per_minute']} images/min, p95 {metrics['latency_p95_seconds']}s, "
+                      f"peak RSS {metrics['peak_rss_mb']} MB ({status})")
+                if run['exit_code'] not in (0, 3):
+                    print(f"  see {work_dir / 'app.log'}")
+                details.setdefault(scenario, []).append({'exit_code': run['exit_code'], 'outcomes': run['outcomes'],
+                                                         'llm_usage': (run['stats'].get('llm_usage') or {}).get('total')})
+                if not args.keep_output and run['exit_code'] in (0, 3):
+                    shutil.rmtree(work_dir, ignore_errors=True)
+            if not runs[-1]['images'] or details[scenario][-1]['exit_code'] not in (0, 3):
+                failed.append(scenario)
+                continue
+            results[scenario] = {metric: median([r[metric] for r in runs]) for metric in runs[0]}
+    finally:
+        fixture_server.stop()
+        if stub_server is not None:
+            stub_server.stop()
+
+    history = {'baselines': {}, 'runs': []}
+    if history_path.exists():
+        with open(history_path, 'r', encoding='utf-8') as f:
+            history = json.load(f)
+    baselines = history.setdefault('baselines', {})
+
+    print(f"\n{'scenario':<22} {'metric':<24} {'baseline':>12} {'current':>12} {'change':>8}")
+    regressions = {}
+    for scenario, metrics in results.items():
+        baseline = baselines.get(scenario, {}).get('metrics')
+        for metric in METRICS:
+            current, reference = metrics.get(metric), (baseline or {}).get(metric)
+            change = f"{(current - reference) / reference * 100:+.1f}%" if current is not None and reference else ''
+            print(f"{scenario:<22} {metric:<24} {reference if reference is not None else '-':>12} "
+                  f"{current if current is not None else '-':>12} {change:>8}")
+        if baseline and not args.update_baseline:
+            found = compare(metrics, baseline, tolerances)
+            if found:
+                regressions[scenario] = found
+
+    record = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'label': args.label,
+        'commit': git_commit(),
+        'settings': {'llm': args.llm, 'repeat': args.repeat, 'latency_ms': args.latency_ms,
+                     'bandwidth_kbps': args.bandwidth_kbps, 'stub_latency_ms': args.stub_latency_ms,
+                     'replay_latency_scale': args.replay_latency_scale if args.llm == 'replay' else None,
+                     'num_images': args.num_images, 'seed': args.seed,
+                     'download_delay': args.download_delay},
+        'results': results,
+        'details': details,
+        'regressions': regressions,
+        'failed': failed
+    }
+    history.setdefault('runs', []).append(record)
+    for scenario, metrics in results.items():
+        if args.update_baseline or scenario not in baselines:
+            baselines[scenario] = {'metrics': metrics, 'timestamp': record['timestamp'], 'commit': record['commit'],
+                                   'label': args.label}
+            print(f"Baseline stored for {scenario}")
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(history_path, 'w', encoding='utf-8') as f:
+        json.dump(history, f, indent=2)
+    print(f"History written to {history_path}")
+
+    if regressions:
+        print("\nREGRESSIONS:")
+        for scenario, found in regressions.items():
+            for regression in found:
+                print(f"  {scenario} {regression['metric']}: {regression['baseline']} -> {regression['current']} "
+                      f"({regression['change_percent']:+.1f}%, tolerance {regression['tolerance_percent']}%)")
+        return 1
+    if failed:
+        print(f"\nFAILED (no baseline stored or compared): {', '.join(failed)}")
+        return 2
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
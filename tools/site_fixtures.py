@@ -0,0 +1,397 @@
+#!/usr/bin/env python3
+"""
+MyAccessibilityBuddy - Synthetic Site Fixtures and Local Static Server
+
+Generates repeatable crawl fixtures for download_images_from_url() and
+grab_context(), and serves them over HTTP with tunable latency and bandwidth.
+
+A fixture page contains the image sources the extraction code handles, in
+configurable counts:
+  - img         <figure><img src alt> with a caption
+  - picture     <picture><source srcset><img></picture>
+  - srcset      <img src srcset="... 1x, ... 2x">
+  - background  <div data-image> and <div style="background-image: url()">
+  - og_image    <meta property="og:image"> in the head
+  - icon        <link rel="icon"> / apple-touch-icon in the head
+Images sit in sections wrapped in --depth levels of nested divs, between
+headings and --text-words long paragraphs, so context extraction walks a deep
+DOM with large text blocks. Every referenced image is written as a distinct
+PNG (stdlib only, sizes between --min-size and --max-size), so downloads,
+caches and cassettes see real, unique files. Output is deterministic per
+--seed.
+
+Each page is written as page-<N>.html with its images in images/page-<N>/,
+and manifest.json lists every page with its URL path, image counts and bytes.
+
+The server is a threaded static file server: each response waits
+--latency-ms (plus up to --jitter-ms) before the first byte and is then sent
+at --bandwidth-kbps per connection. GET /__stats returns the requests and
+bytes served.
+
+Example Usage:
+  # Pages with 10, 1,000 and 10,000 images
+  python3 tools/site_fixtures.py generate --out /tmp/fixtures --images 10 1000 10000
+
+  # Only img and background images, deeper DOM, bigger text blocks
+  python3 tools/site_fixtures.py generate --out /tmp/fixtures --images 200 \\
+      --mix img=3 background=1 --depth 30 --text-words 800
+
+  # Serve with 40 ms latency and 20 Mbit/s per connection, then run the workflow
+  python3 tools/site_fixtures.py serve --root /tmp/fixtures --port 8920 --latency-ms 40 --bandwidth-kbps 2500
+  python3 backend/app.py -w http://127.0.0.1:8920/page-10.html
+"""
+
+import argparse
+import json
+import os
+import random
+import struct
+import sys
+import threading
+import time
+import zlib
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+IMAGE_KINDS = ('img', 'picture', 'srcset', 'background', 'og_image', 'icon')
+
+# Share of the images per kind when --mix is not given
+DEFAULT_MIX = {'img': 60, 'picture': 12, 'srcset': 12, 'background': 12, 'og_image': 1, 'icon': 3}
+
+DEFAULT_OPTIONS = {
+    'mix': DEFAULT_MIX,
+    'depth': 12,
+    'text_words': 250,
+    'images_per_section': 4,
+    'min_size': 48,
+    'max_size': 320,
+    'missing_alt_ratio': 0.5,
+    'seed': 0
+}
+
+WORDS = ('accessibility', 'report', 'annual', 'policy', 'market', 'analysis', 'research', 'community', 'digital',
+         'service', 'quality', 'public', 'programme', 'data', 'growth', 'energy', 'network', 'project', 'support',
+         'health', 'education', 'results', 'review', 'strategy', 'development', 'global', 'local', 'team', 'the',
+         'of', 'and', 'for', 'with', 'in', 'on', 'a', 'to', 'new', 'our', 'this', 'year', 'first', 'open')
+
+DEFAULT_CHUNK_SIZE = 16 * 1024
+
+
+def _png(width, height, rng):
+    """A distinct, moderately compressible RGB PNG: banded gradients with some noise."""
+    span = 3 * (width + height)
+    step, offset = rng.randint(1, 7), rng.randint(0, 255)
+    pattern = bytearray(((i * step) // 3 + offset) & 255 for i in range(span))
+    for _ in range(max(span // 16, 1)):
+        pattern[rng.randrange(span)] = rng.randrange(256)
+    # Each row is a shifted window of the pattern, preceded by PNG filter type 0
+    raw = b''.join(b'\x00' + bytes(pattern[3 * y:3 * y + 3 * width]) for y in range(height))
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+    return (b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw, 6)) + chunk(b'IEND', b''))
+
+
+def _text(rng, words):
+    sentence_words = [rng.choice(WORDS) for _ in range(words)]
+    sentences = []
+    for start in range(0, words, 14):
+        sentence = ' '.join(sentence_words[start:start + 14])
+        sentences.append(sentence[:1].upper() + sentence[1:] + '.')
+    return ' '.join(sentences)
+
+
+def split_counts(image_count, mix):
+    """
+    Split image_count over the image kinds in proportion to mix.
+
+    Returns:
+        dict: {kind: count}, summing to image_count
+    """
+    weights = {kind: float(mix.get(kind, 0)) for kind in IMAGE_KINDS}
+    total = sum(weights.values())
+    if total <= 0:
+        raise ValueError("The image mix needs at least one kind with a positive weight")
+    counts = {kind: int(image_count * weight / total) for kind, weight in weights.items()}
+    # Hand out the rounding remainder by largest weight
+    for kind in sorted(IMAGE_KINDS, key=lambda k: -weights[k]):
+        if sum(counts.values()) >= image_count:
+            break
+        if weights[kind] > 0:
+            counts[kind] += 1
+    return counts
+
+
+def generate_page(out_dir, image_count, options=None):
+    """
+    Write one fixture page and its images.
+
+    Args:
+        out_dir (str): Site root folder
+        image_count (int): Number of image references on the page
+        options (dict): Overrides for DEFAULT_OPTIONS
+
+    Returns:
+        dict: Manifest entry {page, images_folder, image_count, counts, files, image_bytes, html_bytes}
+    """
+    settings = dict(DEFAULT_OPTIONS)
+    settings.update(options or {})
+    rng = random.Random(f"{settings['seed']}:{image_count}")
+    name = f"page-{image_count}"
+    image_dir = Path(out_dir) / 'images' / name
+    image_dir.mkdir(parents=True, exist_ok=True)
+    counts = split_counts(image_count, settings['mix'])
+
+    files = 0
+    image_bytes = 0
+
+    def write_image(label):
+        nonlocal files, image_bytes
+        files += 1
+        width = rng.randint(settings['min_size'], settings['max_size'])
+        height = rng.randint(settings['min_size'], settings['max_size'])
+        data = _png(width, height, rng)
+        filename = f"{label}-{files:05d}.png"
+        (image_dir / filename).write_bytes(data)
+        image_bytes += len(data)
+        return f"images/{name}/{filename}", width, height
+
+    def alt():
+        return '' if rng.random() < settings['missing_alt_ratio'] else _text(rng, rng.randint(3, 8)).rstrip('.')
+
+    head = [f'<!DOCTYPE html>\n<html lang="en">\n<head>\n<meta charset="utf-8">\n<title>Fixture page with {image_count} images</title>',
+            '<meta name="viewport" content="width=device-width, initial-scale=1">']
+    for i in range(counts['og_image']):
+        src, _, _ = write_image('og')
+        head.append(f'<meta property="og:image" content="{src}">')
+    for i in range(counts['icon']):
+        src, width, _ = write_image('icon')
+        rel = 'apple-touch-icon' if i % 2 else 'icon'
+        head.append(f'<link rel="{rel}" sizes="{width}x{width}" href="{src}">')
+    head.append('<link rel="stylesheet" href="site.css">\n</head>')
+
+    # Body images in document order, interleaved by kind
+    pending = []
+    for kind in ('img', 'picture', 'srcset', 'background'):
+        pending.extend([kind] * counts[kind])
+    rng.shuffle(pending)
+
+    body = ['<body>', '<header><nav><ul>' + ''.join(f'<li><a href="#s{i}">Section {i}</a></li>' for i in range(1, 8))
+            + '</ul></nav><h1>Synthetic accessibility fixture</h1></header>', '<main>']
+    depth = settings['depth']
+    per_section = max(settings['images_per_section'], 1)
+    sections = max((len(pending) + per_section - 1) // per_section, 1)
+    for section in range(sections):
+        block = [f'<section id="s{section + 1}">' + '<div class="level">' * depth,
+                 f'<h2>{_text(rng, 6).rstrip(".")}</h2>', f'<p>{_text(rng, settings["text_words"])}</p>']
+        for kind in pending[section * per_section:(section + 1) * per_section]:
+            if kind == 'img':
+                src, width, height = write_image('img')
+                block.append(f'<figure><img src="{src}" alt="{alt()}" width="{width}" height="{height}" loading="lazy">'
+                             f'<figcaption>{_text(rng, 10)}</figcaption></figure>')
+            elif kind == 'picture':
+                src, width, height = write_image('picture')
+                block.append(f'<picture><source srcset="{src}" type="image/png">'
+                             f'<img src="{src}" alt="{alt()}" width="{width}" height="{height}"></picture>')
+            elif kind == 'srcset':
+                src, width, height = write_image('srcset')
+                src_2x, _, _ = write_image('srcset2x')
+                block.append(f'<img src="{src}" srcset="{src} 1x, {src_2x} 2x" alt="{alt()}" width="{width}" height="{height}">')
+            else:
+                src, _, _ = write_image('background')
+                if rng.random() < 0.5:
+                    block.append(f'<div class="hero" data-image="{src}"><span>{_text(rng, 20)}</span></div>')
+                else:
+                    block.append(f'<div class="banner" style="background-image: url(\'{src}\')"><span>{_text(rng, 20)}</span></div>')
+            block.append(f'<p>{_text(rng, max(settings["text_words"] // 4, 1))}</p>')
+        block.append('</div>' * depth + '</section>')
+        body.append('\n'.join(block))
+    body.append('</main>\n<footer><p>' + _text(rng, 40) + '</p></footer>\n</body>\n</html>\n')
+
+    html = '\n'.join(head + body).encode('utf-8')
+    (Path(out_dir) / f"{name}.html").write_bytes(html)
+    return {'page': f"{name}.html", 'images_folder': f"images/{name}", 'image_count': image_count, 'counts': counts,
+            'files': files, 'image_bytes': image_bytes, 'html_bytes': len(html)}
+
+
+def generate_site(out_dir, image_counts, options=None):
+    """
+    Write one page per image count and manifest.json.
+
+    Args:
+        out_dir (str): Site root folder (created if missing)
+        image_counts (list): Image references per page, e.g. [10, 1000, 10000]
+        options (dict): Overrides for DEFAULT_OPTIONS
+
+    Returns:
+        dict: The manifest {'options', 'pages': [generate_page() entries]}
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    settings = dict(DEFAULT_OPTIONS)
+    settings.update(options or {})
+    Path(out_dir, 'site.css').write_text('.level{margin:0}.hero,.banner{min-height:120px;background-size:cover}\n',
+                                         encoding='utf-8')
+    manifest = {'options': settings, 'pages': [generate_page(out_dir, count, settings) for count in image_counts]}
+    with open(os.path.join(out_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class _FixtureHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass  # Keep benchmark output clean
+
+    def send_head(self):
+        if self.path == '/__stats':
+            return None
+        server = self.server
+        delay = server.latency + (server.rng_uniform(0, server.jitter) if server.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+        with server.lock:
+            server.stats['requests'] += 1
+        return super().send_head()
+
+    def do_GET(self):
+        if self.path == '/__stats':
+            data = json.dumps(self.server.snapshot()).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        super().do_GET()
+
+    def copyfile(self, source, outputfile):
+        # Throttle the body to the configured bandwidth per connection
+        server = self.server
+        started = time.perf_counter()
+        sent = 0
+        while True:
+            chunk = source.read(DEFAULT_CHUNK_SIZE)
+            if not chunk:
+                break
+            with server.lock:
+                server.stats['bytes'] += len(chunk)
+            outputfile.write(chunk)
+            sent += len(chunk)
+            if server.bytes_per_second:
+                ahead = sent / server.bytes_per_second - (time.perf_counter() - started)
+                if ahead > 0:
+                    time.sleep(ahead)
+
+
+class FixtureServer(ThreadingHTTPServer):
+    """Threaded static server for a fixture folder with per-response latency and per-connection bandwidth."""
+
+    daemon_threads = True
+
+    def __init__(self, root, host='127.0.0.1', port=0, latency_ms=0.0, jitter_ms=0.0, bandwidth_kbps=0.0, seed=0):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.bytes_per_second = bandwidth_kbps * 1024.0
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'bytes': 0}
+        self._rng = random.Random(seed)
+        super().__init__((host, port), partial(_FixtureHandler, directory=str(root)))
+        self._thread = None
+
+    def rng_uniform(self, low, high):
+        with self.lock:
+            return self._rng.uniform(low, high)
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        """Serve in a daemon thread and return self."""
+        self._thread = threading.Thread(target=self.serve_forever, name='fixture-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def parse_mix(values):
+    """Parse KIND=WEIGHT pairs into a mix dict (kinds not given get 0)."""
+    if not values:
+        return dict(DEFAULT_MIX)
+    mix = {kind: 0 for kind in IMAGE_KINDS}
+    for value in values:
+        kind, _, weight = value.partition('=')
+        if kind not in IMAGE_KINDS or not weight:
+            raise SystemExit(f"Invalid --mix '{value}' (expected KIND=WEIGHT, KIND one of: {', '.join(IMAGE_KINDS)})")
+        mix[kind] = float(weight)
+    return mix
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate and serve synthetic crawl fixture pages')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    generate = commands.add_parser('generate', help='Write fixture pages, images and manifest.json')
+    generate.add_argument('--out', required=True, help='Output folder (site root)')
+    generate.add_argument('--images', nargs='+', type=int, default=[10, 1000, 10000],
+                          help='Images per page, one page per value (default: 10 1000 10000)')
+    generate.add_argument('--mix', nargs='+', metavar='KIND=WEIGHT',
+                          help=f"Weights per image kind ({', '.join(IMAGE_KINDS)}); default: "
+                               + ' '.join(f'{k}={v}' for k, v in DEFAULT_MIX.items()))
+    generate.add_argument('--depth', type=int, default=DEFAULT_OPTIONS['depth'], help='Nested divs around each section')
+    generate.add_argument('--text-words', type=int, default=DEFAULT_OPTIONS['text_words'], help='Words per section paragraph')
+    generate.add_argument('--images-per-section', type=int, default=DEFAULT_OPTIONS['images_per_section'],
+                          help='Body images per section')
+    generate.add_argument('--min-size', type=int, default=DEFAULT_OPTIONS['min_size'], help='Smallest image side in pixels')
+    generate.add_argument('--max-size', type=int, default=DEFAULT_OPTIONS['max_size'], help='Largest image side in pixels')
+    generate.add_argument('--missing-alt-ratio', type=float, default=DEFAULT_OPTIONS['missing_alt_ratio'],
+                          help='Share of images without alt text')
+    generate.add_argument('--seed', type=int, default=DEFAULT_OPTIONS['seed'])
+
+    serve = commands.add_parser('serve', help='Serve a fixture folder')
+    serve.add_argument('--root', required=True, help='Site root folder')
+    serve.add_argument('--host', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=8920)
+    serve.add_argument('--latency-ms', type=float, default=0.0, help='Delay before each response')
+    serve.add_argument('--jitter-ms', type=float, default=0.0, help='Extra random delay of up to this much')
+    serve.add_argument('--bandwidth-kbps', type=float, default=0.0, help='KiB/s per connection (0 = unlimited)')
+    args = parser.parse_args()
+
+    if args.command == 'generate':
+        options = {'mix': parse_mix(args.mix), 'depth': args.depth, 'text_words': args.text_words,
+                   'images_per_section': args.images_per_section, 'min_size': args.min_size,
+                   'max_size': args.max_size, 'missing_alt_ratio': args.missing_alt_ratio, 'seed': args.seed}
+        start = time.perf_counter()
+        manifest = generate_site(args.out, args.images, options)
+        for page in manifest['pages']:
+            counts = ', '.join(f"{kind} {count}" for kind, count in page['counts'].items() if count)
+            print(f"{page['page']:<18} {page['image_count']:>6} images ({counts}), {page['files']} files, "
+                  f"{page['image_bytes'] / 1048576:.1f} MB images, {page['html_bytes'] / 1024:.0f} KB HTML")
+        print(f"Written to {args.out} in {time.perf_counter() - start:.1f}s")
+    else:
+        if not Path(args.root).is_dir():
+            raise SystemExit(f"Fixture folder not found: {args.root}")
+        server = FixtureServer(args.root, args.host, args.port, args.latency_ms, args.jitter_ms, args.bandwidth_kbps)
+        print(f"Serving {args.root} on {server.url} (latency {args.latency_ms} ms + {args.jitter_ms} ms jitter, "
+              f"bandwidth {args.bandwidth_kbps or 'unlimited'} KiB/s per connection)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            print(json.dumps(server.snapshot()))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
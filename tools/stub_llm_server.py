@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+MyAccessibilityBuddy - Offline Stub LLM Server
+
+Serves the OpenAI chat-completions API (/v1/chat/completions) and the Ollama
+chat API (/api/chat) with deterministic, schema-valid answers, so the whole
+workflow - CLI runs, /api/analyze-page and /api/analyze-page-async - can be
+load-tested and benchmarked without credentials or network access.
+See backend/services/stub_llm.py for how requests are answered.
+
+Point the pipeline at it with either provider:
+  - 'Stub' (OpenAI-compatible): set "stub": {"enabled": true, "base_url":
+    "http://127.0.0.1:8911/v1"} in config.json and select provider Stub
+  - 'Ollama': set ollama.base_url to http://127.0.0.1:8911
+
+A server shared by all analysis subprocesses keeps one set of counters
+(GET /stats) and one prompt cache; with an empty stub.base_url each process
+starts its own in-process server instead.
+
+Example Usage:
+  # Lognormal latency around 800 ms, 2% server errors, 5% rate limiting
+  python3 tools/stub_llm_server.py --port 8911 --error-rate 0.02 --rate-limit-rate 0.05
+
+  # Fixed 200 ms, settings from a JSON file (same keys as stub_server in config.advanced.json)
+  python3 tools/stub_llm_server.py --config stub.json --latency fixed --fixed-ms 200
+
+  # Run the CLI against it
+  python3 backend/app.py -w https://example.com --vision-provider Stub --vision-model stub-vision
+"""
+
+import argparse
+import json
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / 'backend'
+sys.path.insert(0, str(BACKEND_DIR))
+
+from services.stub_llm import StubLLMServer, LATENCY_DISTRIBUTIONS
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline OpenAI/Ollama-compatible stub LLM server')
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8911, help='Port (default: 8911, 0 for any free port)')
+    parser.add_argument('--config', help='JSON file with stub settings (keys of stub_server in config.advanced.json)')
+    parser.add_argument('--seed', type=int, help='Seed for latencies, failures and answers')
+    parser.add_argument('--latency', choices=LATENCY_DISTRIBUTIONS, help='Latency distribution')
+    parser.add_argument('--fixed-ms', type=float, help='Latency of the fixed distribution')
+    parser.add_argument('--median-ms', type=float, help='Median of the lognormal distribution')
+    parser.add_argument('--sigma', type=float, help='Sigma of the lognormal distribution')
+    parser.add_argument('--min-ms', type=float, help='Lower bound of the uniform and lognormal distributions')
+    parser.add_argument('--max-ms', type=float, help='Upper bound of the uniform and lognormal distributions')
+    parser.add_argument('--ms-per-output-token', type=float, help='Extra latency per generated token')
+    parser.add_argument('--error-rate', type=float, help='Share of requests failing with HTTP 500')
+    parser.add_argument('--rate-limit-rate', type=float, help='Share of requests failing with HTTP 429')
+    parser.add_argument('--retry-after', type=int, help='Retry-After seconds of 429 responses')
+    args = parser.parse_args()
+
+    settings = {}
+    if args.config:
+        with open(args.config, 'r', encoding='utf-8') as f:
+            settings = json.load(f)
+    latency = dict(settings.get('latency', {}))
+    overrides = {'seed': args.seed, 'ms_per_output_token': args.ms_per_output_token, 'error_rate': args.error_rate,
+                 'rate_limit_rate': args.rate_limit_rate, 'retry_after_seconds': args.retry_after}
+    latency_overrides = {'distribution': args.latency, 'fixed_ms': args.fixed_ms, 'median_ms': args.median_ms,
+                         'sigma': args.sigma, 'min_ms': args.min_ms, 'max_ms': args.max_ms}
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    latency.update({key: value for key, value in latency_overrides.items() if value is not None})
+    settings.update({'host': args.host, 'port': args.port, 'latency': latency})
+
+    server = StubLLMServer(settings)
+    options = server.stub.settings
+    print(f"Stub LLM server on {server.base_url}")
+    print(f"  OpenAI: {server.openai_base_url}/chat/completions   Ollama: {server.base_url}/api/chat   Stats: {server.base_url}/stats")
+    print(f"  latency: {json.dumps(options['latency'])}, error_rate={options['error_rate']}, "
+          f"rate_limit_rate={options['rate_limit_rate']}, seed={options['seed']}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stub.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()